@@ -0,0 +1,138 @@
+"""
+Admission control for the serving loop.
+
+At most max_concurrent requests run at once; the rest wait in a bounded
+priority queue for at most max_wait seconds. A free slot goes to the most
+urgent waiter first (lower priority value), then in arrival order. When the
+queue is full, an urgent request takes the place of the newest less urgent
+waiter, which is shed; otherwise the newcomer is shed. Shed requests get an
+Overloaded error and should be answered with 503 straight away, so callers
+fall back instead of timing out.
+
+While requests queue up beyond degrade_queue_depth (and for hold_seconds
+after), degraded() is true: the service stops starting its slow tiers, which
+is what lets the queue drain at the fast path's rate.
+
+One controller belongs to one event loop (one per worker process).
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2  # batch and stream work: served after interactive requests, evicted first
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str):
+        super().__init__(f"overloaded ({reason})")
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = 64,
+        max_queue: int = 256,
+        max_wait_seconds: float = 1.0,
+        degrade_queue_depth: int = 8,
+        hold_seconds: float = 2.0,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_seconds = max(0.0, max_wait_seconds)
+        self.degrade_queue_depth = max(1, degrade_queue_depth)
+        self.hold_seconds = max(0.0, hold_seconds)
+        self.in_flight = 0
+        # (priority, seq, future); entries whose future is done are stale and skipped.
+        self._queue: List[tuple] = []
+        self._waiting = 0
+        self._seq = itertools.count()
+        self._degraded_until = 0.0
+        self._stats: Dict[str, int] = {"admitted": 0, "queued": 0, "degraded": 0}
+        self._shed: Dict[str, int] = {}
+
+    def degraded(self) -> bool:
+        return time.monotonic() < self._degraded_until
+
+    def _mark_degraded(self) -> None:
+        if not self.degraded():
+            self._stats["degraded"] += 1
+        self._degraded_until = time.monotonic() + self.hold_seconds
+
+    def _shed_reason(self, reason: str) -> Overloaded:
+        self._shed[reason] = self._shed.get(reason, 0) + 1
+        self._mark_degraded()
+        return Overloaded(reason)
+
+    def _evict_for(self, priority: int) -> bool:
+        # Newest waiter among the least urgent ones, if it is less urgent than priority.
+        victim = None
+        for entry in self._queue:
+            if entry[2].done() or entry[0] <= priority:
+                continue
+            if victim is None or (entry[0], entry[1]) > (victim[0], victim[1]):
+                victim = entry
+        if victim is None:
+            return False
+        self._waiting -= 1
+        victim[2].set_exception(self._shed_reason("evicted"))
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL, max_wait: Optional[float] = None) -> None:
+        """Waits for a slot; raises Overloaded when shed. Pair with release()."""
+        if self.in_flight < self.max_concurrent and self._waiting == 0:
+            self.in_flight += 1
+            self._stats["admitted"] += 1
+            return
+        if self._waiting >= self.max_queue and not self._evict_for(priority):
+            raise self._shed_reason("queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), fut))
+        self._waiting += 1
+        self._stats["queued"] += 1
+        if self._waiting >= self.degrade_queue_depth:
+            self._mark_degraded()
+
+        timeout = self.max_wait_seconds if max_wait is None else max(0.0, min(max_wait, self.max_wait_seconds))
+        try:
+            await asyncio.wait({fut}, timeout=timeout)
+        except BaseException:
+            # Caller went away: give back a slot that was already handed over.
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.release()
+            elif not fut.done():
+                fut.cancel()
+                self._waiting -= 1
+            raise
+        if not fut.done():
+            fut.cancel()
+            self._waiting -= 1
+            raise self._shed_reason("timeout")
+        fut.result()  # raises Overloaded when evicted
+        self._stats["admitted"] += 1
+
+    def release(self) -> None:
+        # The slot passes straight to the next live waiter, if any.
+        while self._queue:
+            _, _, fut = heapq.heappop(self._queue)
+            if not fut.done():
+                self._waiting -= 1
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        out: dict = dict(self._stats)
+        out["shed"] = dict(self._shed)
+        out["in_flight"] = self.in_flight
+        out["queue_depth"] = self._waiting
+        out["degraded_now"] = self.degraded()
+        out["max_concurrent"] = self.max_concurrent
+        out["max_queue"] = self.max_queue
+        return out
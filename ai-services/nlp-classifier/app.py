@@ -1,17 +1,60 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List, Optional
-import joblib
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, field_validator
+from typing import Dict, FrozenSet, List, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import contextvars
+import functools
+import hashlib
+import logging
+import time
+import uuid
 import re
 import os
 import json
-import requests
+import httpx
 from pathlib import Path
-from transformers import pipeline
+
+import metrics
+from admission import PRIORITY_BULK, PRIORITY_HIGH, PRIORITY_NORMAL, AdmissionController, Overloaded
+from cloud_client import CloudClient, make_provider
+from kb_index import EmbeddingEncoder, KBIndex, TfidfProjectionEncoder
+from keyword_matcher import KeywordMatcher, any_hit, keyword_label
+from label_log import LabelLog
+from model_registry import ModelBundle, ModelRegistry
+from request_profiler import RequestProfiler, call_tracked
+from result_cache import ResultCache, make_key
+from similarity_index import SimilarityIndex, snapshot_paths, worker_snapshot_path
+from taxonomy import ZERO_SHOT_LABEL_SETS, teacher_labels
+from text_normalizer import NormalizedText, TextNormalizer
+from zero_shot_batcher import ZeroShotBatcher
+
+logger = logging.getLogger(__name__)
 
 MODEL_PATH = os.getenv("MODEL_PATH", "model/classifier.pkl")
 VECTORIZER_PATH = os.getenv("VECTORIZER_PATH", "model/vectorizer.pkl")
 INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "model/intent_classifier.pkl")
+RISK_MODEL_PATH = os.getenv("RISK_MODEL_PATH", "model/risk_classifier.pkl")
+# Native NumPy bundle exported by train.py; preferred over the .pkl files when present
+MODEL_BUNDLE_DIR = os.getenv("MODEL_BUNDLE_DIR", "model/bundle")
+try:
+    MODEL_WATCH_INTERVAL_SECONDS = float(os.getenv("AI_MODEL_WATCH_INTERVAL_SECONDS", "10"))  # 0 = no watching
+except Exception:
+    MODEL_WATCH_INTERVAL_SECONDS = 10.0
+ADMIN_TOKEN = os.getenv("AI_ADMIN_TOKEN", "").strip()  # empty = admin endpoints disabled
+# Worker processes serving the app: AI_WORKERS (python app.py), else WEB_CONCURRENCY, the
+# worker count uvicorn --workers and gunicorn default to. State kept per process (the KB
+# index, the similarity index) depends on it; set one of them when passing --workers.
+try:
+    WORKERS = max(1, int(os.getenv("AI_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1"))
+except Exception:
+    WORKERS = 1
+# Memory-map numeric model arrays read-only so pre-forked workers share them ("" = load into heap)
+MODEL_MMAP_MODE = os.getenv("AI_MODEL_MMAP_MODE", "r").strip() or None
 
 # Optional cloud fallback
 CLOUD_PROVIDER = os.getenv("AI_CLOUD_PROVIDER", "").strip().lower()  # "hf" | "openai"
@@ -30,6 +73,8 @@ except Exception:
 
 LOCAL_HF_ENABLED = os.getenv("AI_LOCAL_HF_ENABLED", "").strip().lower() in ("1", "true", "yes", "on")
 LOCAL_HF_MODEL = os.getenv("AI_LOCAL_HF_MODEL", "typeform/distilbert-base-uncased-mnli").strip()
+# int8 export from zero_shot_export.py; when set it is served instead of the fp32 AI_LOCAL_HF_MODEL
+LOCAL_HF_QUANTIZED_DIR = os.getenv("AI_LOCAL_HF_QUANTIZED_DIR", "").strip()
 try:
     LOCAL_HF_TRIGGER_THRESHOLD = float(os.getenv("AI_LOCAL_HF_TRIGGER_THRESHOLD", "0.55"))
 except Exception:
@@ -38,44 +83,415 @@ try:
     LOCAL_HF_MIN_SCORE = float(os.getenv("AI_LOCAL_HF_MIN_SCORE", "0.60"))
 except Exception:
     LOCAL_HF_MIN_SCORE = 0.60
+try:
+    LOCAL_HF_MAX_BATCH = int(os.getenv("AI_LOCAL_HF_MAX_BATCH", "16"))
+except Exception:
+    LOCAL_HF_MAX_BATCH = 16
+try:
+    LOCAL_HF_MAX_WAIT_MS = float(os.getenv("AI_LOCAL_HF_MAX_WAIT_MS", "10"))
+except Exception:
+    LOCAL_HF_MAX_WAIT_MS = 10.0
+
+# Escalation thresholds chosen by tune_thresholds.py against the calibrated model;
+# the AI_* variables above still take precedence when they are set explicitly.
+THRESHOLDS_PATH = os.getenv("AI_THRESHOLDS_PATH", "model/thresholds.json").strip()
+tuned_thresholds: dict = {}
+if THRESHOLDS_PATH and Path(THRESHOLDS_PATH).exists():
+    try:
+        tuned_thresholds = json.loads(Path(THRESHOLDS_PATH).read_text(encoding="utf-8"))
+        if "AI_LOCAL_HF_TRIGGER_THRESHOLD" not in os.environ and "local_hf_trigger_threshold" in tuned_thresholds:
+            LOCAL_HF_TRIGGER_THRESHOLD = float(tuned_thresholds["local_hf_trigger_threshold"])
+        if "AI_CLOUD_CONFIDENCE_THRESHOLD" not in os.environ and "cloud_confidence_threshold" in tuned_thresholds:
+            CLOUD_CONFIDENCE_THRESHOLD = float(tuned_thresholds["cloud_confidence_threshold"])
+    except Exception as e:
+        print(f"Failed to load tuned thresholds from {THRESHOLDS_PATH}: {e}")
+        tuned_thresholds = {}
+
+# Confidence of the keyword rules for a text with no in-vocabulary term. It stays
+# below both escalation thresholds, so such texts are always sent on to the slow
+# tiers instead of being served a keyword guess with the model's confidence.
+try:
+    OOV_FALLBACK_CONFIDENCE = float(os.getenv("AI_OOV_FALLBACK_CONFIDENCE", ""))
+except Exception:
+    OOV_FALLBACK_CONFIDENCE = max(0.0, round(min(LOCAL_HF_TRIGGER_THRESHOLD, CLOUD_CONFIDENCE_THRESHOLD) - 0.05, 3))
+
+# Ranked alternatives returned by /predict (top_categories, top_intents); 0 = best label only
+try:
+    PREDICT_TOP_K = int(os.getenv("AI_PREDICT_TOP_K", "3"))
+except Exception:
+    PREDICT_TOP_K = 3
+
+# Batch endpoints (/predict_batch, /enrich_batch)
+try:
+    BATCH_MAX_ITEMS = int(os.getenv("AI_BATCH_MAX_ITEMS", "5000"))
+except Exception:
+    BATCH_MAX_ITEMS = 5000
+try:
+    BATCH_CHUNK_SIZE = int(os.getenv("AI_BATCH_CHUNK_SIZE", "512"))
+except Exception:
+    BATCH_CHUNK_SIZE = 512
+try:
+    STREAM_MAX_LINE_BYTES = int(os.getenv("AI_STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
+except Exception:
+    STREAM_MAX_LINE_BYTES = 1024 * 1024
+
+# Admission control for /enrich: bounded concurrency and a bounded priority queue with a max wait;
+# security and HIGH-priority tickets go first. While requests queue beyond AI_ADMISSION_DEGRADE_QUEUE
+# the slow tiers are shed and only the keyword/TF-IDF path runs.
+ADMISSION_ENABLED = os.getenv("AI_ADMISSION_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+try:
+    ADMISSION_MAX_CONCURRENT = int(os.getenv("AI_ADMISSION_MAX_CONCURRENT", "64"))
+except Exception:
+    ADMISSION_MAX_CONCURRENT = 64
+try:
+    ADMISSION_MAX_QUEUE = int(os.getenv("AI_ADMISSION_MAX_QUEUE", "256"))
+except Exception:
+    ADMISSION_MAX_QUEUE = 256
+try:
+    ADMISSION_MAX_WAIT_MS = float(os.getenv("AI_ADMISSION_MAX_WAIT_MS", "1000"))
+except Exception:
+    ADMISSION_MAX_WAIT_MS = 1000.0
+try:
+    ADMISSION_DEGRADE_QUEUE = int(os.getenv("AI_ADMISSION_DEGRADE_QUEUE", "8"))
+except Exception:
+    ADMISSION_DEGRADE_QUEUE = 8
+try:
+    ADMISSION_DEGRADE_HOLD_SECONDS = float(os.getenv("AI_ADMISSION_DEGRADE_HOLD_SECONDS", "2"))
+except Exception:
+    ADMISSION_DEGRADE_HOLD_SECONDS = 2.0
+try:
+    ADMISSION_RANK_CHARS = int(os.getenv("AI_ADMISSION_RANK_CHARS", "2000"))  # scanned for urgent terms before queueing
+except Exception:
+    ADMISSION_RANK_CHARS = 2000
+
+# Async serving: CPU-bound inference runs on dedicated executors, cloud calls on a pooled async client
+try:
+    INFERENCE_WORKERS = int(os.getenv("AI_INFERENCE_WORKERS", str(min(8, os.cpu_count() or 2))))
+except Exception:
+    INFERENCE_WORKERS = 4
+try:
+    LOCAL_HF_WORKERS = int(os.getenv("AI_LOCAL_HF_WORKERS", "1"))
+except Exception:
+    LOCAL_HF_WORKERS = 1
+try:
+    CLOUD_MAX_CONNECTIONS = int(os.getenv("AI_CLOUD_MAX_CONNECTIONS", "20"))
+except Exception:
+    CLOUD_MAX_CONNECTIONS = 20
+try:
+    CLOUD_MAX_CONCURRENCY = int(os.getenv("AI_CLOUD_MAX_CONCURRENCY", "8"))
+except Exception:
+    CLOUD_MAX_CONCURRENCY = 8
+# Cloud client: token-bucket rate limit, multi-item prompts and circuit breaker (per provider)
+try:
+    CLOUD_RATE_PER_SECOND = float(os.getenv("AI_CLOUD_RATE_PER_SECOND", "0"))  # 0 = unlimited
+except Exception:
+    CLOUD_RATE_PER_SECOND = 0.0
+try:
+    CLOUD_BURST = float(os.getenv("AI_CLOUD_BURST", "0"))  # 0 = one second's worth of requests
+except Exception:
+    CLOUD_BURST = 0.0
+try:
+    CLOUD_MAX_BATCH = int(os.getenv("AI_CLOUD_MAX_BATCH", "8"))  # tickets per prompt; 1 = one request per ticket
+except Exception:
+    CLOUD_MAX_BATCH = 8
+try:
+    CLOUD_BATCH_WAIT_MS = float(os.getenv("AI_CLOUD_BATCH_WAIT_MS", "20"))
+except Exception:
+    CLOUD_BATCH_WAIT_MS = 20.0
+try:
+    CLOUD_BREAKER_FAILURES = int(os.getenv("AI_CLOUD_BREAKER_FAILURES", "5"))  # 0 = never open
+except Exception:
+    CLOUD_BREAKER_FAILURES = 5
+try:
+    CLOUD_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_CLOUD_BREAKER_COOLDOWN_SECONDS", "30"))
+except Exception:
+    CLOUD_BREAKER_COOLDOWN_SECONDS = 30.0
+
+# Deadlines: callers send a time budget (X-Deadline-Ms header or deadline_ms body field)
+try:
+    DEFAULT_DEADLINE_MS = int(os.getenv("AI_DEFAULT_DEADLINE_MS", "0"))  # 0 = no deadline
+except Exception:
+    DEFAULT_DEADLINE_MS = 0
+try:
+    RESULT_STORE_MAX = int(os.getenv("AI_RESULT_STORE_MAX", "10000"))
+except Exception:
+    RESULT_STORE_MAX = 10000
+try:
+    RESULT_STORE_TTL_SECONDS = float(os.getenv("AI_RESULT_STORE_TTL_SECONDS", "3600"))
+except Exception:
+    RESULT_STORE_TTL_SECONDS = 3600.0
+
+# Input normalization, once per request: reply chains, quoted lines, base64 runs and
+# signatures are dropped and the analysed text is capped to a head and a tail window
+try:
+    NORMALIZE_HEAD_CHARS = int(os.getenv("AI_NORMALIZE_HEAD_CHARS", "8000"))
+except Exception:
+    NORMALIZE_HEAD_CHARS = 8000
+try:
+    NORMALIZE_TAIL_CHARS = int(os.getenv("AI_NORMALIZE_TAIL_CHARS", "2000"))
+except Exception:
+    NORMALIZE_TAIL_CHARS = 2000
+NORMALIZE_STRIP_REPLIES = os.getenv("AI_NORMALIZE_STRIP_REPLIES", "1").strip().lower() in ("1", "true", "yes", "on")
+NORMALIZE_STRIP_SIGNATURES = os.getenv("AI_NORMALIZE_STRIP_SIGNATURES", "1").strip().lower() in ("1", "true", "yes", "on")
+
+# Entity extraction bounds: per-type limit and head/tail windows for very long bodies
+try:
+    ENTITY_LIMIT = int(os.getenv("AI_ENTITY_LIMIT", "5"))
+except Exception:
+    ENTITY_LIMIT = 5
+try:
+    ENTITY_SCAN_HEAD_CHARS = int(os.getenv("AI_ENTITY_SCAN_HEAD_CHARS", "16000"))
+except Exception:
+    ENTITY_SCAN_HEAD_CHARS = 16000
+try:
+    ENTITY_SCAN_TAIL_CHARS = int(os.getenv("AI_ENTITY_SCAN_TAIL_CHARS", "4000"))
+except Exception:
+    ENTITY_SCAN_TAIL_CHARS = 4000
+
+# Result cache for /enrich (keyed on normalized text + model fingerprint)
+CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+try:
+    CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "10000"))
+except Exception:
+    CACHE_MAX_ENTRIES = 10000
+try:
+    CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "86400"))
+except Exception:
+    CACHE_TTL_SECONDS = 86400.0
+CACHE_DB_PATH = os.getenv("AI_CACHE_DB_PATH", "").strip()  # empty = memory only
+try:
+    CACHE_DB_MAX_ENTRIES = int(os.getenv("AI_CACHE_DB_MAX_ENTRIES", "100000"))
+except Exception:
+    CACHE_DB_MAX_ENTRIES = 100000
+try:
+    # Writes between purges of expired and over-cap SQLite rows
+    CACHE_DB_PURGE_EVERY = int(os.getenv("AI_CACHE_DB_PURGE_EVERY", "1000"))
+except Exception:
+    CACHE_DB_PURGE_EVERY = 1000
+
+# Similar-ticket index over recent TF-IDF vectors (per worker process)
+SIMILAR_ENABLED = os.getenv("AI_SIMILAR_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+try:
+    SIMILAR_MAX_ENTRIES = int(os.getenv("AI_SIMILAR_MAX_ENTRIES", "50000"))
+except Exception:
+    SIMILAR_MAX_ENTRIES = 50000
+try:
+    SIMILAR_WINDOW_SECONDS = float(os.getenv("AI_SIMILAR_WINDOW_SECONDS", "86400"))  # 0 = no time window
+except Exception:
+    SIMILAR_WINDOW_SECONDS = 86400.0
+try:
+    SIMILAR_MIN_SCORE = float(os.getenv("AI_SIMILAR_MIN_SCORE", "0.3"))
+except Exception:
+    SIMILAR_MIN_SCORE = 0.3
+try:
+    SIMILAR_DUPLICATE_SCORE = float(os.getenv("AI_SIMILAR_DUPLICATE_SCORE", "0.9"))
+except Exception:
+    SIMILAR_DUPLICATE_SCORE = 0.9
+SIMILAR_SNAPSHOT_PATH = os.getenv("AI_SIMILAR_SNAPSHOT_PATH", "").strip()  # empty = no snapshot/restore
+
+# KB article search: "tfidf" (projected classifier features) or "embedding" (local transformer)
+KB_ENABLED = os.getenv("AI_KB_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+KB_ENCODER = os.getenv("AI_KB_ENCODER", "tfidf").strip().lower()
+KB_EMBEDDING_MODEL = os.getenv("AI_KB_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2").strip()
+try:
+    KB_DIM = int(os.getenv("AI_KB_DIM", "256"))
+except Exception:
+    KB_DIM = 256
+KB_SNAPSHOT_PATH = os.getenv("AI_KB_SNAPSHOT_PATH", "").strip()  # empty = articles are re-ingested after restarts
+
+# Teacher labels from the slow tiers, appended for `train.py --distill` (empty = off),
+# e.g. data/train.generated.jsonl, which train.py already reads
+LABEL_LOG_PATH = os.getenv("AI_LABEL_LOG_PATH", "").strip()
+
+# Per-stage durations on every response, e.g. "vectorize;dur=0.41, cloud;dur=812.00, total;dur=815.30"
+SERVER_TIMING_ENABLED = os.getenv("AI_SERVER_TIMING", "1").strip().lower() in ("1", "true", "yes", "on")
+
+# Sampling profiler: AI_PROFILE_ENABLED samples every request and keeps the ones slower
+# than AI_PROFILE_SLOW_MS. With AI_PROFILE_HEADER on, "X-Profile: 1" sent together with a
+# valid X-Admin-Token samples (and always keeps) a single request
+PROFILE_ENABLED = os.getenv("AI_PROFILE_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_HEADER_ENABLED = os.getenv("AI_PROFILE_HEADER", "0").strip().lower() in ("1", "true", "yes", "on")
+try:
+    PROFILE_SLOW_MS = float(os.getenv("AI_PROFILE_SLOW_MS", "500"))
+except Exception:
+    PROFILE_SLOW_MS = 500.0
+try:
+    PROFILE_INTERVAL_MS = float(os.getenv("AI_PROFILE_INTERVAL_MS", "5"))
+except Exception:
+    PROFILE_INTERVAL_MS = 5.0
+try:
+    PROFILE_KEEP = int(os.getenv("AI_PROFILE_KEEP", "50"))
+except Exception:
+    PROFILE_KEEP = 50
+PROFILE_DIR = os.getenv("AI_PROFILE_DIR", "").strip()  # empty = kept in memory only
 
 # Try to load models
-model = None
-intent_model = None
-vectorizer = None
+model_registry = ModelRegistry(
+    MODEL_PATH,
+    VECTORIZER_PATH,
+    INTENT_MODEL_PATH,
+    risk_model_path=RISK_MODEL_PATH,
+    bundle_dir=MODEL_BUNDLE_DIR,
+    mmap_mode=MODEL_MMAP_MODE,
+)
 
 hf_zero_shot = None
 
 try:
-    if Path(MODEL_PATH).exists() and Path(VECTORIZER_PATH).exists():
-        model = joblib.load(MODEL_PATH)
-        vectorizer = joblib.load(VECTORIZER_PATH)
-        print(f"Successfully loaded model from {MODEL_PATH}")
+    _, load_error = model_registry.reload()
+    if model_registry.current() is not None:
+        bundle = model_registry.current()
+        source = MODEL_BUNDLE_DIR if bundle.source == "native" else MODEL_PATH
+        print(f"Successfully loaded model version {bundle.version} from {source}")
+        if bundle.has_intent:
+            print("Successfully loaded intent model")
+        if bundle.has_risk:
+            print("Successfully loaded risk model (serving learned priority)")
+        if tuned_thresholds:
+            print(
+                f"Escalation thresholds: local {LOCAL_HF_TRIGGER_THRESHOLD}, cloud {CLOUD_CONFIDENCE_THRESHOLD}"
+                f" (tuned for model {tuned_thresholds.get('model_version')})"
+            )
+            if tuned_thresholds.get("model_version") not in (None, bundle.version):
+                print("Tuned thresholds were swept on a different model version; re-run tune_thresholds.py")
     else:
         print(f"Model files not found. Using fallback classification.")
         print(f"Expected: {MODEL_PATH}, {VECTORIZER_PATH}")
-
-    if Path(INTENT_MODEL_PATH).exists():
-        intent_model = joblib.load(INTENT_MODEL_PATH)
-        print(f"Successfully loaded intent model from {INTENT_MODEL_PATH}")
+        if load_error:
+            print(load_error)
 
     if LOCAL_HF_ENABLED:
-        hf_zero_shot = pipeline("zero-shot-classification", model=LOCAL_HF_MODEL)
-        print(f"Successfully loaded local HF model: {LOCAL_HF_MODEL}")
+        # transformers (and torch) are only imported when the local tier is on.
+        if LOCAL_HF_QUANTIZED_DIR:
+            from zero_shot_export import load_quantized_pipeline
+
+            hf_zero_shot = load_quantized_pipeline(LOCAL_HF_QUANTIZED_DIR)
+            print(f"Successfully loaded quantized local HF model: {LOCAL_HF_QUANTIZED_DIR}")
+        else:
+            from transformers import pipeline
+
+            hf_zero_shot = pipeline("zero-shot-classification", model=LOCAL_HF_MODEL)
+            print(f"Successfully loaded local HF model: {LOCAL_HF_MODEL}")
 except Exception as e:
     print(f"Failed to load model: {e}")
     print("Using fallback classification.")
 
+@functools.lru_cache(maxsize=64)
+def _cache_fingerprint(model_version: Optional[str]) -> str:
+    # Identifies everything that can change an enrichment result for the same text:
+    # the artifact bundle version plus the escalation tiers that are configured.
+    h = hashlib.sha256()
+    h.update(f"model={model_version or 'fallback'}".encode("utf-8"))
+    h.update(f"|hf={(LOCAL_HF_QUANTIZED_DIR or LOCAL_HF_MODEL) if hf_zero_shot else ''}".encode("utf-8"))
+    h.update(f"|cloud={CLOUD_PROVIDER}:{HF_MODEL if CLOUD_PROVIDER == 'hf' else OPENAI_MODEL}".encode("utf-8"))
+    h.update(
+        f"|thresholds={LOCAL_HF_TRIGGER_THRESHOLD},{LOCAL_HF_MIN_SCORE},{CLOUD_CONFIDENCE_THRESHOLD}".encode("utf-8")
+    )
+    return h.hexdigest()[:16]
+
+result_cache: Optional[ResultCache] = None
+if CACHE_ENABLED:
+    try:
+        result_cache = ResultCache(
+            CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_DB_PATH, CACHE_DB_MAX_ENTRIES, CACHE_DB_PURGE_EVERY
+        )
+        result_cache.set_fingerprint(_cache_fingerprint(model_registry.version))
+        result_cache.purge_expired()
+        # A swapped-in bundle invalidates everything computed by the previous one.
+        model_registry.on_swap(lambda bundle: result_cache.set_fingerprint(_cache_fingerprint(bundle.version)))
+    except Exception as e:
+        print(f"Failed to initialise result cache: {e}")
+        result_cache = None
+
+similar_index: Optional[SimilarityIndex] = None
+if SIMILAR_ENABLED:
+    similar_index = SimilarityIndex(SIMILAR_MAX_ENTRIES, SIMILAR_WINDOW_SECONDS)
+    similar_index.reset(model_registry.version)
+    try:
+        # Per-worker snapshots of a pre-fork run are merged, so every worker starts from all of them.
+        restored = similar_index.restore(snapshot_paths(SIMILAR_SNAPSHOT_PATH), model_registry.version)
+        if restored:
+            print(f"Restored {restored} tickets into the similarity index from {SIMILAR_SNAPSHOT_PATH}")
+    except Exception as e:
+        print(f"Failed to restore similarity index: {e}")
+    # Vectors from different models live in different spaces.
+    model_registry.on_swap(lambda bundle: similar_index.reset(bundle.version))
+
+label_log: Optional[LabelLog] = LabelLog(LABEL_LOG_PATH) if LABEL_LOG_PATH else None
+
+profiler: Optional[RequestProfiler] = (
+    RequestProfiler(PROFILE_INTERVAL_MS, PROFILE_SLOW_MS, PROFILE_KEEP, PROFILE_DIR)
+    if PROFILE_ENABLED or PROFILE_HEADER_ENABLED
+    else None
+)
+
 class PredictRequest(BaseModel):
     text: str
 
+class LabelScore(BaseModel):
+    label: str
+    score: float
+
 class PredictResponse(BaseModel):
     category: str
     intent: str
     confidence: float
+    model_version: Optional[str] = None
+    priority: Optional[str] = None  # set when the bundle has a trained risk head
+    top_categories: Optional[List[LabelScore]] = None  # model ranking, best first (AI_PREDICT_TOP_K)
+    top_intents: Optional[List[LabelScore]] = None
 
 class EnrichRequest(BaseModel):
     text: str
+    deadline_ms: Optional[int] = None
+    complete_in_background: bool = False
+    callback_url: Optional[str] = None
+    ticket_id: Optional[str] = None  # indexed for later /similar lookups when given
+    similar_k: int = 0  # > 0 attaches the most similar recent tickets
+
+class KBArticle(BaseModel):
+    id: str
+    title: str
+    body: str = ""
+    category: Optional[str] = None
+    tags: List[str] = []
+
+class KBIngestRequest(BaseModel):
+    articles: List[KBArticle]
+
+class KBSearchRequest(BaseModel):
+    text: str
+    k: int = 5
+    category: Optional[str] = None
+    min_score: float = 0.0
+
+class KBSearchResult(BaseModel):
+    id: str
+    title: str
+    category: Optional[str] = None
+    score: float
+
+class KBSearchResponse(BaseModel):
+    results: List[KBSearchResult]
+    encoder: Optional[str] = None
+
+class SimilarRequest(BaseModel):
+    text: str
+    ticket_id: Optional[str] = None
+    k: int = 5
+    min_score: Optional[float] = None
+    add: bool = True  # index this ticket (requires ticket_id)
+
+class SimilarTicket(BaseModel):
+    ticket_id: str
+    score: float
+    duplicate: bool
+    age_seconds: float
+
+class SimilarResponse(BaseModel):
+    matches: List[SimilarTicket]
+    indexed: bool = False
+    model_version: Optional[str] = None
 
 class EnrichResponse(BaseModel):
     category: str
@@ -89,74 +505,157 @@ class EnrichResponse(BaseModel):
     suggested_workflow: Optional[str] = None
     approval_title: Optional[str] = None
     approval_body: Optional[str] = None
+    tiers_run: List[str] = []
+    partial: bool = False
+    result_id: Optional[str] = None
+    cached: bool = False
+    model_version: Optional[str] = None
+    similar: Optional[List[SimilarTicket]] = None
+
+class EnrichResultStatus(BaseModel):
+    result_id: str
+    status: str  # "pending" | "done"
+    result: Optional[EnrichResponse] = None
+
+class BatchItem(BaseModel):
+    # Ticket ids are often numeric in the caller's system; they are echoed back as strings.
+    id: Optional[Union[str, int]] = None
+    text: Optional[str] = None
+
+    @field_validator("id")
+    @classmethod
+    def _id_as_str(cls, v):
+        return str(v) if v is not None else None
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    deadline_ms: Optional[int] = None
+    complete_in_background: bool = False
+    callback_url: Optional[str] = None
+
+class PredictBatchResult(BaseModel):
+    id: Optional[str] = None
+    result: Optional[PredictResponse] = None
+    error: Optional[str] = None
+
+class PredictBatchResponse(BaseModel):
+    results: List[PredictBatchResult]
+
+class EnrichBatchResult(BaseModel):
+    id: Optional[str] = None
+    result: Optional[EnrichResponse] = None
+    error: Optional[str] = None
+
+class EnrichBatchResponse(BaseModel):
+    results: List[EnrichBatchResult]
 
 def clean_text(text: str) -> str:
     text = text.lower()
     text = re.sub(r"[^a-z0-9\s]", "", text)
     return text
 
-def is_security_text(text: str) -> bool:
-    lower = text.lower()
-    return any(
-        k in lower
-        for k in [
-            "phishing",
-            "suspicious",
-            "malware",
-            "ransomware",
-            "virus",
-            "trojan",
-            "hack",
-            "hacked",
-            "breach",
-            "data breach",
-            "unauthorized",
-            "security incident",
-        ]
-    )
+# === Keyword rule tables ===
+# Phrases are matched on word boundaries; a trailing "*" makes a phrase a prefix.
+# Every rule below reads from one precompiled scan of the ticket (match_keywords).
 
-def _extract_json_object(text: str) -> Optional[dict]:
-    # Extract the first JSON object found in a possibly chatty model response.
-    if not text:
-        return None
-    m = re.search(r"\{[\s\S]*\}", text)
-    if not m:
-        return None
-    chunk = m.group(0)
-    try:
-        return json.loads(chunk)
-    except Exception:
-        return None
+_SECURITY_TERMS = [
+    "phishing", "suspicious", "malware", "ransomware", "virus*", "trojan",
+    "hack*", "hacked", "breach*", "data breach", "unauthorized", "unauthorised", "security incident",
+]
 
-_CATEGORIES = [
-    "IDENTITY_ACCESS",
-    "NETWORK_VPN_WIFI",
-    "EMAIL_COLLAB",
-    "ENDPOINT_DEVICE",
-    "HARDWARE_PERIPHERAL",
-    "SOFTWARE_INSTALL_LICENSE",
-    "BUSINESS_APP_ERP_CRM",
-    "SECURITY_INCIDENT",
-    "KB_GENERAL",
-    "OTHER",
+# First matching rule wins: (category, confidence, phrases)
+_FALLBACK_CATEGORY_RULES = [
+    ("IDENTITY_ACCESS", 0.75, ["password*", "reset*", "forgot*", "account*", "login*", "access", "unlock*", "locked", "username*"]),
+    ("NETWORK_VPN_WIFI", 0.75, ["wifi", "wi-fi", "wireless", "network*", "vpn", "internet", "connection*", "connect*", "cannot connect", "no internet", "slow internet"]),
+    ("EMAIL_COLLAB", 0.75, ["email*", "e-mail*", "outlook", "mail", "calendar*", "not sending", "not receiving", "mailbox*"]),
+    ("HARDWARE_PERIPHERAL", 0.75, ["laptop*", "computer*", "printer*", "monitor*", "keyboard*", "mouse", "hardware", "screen*", "display*", "headphone*"]),
+    ("SOFTWARE_INSTALL_LICENSE", 0.75, ["software", "install*", "application*", "app", "apps", "program*", "update*", "license*", "licence*", "crash*"]),
+    ("BUSINESS_APP_ERP_CRM", 0.8, ["sap", "oracle", "crm", "erp", "salesforce", "business app*"]),
+    ("SECURITY_INCIDENT", 0.85, ["phishing", "malware", "security", "virus*", "hack*", "breach*", "suspicious", "stolen", "lost laptop"]),
+    ("OTHER", 0.7, ["backup*", "backup failed", "backup not working", "backup error", "cannot backup", "restore*"]),
+    ("KB_GENERAL", 0.7, ["how", "how to", "how do", "tutorial*", "guide*", "steps"]),
 ]
+_FALLBACK_DEFAULT = ("OTHER", 0.6)
 
-_INTENTS = [
-    "INCIDENT",
-    "SERVICE_REQUEST",
-    "HOW_TO",
-    "SECURITY_REPORT",
-    "PASSWORD_RESET",
-    "ACCOUNT_UNLOCK",
-    "UNKNOWN",
+_KEYWORD_CANDIDATES = [
+    "password", "reset", "unlock", "locked", "login", "access",
+    "vpn", "wifi", "network", "internet", "connection",
+    "email", "outlook", "mail", "calendar",
+    "printer", "print*", "laptop", "computer", "screen", "mouse", "keyboard",
+    "install*", "software", "update*", "license",
+    "phishing", "malware", "security", "virus", "hack*",
+    "sap", "oracle", "crm", "erp",
+    "urgent", "critical", "down", "broken", "error*",
 ]
 
-def _local_hf_enrich(text: str) -> Optional[dict]:
-    if not hf_zero_shot:
-        return None
+# Risk head label -> ticket priority (tickets only have LOW/MEDIUM/HIGH)
+_RISK_PRIORITY = {"LOW": "LOW", "MEDIUM": "MEDIUM", "HIGH": "HIGH", "CRITICAL": "HIGH"}
+
+# Keyword fallback when there is no risk head.
+# First matching rule wins: (priority, phrases); no match -> LOW
+_PRIORITY_RULES = [
+    ("HIGH", _SECURITY_TERMS),
+    ("HIGH", ["urgent*", "critical", "down", "outage*", "cannot work", "blocked"]),
+    ("MEDIUM", ["can't", "cannot", "not working", "error*"]),
+]
+
+# First matching rule wins: (workflow, required category or None, phrases, approval title, approval body)
+_WORKFLOW_RULES = [
+    ("PASSWORD_RESET", None, ["password*", "reset*", "forgot*"],
+     "Confirm password reset", "AI can reset your password and send a reset notification. Approve to proceed."),
+    ("ACCOUNT_UNLOCK", None, ["account*", "unlock*", "locked", "lockout"],
+     "Confirm account unlock", "AI can unlock your account. Approve to proceed."),
+    ("VPN_BASIC_FIX", "NETWORK_VPN_WIFI", ["vpn", "connect*", "connection*"],
+     "Confirm VPN troubleshooting", "AI can run automated VPN connectivity checks and guide you through fixes. Approve to proceed."),
+    ("PRINTER_TROUBLESHOOT", "HARDWARE_PERIPHERAL", ["printer*", "print*"],
+     "Confirm printer troubleshooting", "AI can run printer troubleshooting steps and guide you. Approve to proceed."),
+]
+
+_keyword_matcher = KeywordMatcher(
+    _SECURITY_TERMS
+    + [p for _, _, phrases in _FALLBACK_CATEGORY_RULES for p in phrases]
+    + _KEYWORD_CANDIDATES
+    + [p for _, phrases in _PRIORITY_RULES for p in phrases]
+    + [p for _, _, phrases, _, _ in _WORKFLOW_RULES for p in phrases]
+)
+
+def match_keywords(text: str) -> FrozenSet[str]:
+    """Scan the ticket once; the result feeds every keyword rule for the request."""
+    return _keyword_matcher.match(text.lower())
+
+_text_normalizer = TextNormalizer(
+    NORMALIZE_HEAD_CHARS, NORMALIZE_TAIL_CHARS, NORMALIZE_STRIP_REPLIES, NORMALIZE_STRIP_SIGNATURES
+)
+
+def normalize_text(text: str) -> NormalizedText:
+    """The one pass over the raw ticket; everything downstream reads its variants."""
+    with metrics.stage("normalize"):
+        norm = _text_normalizer.normalize(text)
+    for step in norm.trimmed:
+        INPUT_TRIMMED.inc(step=step)
+    return norm
+
+def is_security_text(text: str, hits: Optional[FrozenSet[str]] = None) -> bool:
+    if hits is None:
+        hits = match_keywords(text)
+    return any_hit(hits, _SECURITY_TERMS)
+
+# Concurrent zero-shot requests are micro-batched; category and intent labels
+# are scored in the same forward pass on AI_LOCAL_HF_WORKERS batcher threads.
+hf_batcher: Optional[ZeroShotBatcher] = None
+if hf_zero_shot is not None:
+    hf_batcher = ZeroShotBatcher(
+        hf_zero_shot,
+        ZERO_SHOT_LABEL_SETS,
+        max_batch_size=LOCAL_HF_MAX_BATCH,
+        max_wait_ms=LOCAL_HF_MAX_WAIT_MS,
+        workers=LOCAL_HF_WORKERS,
+    )
+
+def _local_hf_from_scores(res: Optional[dict]) -> Optional[dict]:
     try:
-        cat_res = hf_zero_shot(text, candidate_labels=_CATEGORIES, multi_label=False)
-        it_res = hf_zero_shot(text, candidate_labels=_INTENTS, multi_label=False)
+        cat_res = res["category"]
+        it_res = res["intent"]
 
         cat = cat_res.get("labels", [None])[0]
         cat_score = cat_res.get("scores", [0.0])[0]
@@ -174,9 +673,79 @@ def _local_hf_enrich(text: str) -> Optional[dict]:
             "intent": it,
             "confidence": confidence,
         }
-    except Exception:
+    except Exception as e:
+        LOCAL_HF_ERRORS.inc(error=type(e).__name__)
         return None
 
+def _local_hf_enrich(text: str) -> Optional[dict]:
+    if not hf_batcher:
+        return None
+    try:
+        return _local_hf_from_scores(hf_batcher.submit(text).result())
+    except Exception as e:
+        LOCAL_HF_ERRORS.inc(error=type(e).__name__)
+        return None
+
+# CPU-bound fast path (TF-IDF + regex) runs on its own pool; the transformer runs
+# on the batcher threads, so a slow zero-shot batch never delays a prediction.
+_inference_executor = ThreadPoolExecutor(max_workers=max(1, INFERENCE_WORKERS), thread_name_prefix="inference")
+
+_http_client: Optional[httpx.AsyncClient] = None
+_cloud_client: Optional[CloudClient] = None
+
+admission: Optional[AdmissionController] = (
+    AdmissionController(
+        ADMISSION_MAX_CONCURRENT,
+        ADMISSION_MAX_QUEUE,
+        ADMISSION_MAX_WAIT_MS / 1000.0,
+        ADMISSION_DEGRADE_QUEUE,
+        ADMISSION_DEGRADE_HOLD_SECONDS,
+    )
+    if ADMISSION_ENABLED
+    else None
+)
+
+REQUEST_SECONDS = metrics.Histogram("ai_request_seconds", "End-to-end request latency", ["endpoint"])
+REQUESTS = metrics.Counter("ai_requests_total", "Requests served", ["endpoint", "status"])
+TIER_DECISIONS = metrics.Counter(
+    "ai_tier_decisions_total",
+    "Escalation tier outcomes (ran, confident, disabled, shed, circuit_open, budget, timeout, no_result)",
+    ["tier", "outcome"],
+)
+CLOUD_REQUESTS = metrics.Counter("ai_cloud_requests_total", "Cloud provider calls by outcome", ["provider", "outcome"])
+LOCAL_HF_ERRORS = metrics.Counter("ai_local_hf_errors_total", "Local zero-shot failures", ["error"])
+INPUT_TRIMMED = metrics.Counter("ai_input_trimmed_total", "Tickets shortened by normalization", ["step"])
+OOV_FALLBACKS = metrics.Counter("ai_oov_fallbacks_total", "Texts without an in-vocabulary term, sent to the keyword rules")
+
+async def _run_inference(fn, *args):
+    # copy_context() carries the request's stage timings (and profile session) into the worker thread.
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_inference_executor, functools.partial(ctx.run, call_tracked, fn, *args))
+
+async def _run_local_hf(text: str) -> Optional[dict]:
+    if not hf_batcher:
+        return None
+    try:
+        return _local_hf_from_scores(await asyncio.wrap_future(hf_batcher.submit(text)))
+    except Exception as e:
+        LOCAL_HF_ERRORS.inc(error=type(e).__name__)
+        return None
+
+def _get_http_client() -> httpx.AsyncClient:
+    # Keep-alive pool shared by every cloud call; created lazily on the serving loop.
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=CLOUD_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=max(1, CLOUD_MAX_CONNECTIONS),
+                max_keepalive_connections=max(1, CLOUD_MAX_CONNECTIONS),
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _http_client
+
 def _cloud_enabled() -> bool:
     if CLOUD_PROVIDER == "hf":
         return bool(HF_API_TOKEN and HF_MODEL)
@@ -184,290 +753,1216 @@ def _cloud_enabled() -> bool:
         return bool(OPENAI_API_KEY)
     return False
 
-def _cloud_enrich(text: str) -> Optional[dict]:
+def _get_cloud_client() -> Optional[CloudClient]:
+    # Created lazily on the serving loop, like the HTTP client it sends through.
+    global _cloud_client
+    if _cloud_client is None and _cloud_enabled():
+        provider = make_provider(CLOUD_PROVIDER, HF_API_TOKEN, HF_MODEL, OPENAI_API_KEY, OPENAI_MODEL)
+        _cloud_client = CloudClient(
+            provider,
+            lambda: _get_http_client(),
+            max_concurrency=CLOUD_MAX_CONCURRENCY,
+            rate_per_second=CLOUD_RATE_PER_SECOND,
+            burst=CLOUD_BURST,
+            max_batch=CLOUD_MAX_BATCH,
+            max_wait_ms=CLOUD_BATCH_WAIT_MS,
+            failure_threshold=CLOUD_BREAKER_FAILURES,
+            cooldown_seconds=CLOUD_BREAKER_COOLDOWN_SECONDS,
+            queue_timeout_seconds=CLOUD_TIMEOUT_SECONDS,
+            record=lambda outcome: CLOUD_REQUESTS.inc(provider=CLOUD_PROVIDER, outcome=outcome),
+        )
+    return _cloud_client
+
+async def _cloud_enrich(text: str) -> Optional[dict]:
     # Returns partial enrichment: {category, intent, priority, confidence}
     # Must never raise.
-    if not _cloud_enabled():
+    client = _get_cloud_client()
+    if client is None:
         return None
+    return await client.classify(text)
 
-    prompt = (
-        "You are an IT support ticket classifier. Return ONLY valid JSON with keys: "
-        "category, intent, priority, confidence.\n\n"
-        "Allowed priority: LOW, MEDIUM, HIGH.\n"
-        "Allowed intent examples: INCIDENT, SERVICE_REQUEST, HOW_TO, SECURITY_REPORT, ACCOUNT_ACCESS, UNKNOWN.\n"
-        "Allowed category examples: IDENTITY_ACCESS, NETWORK_VPN_WIFI, EMAIL_COLLAB, ENDPOINT_DEVICE, BUSINESS_APP_ERP_CRM, "
-        "SOFTWARE_INSTALL_LICENSE, HARDWARE_PERIPHERAL, SECURITY_INCIDENT, KB_GENERAL, OTHER.\n\n"
-        f"Ticket:\n{text}\n"
-    )
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    model_registry.start_watching(MODEL_WATCH_INTERVAL_SECONDS)
+    yield
+    model_registry.stop_watching()
+    if similar_index is not None and SIMILAR_SNAPSHOT_PATH:
+        # Pre-fork workers each write their own file instead of overwriting one another.
+        path = worker_snapshot_path(SIMILAR_SNAPSHOT_PATH, os.getenv("AI_WORKER_ID"))
+        try:
+            saved = similar_index.snapshot(path)
+            print(f"Saved {saved} tickets from the similarity index to {path}")
+        except Exception as e:
+            print(f"Failed to snapshot similarity index: {e}")
+    if kb_index is not None and KB_SNAPSHOT_PATH:
+        try:
+            print(f"Saved {kb_index.snapshot(KB_SNAPSHOT_PATH)} KB articles to {KB_SNAPSHOT_PATH}")
+        except Exception as e:
+            print(f"Failed to snapshot KB index: {e}")
+    if label_log is not None:
+        label_log.close()
+    global _http_client, _cloud_client
+    if _cloud_client is not None:
+        await _cloud_client.aclose()
+        _cloud_client = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+app = FastAPI(title="AI NLP Classifier", version="1.0.0", lifespan=lifespan)
 
+@app.middleware("http")
+async def _instrument(request: Request, call_next):
+    token = metrics.start_request()
+    profile = None
+    if profiler is not None and not request.url.path.startswith(("/metrics", "/admin")):
+        # Forced profiles cost a sampler and a ring-buffer slot, so only admins may ask for one.
+        forced = (
+            PROFILE_HEADER_ENABLED
+            and request.headers.get("x-profile", "").strip() == "1"
+            and _is_admin(request.headers.get("x-admin-token"))
+        )
+        if forced or PROFILE_ENABLED:
+            profile = profiler.start(forced)
+    started = time.perf_counter()
+    status = 500
+    profile_id = None
     try:
-        if CLOUD_PROVIDER == "hf":
-            url = f"https://api-inference.huggingface.co/models/{HF_MODEL}"
-            headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
-            payload = {
-                "inputs": prompt,
-                "parameters": {"max_new_tokens": 180, "temperature": 0.2, "return_full_text": False},
-            }
-            res = requests.post(url, headers=headers, json=payload, timeout=CLOUD_TIMEOUT_SECONDS)
-            if not res.ok:
-                return None
-            data = res.json()
-            # Common response: [{"generated_text": "..."}]
-            if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
-                text_out = data[0].get("generated_text")
-                if isinstance(text_out, str):
-                    return _extract_json_object(text_out)
-            # Sometimes HF returns dict errors
-            return None
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        timings = metrics.end_request(token)
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", None) or "unmatched"
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=str(status))
+        if profile is not None:
+            length = request.headers.get("content-length", "")
+            input_bytes = int(length) if length.isdigit() else None
+            profile_id = profiler.finish(profile, endpoint, status, elapsed, timings, input_bytes)
+    if SERVER_TIMING_ENABLED and endpoint != "/metrics":
+        response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
 
-        if CLOUD_PROVIDER == "openai":
-            url = "https://api.openai.com/v1/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-            }
-            payload = {
-                "model": OPENAI_MODEL,
-                "messages": [
-                    {"role": "system", "content": "Return ONLY JSON. No markdown."},
-                    {"role": "user", "content": prompt},
-                ],
-                "temperature": 0.2,
-                "max_tokens": 200,
-            }
-            res = requests.post(url, headers=headers, json=payload, timeout=CLOUD_TIMEOUT_SECONDS)
-            if not res.ok:
-                return None
-            data = res.json()
-            content = (
-                data.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content")
-            )
-            if isinstance(content, str):
-                return _extract_json_object(content) or _extract_json_object(content.strip())
-            return None
+def _collect_service_metrics() -> list:
+    out = []
+    bundle = model_registry.current()
+    if bundle is not None:
+        out.append(("ai_model_info", "gauge", "Active model bundle", {"version": bundle.version, "source": bundle.source}, 1))
+    if result_cache is not None:
+        stats = result_cache.stats()
+        for key in ("hits", "disk_hits", "misses", "evictions", "disk_evictions", "expirations", "invalidations"):
+            out.append((f"ai_cache_{key}_total", "counter", f"Result cache {key.replace('_', ' ')}", {}, stats[key]))
+        out.append(("ai_cache_entries", "gauge", "Result cache entries in memory", {}, stats["size"]))
+        out.append(("ai_cache_hit_ratio", "gauge", "Result cache hit ratio since start", {}, stats["hit_rate"]))
+    if _cloud_client is not None:
+        stats = _cloud_client.stats()
+        out.append(("ai_cloud_breaker_open", "gauge", "Cloud circuit breaker open (1) or closed", {"provider": stats["provider"]},
+                    1 if stats["breaker_state"] == "open" else 0))
+        out.append(("ai_cloud_breaker_opened_total", "counter", "Times the cloud circuit breaker opened", {"provider": stats["provider"]},
+                    stats["breaker_opened"]))
+        out.append(("ai_cloud_upstream_requests_total", "counter", "HTTP requests sent to the cloud provider", {"provider": stats["provider"]},
+                    stats["upstream_requests"]))
+    if admission is not None:
+        stats = admission.stats()
+        out.append(("ai_admission_in_flight", "gauge", "Admitted /enrich requests running", {}, stats["in_flight"]))
+        out.append(("ai_admission_queue_depth", "gauge", "/enrich requests waiting for admission", {}, stats["queue_depth"]))
+        out.append(("ai_admission_degraded", "gauge", "Slow tiers shed because of queueing (1) or not", {}, 1 if stats["degraded_now"] else 0))
+        out.append(("ai_admission_admitted_total", "counter", "/enrich requests admitted", {}, stats["admitted"]))
+        for reason, count in stats["shed"].items():
+            out.append(("ai_admission_shed_total", "counter", "/enrich requests rejected with 503", {"reason": reason}, count))
+    if label_log is not None:
+        stats = label_log.stats()
+        for key in ("written", "dropped", "errors"):
+            out.append((f"ai_label_log_{key}_total", "counter", f"Teacher labels {key}", {}, stats[key]))
+    if profiler is not None:
+        stats = profiler.stats()
+        out.append(("ai_profiles_captured_total", "counter", "Slow-request profiles kept", {}, stats["kept"]))
+        out.append(("ai_profiles_stored", "gauge", "Profiles in the ring buffer", {}, stats["stored"]))
+    for tier, seconds in _tier_estimates.items():
+        out.append(("ai_tier_estimate_seconds", "gauge", "Running tier duration estimate", {"tier": tier}, seconds))
+    if similar_index is not None:
+        stats = similar_index.stats()
+        out.append(("ai_similar_entries", "gauge", "Tickets in the similarity index", {}, stats["entries"]))
+        out.append(("ai_similar_postings", "gauge", "Posting entries held by the similarity index", {}, stats["postings"]))
+    return out
 
-        return None
-    except Exception:
-        return None
+metrics.register_collector(_collect_service_metrics)
 
-app = FastAPI(title="AI NLP Classifier", version="1.0.0")
-
-def fallback_classify(text: str) -> PredictResponse:
-    """Fallback classification when model is not available - Enhanced with more keywords"""
-    text_lower = text.lower()
-    
-    # Enhanced keyword-based classification with more variations
-    if any(kw in text_lower for kw in ["password", "reset", "forgot", "account", "login", "access", "unlock", "locked", "username"]):
-        category = "IDENTITY_ACCESS"
-        confidence = 0.75
-    elif any(kw in text_lower for kw in ["wifi", "wi-fi", "wireless", "network", "vpn", "internet", "connection", "connect", "cannot connect", "no internet", "slow internet"]):
-        category = "NETWORK_VPN_WIFI"
-        confidence = 0.75
-    elif any(kw in text_lower for kw in ["email", "outlook", "mail", "calendar", "not sending", "not receiving", "mailbox"]):
-        category = "EMAIL_COLLAB"
-        confidence = 0.75
-    elif any(kw in text_lower for kw in ["laptop", "computer", "printer", "monitor", "keyboard", "mouse", "hardware", "screen", "display", "headphones"]):
-        category = "HARDWARE_PERIPHERAL"
-        confidence = 0.75
-    elif any(kw in text_lower for kw in ["software", "install", "application", "app", "program", "update", "license", "crashes"]):
-        category = "SOFTWARE_INSTALL_LICENSE"
-        confidence = 0.75
-    elif any(kw in text_lower for kw in ["sap", "oracle", "crm", "erp", "salesforce", "business app"]):
-        category = "BUSINESS_APP_ERP_CRM"
-        confidence = 0.8
-    elif any(kw in text_lower for kw in ["phishing", "malware", "security", "virus", "hack", "breach", "suspicious", "stolen", "lost laptop"]):
-        category = "SECURITY_INCIDENT"
-        confidence = 0.85
-    elif any(kw in text_lower for kw in ["backup", "backup failed", "backup not working", "backup error", "cannot backup", "restore"]):
-        category = "OTHER"
-        confidence = 0.7
-    elif any(kw in text_lower for kw in ["how", "how to", "how do", "tutorial", "guide", "steps"]):
-        category = "KB_GENERAL"
-        confidence = 0.7
-    else:
-        category = "OTHER"
-        confidence = 0.6
-    
+def fallback_classify(text: str, hits: Optional[FrozenSet[str]] = None) -> PredictResponse:
+    """Fallback classification when model is not available - keyword rules from _FALLBACK_CATEGORY_RULES"""
+    if hits is None:
+        hits = match_keywords(text)
+    category, confidence = _FALLBACK_DEFAULT
+    for rule_category, rule_confidence, phrases in _FALLBACK_CATEGORY_RULES:
+        if any_hit(hits, phrases):
+            category, confidence = rule_category, rule_confidence
+            break
     return PredictResponse(category=category, intent="classify", confidence=confidence)
 
-def extract_keywords(text: str) -> List[str]:
-    lower = text.lower()
-    candidates = [
-        "password", "reset", "unlock", "locked", "login", "access",
-        "vpn", "wifi", "network", "internet", "connection",
-        "email", "outlook", "mail", "calendar",
-        "printer", "print", "laptop", "computer", "screen", "mouse", "keyboard",
-        "install", "software", "update", "license",
-        "phishing", "malware", "security", "virus", "hack",
-        "sap", "oracle", "crm", "erp",
-        "urgent", "critical", "down", "broken", "error",
-    ]
-    out: List[str] = []
-    for c in candidates:
-        if c in lower and c not in out:
-            out.append(c)
+def _oov_fallback(text: str, hits: FrozenSet[str]) -> PredictResponse:
+    # A model is loaded but saw no term it knows: the keyword guess is kept, at a
+    # confidence that lets the slow tiers take over.
+    OOV_FALLBACKS.inc()
+    res = fallback_classify(text, hits)
+    res.confidence = min(res.confidence, OOV_FALLBACK_CONFIDENCE)
+    return res
+
+def extract_keywords(text: str, hits: Optional[FrozenSet[str]] = None) -> List[str]:
+    if hits is None:
+        hits = match_keywords(text)
+    out = [keyword_label(c) for c in _KEYWORD_CANDIDATES if c in hits]
     return out[:20]
 
+# One precompiled pattern per entity type, each scanned on its own so a span can
+# count for several types ("username: 12345" is also error code 12345). The email
+# local part is anchored to the start of a run so long tokens without "@" stay linear.
+_ENTITY_PATTERNS = {
+    "emails": re.compile(r"(?<![a-zA-Z0-9._%+-])([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"),
+    "usernames": re.compile(r"\b(?:username|user id|userid)\s*[:=]?\s*([a-zA-Z0-9._-]{3,})\b", re.IGNORECASE),
+    "asset_tags": re.compile(r"\b([A-Z]{2,5}-\d{3,10})\b"),
+    "error_codes": re.compile(r"\b(0x[0-9A-Fa-f]+|ERR_[A-Z0-9_]+|\d{3,5})\b"),
+}
+_ENTITY_TYPES = tuple(_ENTITY_PATTERNS)
+
+def _entity_windows(text: str) -> List[str]:
+    # Bound the scanned length: a head and a tail window, cut on whitespace.
+    if len(text) <= ENTITY_SCAN_HEAD_CHARS + ENTITY_SCAN_TAIL_CHARS:
+        return [text]
+    head_end = text.rfind(" ", 0, ENTITY_SCAN_HEAD_CHARS)
+    head_end = head_end if head_end > 0 else ENTITY_SCAN_HEAD_CHARS
+    tail_start = text.find(" ", len(text) - ENTITY_SCAN_TAIL_CHARS)
+    tail_start = tail_start if tail_start >= 0 else len(text) - ENTITY_SCAN_TAIL_CHARS
+    windows = [text[:head_end]]
+    if ENTITY_SCAN_TAIL_CHARS > 0:
+        windows.append(text[tail_start:])
+    return windows
+
 def extract_entities(text: str) -> dict:
-    entities = {
-        "emails": [],
-        "usernames": [],
-        "asset_tags": [],
-        "error_codes": [],
-    }
+    limit = max(0, ENTITY_LIMIT)
+    windows = _entity_windows(text) if limit else []
+    out: Dict[str, List[str]] = {}
+    for kind, pattern in _ENTITY_PATTERNS.items():
+        found: Dict[str, None] = {}  # ordered set
+        for window in windows:
+            for m in pattern.finditer(window):
+                value = m.group(1).lower() if kind == "emails" else m.group(1)
+                found[value] = None
+                if len(found) >= limit:
+                    break  # this type is full; stop scanning for it
+            if len(found) >= limit:
+                break
+        out[kind] = list(found)
+    return out
 
-    emails = re.findall(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", text)
-    entities["emails"] = list(dict.fromkeys([e.lower() for e in emails]))[:5]
-
-    for m in re.finditer(r"\b(username|user id|userid)\s*[:=]?\s*([a-zA-Z0-9._-]{3,})\b", text, re.IGNORECASE):
-        entities["usernames"].append(m.group(2))
-    entities["usernames"] = list(dict.fromkeys(entities["usernames"]))[:5]
-
-    asset = re.findall(r"\b([A-Z]{2,5}-\d{3,10})\b", text)
-    entities["asset_tags"] = list(dict.fromkeys(asset))[:5]
-
-    errs = re.findall(r"\b(0x[0-9A-Fa-f]+|ERR_[A-Z0-9_]+|\d{3,5})\b", text)
-    entities["error_codes"] = list(dict.fromkeys(errs))[:5]
-
-    return entities
-
-def guess_priority(text: str) -> str:
-    lower = text.lower()
-    if any(
-        k in lower
-        for k in [
-            "phishing",
-            "suspicious",
-            "malware",
-            "ransomware",
-            "virus",
-            "trojan",
-            "hack",
-            "hacked",
-            "breach",
-            "data breach",
-            "unauthorized",
-            "security incident",
-        ]
-    ):
-        return "HIGH"
-    if any(k in lower for k in ["urgent", "critical", "down", "outage", "cannot work", "blocked"]):
-        return "HIGH"
-    if any(k in lower for k in ["can't", "cannot", "not working", "error"]):
-        return "MEDIUM"
+def guess_priority(text: str, hits: Optional[FrozenSet[str]] = None) -> str:
+    if hits is None:
+        hits = match_keywords(text)
+    for priority, phrases in _PRIORITY_RULES:
+        if any_hit(hits, phrases):
+            return priority
     return "LOW"
 
-def suggest_workflow(text: str, category: str) -> tuple[bool, Optional[str], Optional[str], Optional[str]]:
-    lower = text.lower()
-    if any(kw in lower for kw in ["password", "reset", "forgot"]):
-        return True, "PASSWORD_RESET", "Confirm password reset", "AI can reset your password and send a reset notification. Approve to proceed."
-    if any(kw in lower for kw in ["account", "unlock", "locked", "lockout"]):
-        return True, "ACCOUNT_UNLOCK", "Confirm account unlock", "AI can unlock your account. Approve to proceed."
-    if category == "NETWORK_VPN_WIFI" and any(kw in lower for kw in ["vpn", "connect", "connection"]):
-        return True, "VPN_BASIC_FIX", "Confirm VPN troubleshooting", "AI can run automated VPN connectivity checks and guide you through fixes. Approve to proceed."
-    if category == "HARDWARE_PERIPHERAL" and any(kw in lower for kw in ["printer", "print"]):
-        return True, "PRINTER_TROUBLESHOOT", "Confirm printer troubleshooting", "AI can run printer troubleshooting steps and guide you. Approve to proceed."
+def suggest_workflow(
+    text: str, category: str, hits: Optional[FrozenSet[str]] = None
+) -> tuple[bool, Optional[str], Optional[str], Optional[str]]:
+    if hits is None:
+        hits = match_keywords(text)
+    for workflow, required_category, phrases, title, body in _WORKFLOW_RULES:
+        if required_category is not None and category != required_category:
+            continue
+        if any_hit(hits, phrases):
+            return True, workflow, title, body
     return False, None, None, None
 
 def make_summary(text: str) -> str:
-    clean = re.sub(r"\s+", " ", text.strip())
-    if len(clean) <= 160:
-        return clean
-    return clean[:157] + "..."
+    return _clip_summary(" ".join(text.split()))
 
-@app.post("/predict", response_model=PredictResponse)
-@app.post("/", response_model=PredictResponse)  # Also support root endpoint for backward compatibility
-def predict(req: PredictRequest):
-    if not model or not vectorizer:
+def _clip_summary(collapsed: str) -> str:
+    if len(collapsed) <= 160:
+        return collapsed
+    return collapsed[:157] + "..."
+
+def _vectorize(norms: List[NormalizedText], bundle: ModelBundle):
+    with metrics.stage("vectorize"):
+        return bundle.model.transform([n.clean for n in norms])
+
+def _label_scores(ranked: List[tuple]) -> Optional[List[LabelScore]]:
+    if PREDICT_TOP_K <= 0:
+        return None
+    return [LabelScore(label=label, score=round(p, 3)) for label, p in ranked]
+
+def _predict_many(
+    texts: List[str],
+    hits: Optional[List[FrozenSet[str]]] = None,
+    bundle: Optional[ModelBundle] = None,
+    X=None,
+    norms: Optional[List[NormalizedText]] = None,
+) -> List[PredictResponse]:
+    """Classify a list of texts with one TF-IDF transform and one scoring pass for all heads.
+
+    X, norms: the texts' TF-IDF rows and normalized forms when the caller
+    already computed them. Texts with no in-vocabulary term would only get
+    the heads' priors, so they go to the keyword rules instead.
+    """
+    if not texts:
+        return []
+    if norms is None and (hits is None or X is None):
+        norms = [normalize_text(t) for t in texts]
+    if hits is None:
+        hits = [_keyword_matcher.match(n.lower) for n in norms]
+    if bundle is None:
+        bundle = model_registry.current()
+    if bundle is None:
         # Use fallback classification
-        return fallback_classify(req.text)
-    
-    cleaned = clean_text(req.text)
-    X = vectorizer.transform([cleaned])
-    pred = model.predict(X)[0]
-
-    pred_intent = "classify"
-    if intent_model is not None:
+        with metrics.stage("fallback"):
+            return [fallback_classify(t, h) for t, h in zip(texts, hits)]
+    model = bundle.model
+
+    if X is None:
+        X = _vectorize(norms, bundle)
+    oov = model.empty_rows(X)
+    if oov.all():
+        with metrics.stage("fallback"):
+            return [_oov_fallback(t, h) for t, h in zip(texts, hits)]
+
+    k = max(1, PREDICT_TOP_K)
+    with metrics.stage("score"):
+        # Every head's scores come from one pass over the stacked coefficients;
+        # labels, calibrated probabilities and rankings are all derived from them.
+        scores = model.score_heads(X)
+        categories = model.top_k("category", model.predict_proba("category", scores["category"]), k)
+
+        intents: List[Optional[list]] = [None] * len(texts)
+        if bundle.has_intent:
+            try:
+                intents = model.top_k("intent", model.predict_proba("intent", scores["intent"]), k)
+            except Exception:
+                intents = [None] * len(texts)
+
+        priorities: List[Optional[str]] = [None] * len(texts)
+        if bundle.has_risk:
+            try:
+                ranked = model.top_k("risk", model.predict_proba("risk", scores["risk"]), 1)
+                priorities = [_RISK_PRIORITY.get(r[0][0], "MEDIUM") for r in ranked]
+            except Exception:
+                priorities = [None] * len(texts)
+
+    out: List[PredictResponse] = []
+    for text, text_hits, empty, ranked, ranked_intents, priority in zip(
+        texts, hits, oov, categories, intents, priorities
+    ):
+        prob = ranked[0][1]
+        if empty:
+            out.append(_oov_fallback(text, text_hits))
+        elif any_hit(text_hits, _SECURITY_TERMS):
+            out.append(PredictResponse(
+                category="SECURITY_INCIDENT",
+                intent="SECURITY_REPORT",
+                confidence=max(round(prob, 3), 0.85),
+                model_version=bundle.version,
+                priority="HIGH" if priority is not None else None,
+                top_categories=_label_scores(ranked),
+                top_intents=_label_scores(ranked_intents) if ranked_intents else None,
+            ))
+        else:
+            out.append(PredictResponse(
+                category=str(ranked[0][0]),
+                intent=ranked_intents[0][0] if ranked_intents else "classify",
+                confidence=round(prob, 3),
+                model_version=bundle.version,
+                priority=priority,
+                top_categories=_label_scores(ranked),
+                top_intents=_label_scores(ranked_intents) if ranked_intents else None,
+            ))
+    return out
+
+def _warm_bundle(bundle: ModelBundle) -> None:
+    # Probe request: exercises transform and every head before the swap
+    # and fails the reload if the artifacts do not fit together.
+    _predict_many(["cannot connect to vpn after password reset"], None, bundle)
+
+model_registry.warmup = _warm_bundle
+
+_kb_embedding_encoder = None
+
+def _kb_encoder(bundle: Optional[ModelBundle]):
+    global _kb_embedding_encoder
+    if KB_ENCODER == "embedding":
+        if _kb_embedding_encoder is None:
+            _kb_embedding_encoder = EmbeddingEncoder(KB_EMBEDDING_MODEL)
+        return _kb_embedding_encoder
+    if bundle is None:
+        return None
+    return TfidfProjectionEncoder(bundle.model, bundle.version, clean_text, max(16, KB_DIM))
+
+def _kb_on_swap(bundle: ModelBundle) -> None:
+    # TF-IDF rows depend on the vocabulary: rebuild them from the stored article text.
+    if kb_index is None:
+        return
+    encoder = _kb_encoder(bundle)
+    if encoder is not None and encoder is not kb_index.encoder:
+        print(f"Re-encoded {kb_index.reencode(encoder)} KB articles for model {bundle.version}")
+
+kb_index: Optional[KBIndex] = None
+_kb_disabled_reason = "AI_KB_ENABLED"
+if KB_ENABLED and WORKERS > 1:
+    # Each worker would hold its own copy of the articles: POST /kb/articles reaches
+    # one of them, and every worker overwrites AI_KB_SNAPSHOT_PATH at shutdown.
+    _kb_disabled_reason = "not supported with more than one worker process"
+    logger.warning("KB search is disabled: the KB index is per process and %d workers are configured", WORKERS)
+elif KB_ENABLED:
+    try:
+        kb_index = KBIndex(_kb_encoder(model_registry.current()))
+        restored = kb_index.restore(KB_SNAPSHOT_PATH)
+        if restored:
+            print(f"Restored {restored} KB articles from {KB_SNAPSHOT_PATH}")
+        if KB_ENCODER != "embedding":
+            model_registry.on_swap(_kb_on_swap)
+    except Exception as e:
+        print(f"Failed to initialise KB index: {e}")
+        kb_index = None
+
+def _disable_kb(reason: str) -> None:
+    global kb_index, _kb_disabled_reason
+    kb_index = None
+    _kb_disabled_reason = reason
+
+def _enrich_fields(
+    norm: NormalizedText, bundle: Optional[ModelBundle] = None, hits: Optional[FrozenSet[str]] = None
+) -> dict:
+    # Cheap, deterministic enrichment computed on the inference pool. "hits" is
+    # the keyword scan reused by prediction, escalation and workflow rules;
+    # "text" is the analysed text the slow tiers see; "model_version" pins the
+    # bundle the request was served with.
+    if hits is None:
+        with metrics.stage("keywords"):
+            hits = _keyword_matcher.match(norm.lower)
+    with metrics.stage("extract"):
+        return {
+            "hits": hits,
+            "text": norm.text,
+            "model_version": bundle.version if bundle is not None else None,
+            "summary": _clip_summary(norm.collapsed),
+            "keywords": extract_keywords(norm.text, hits),
+            "entities": extract_entities(norm.text),
+            "priority": guess_priority(norm.text, hits),
+        }
+
+def _cache_lookup(norm: NormalizedText, bundle: Optional[ModelBundle]) -> tuple[Optional[dict], Optional[str]]:
+    # Near-identical copies (case, punctuation, whitespace) share one cache entry.
+    if result_cache is None:
+        return None, None
+    with metrics.stage("cache"):
+        key = make_key(_cache_fingerprint(bundle.version if bundle is not None else None), norm.key)
+        return result_cache.get(key), key
+
+def _prepare_enrich(
+    text: str, ticket_id: Optional[str] = None, similar_k: int = 0
+) -> tuple[Optional[PredictResponse], dict, Optional[dict], Optional[str]]:
+    # Returns (base, fields, cached, cache_key); base is None on a cache hit.
+    # The bundle is taken once so the whole request is served by one version.
+    bundle = model_registry.current()
+    norm = normalize_text(text)
+    fields = _enrich_fields(norm, bundle)
+    X = None
+    if bundle is not None and similar_index is not None and (ticket_id or similar_k > 0):
+        # One transform serves the similarity lookup and, on a cache miss, the prediction.
+        X = _vectorize([norm], bundle)
+        fields["similar"] = _similar_for_row(X, bundle, ticket_id, similar_k) if similar_k > 0 else None
+        if ticket_id:
+            _index_row(X, bundle, ticket_id)
+    cached, key = _cache_lookup(norm, bundle)
+    if cached is not None:
+        return None, fields, cached, key
+    base = _predict_many([norm.text], [fields["hits"]], bundle, X, [norm])[0]
+    _use_model_priority(fields, base)
+    return base, fields, None, key
+
+def _similar_for_row(
+    X, bundle: ModelBundle, ticket_id: Optional[str], k: int, min_score: Optional[float] = None
+) -> List[SimilarTicket]:
+    indptr, indices, data = X
+    if similar_index.version != bundle.version:
+        return []
+    with metrics.stage("similar"):
+        matches = similar_index.query(
+            indices[indptr[0]:indptr[1]],
+            data[indptr[0]:indptr[1]],
+            k=max(1, min(k, 100)),
+            min_score=SIMILAR_MIN_SCORE if min_score is None else min_score,
+            exclude=ticket_id,
+        )
+    return [
+        SimilarTicket(
+            ticket_id=t, score=round(score, 4), duplicate=score >= SIMILAR_DUPLICATE_SCORE, age_seconds=round(age, 1)
+        )
+        for t, score, age in matches
+    ]
+
+def _index_row(X, bundle: ModelBundle, ticket_id: str) -> bool:
+    indptr, indices, data = X
+    if similar_index.version != bundle.version or indptr[1] == indptr[0]:
+        return False
+    similar_index.add(ticket_id, indices[indptr[0]:indptr[1]], data[indptr[0]:indptr[1]])
+    return True
+
+def _similar(req: SimilarRequest) -> SimilarResponse:
+    bundle = model_registry.current()
+    if bundle is None:
+        return SimilarResponse(matches=[])
+    X = _vectorize([normalize_text(req.text)], bundle)
+    matches = _similar_for_row(X, bundle, req.ticket_id, req.k, req.min_score)
+    indexed = bool(req.add and req.ticket_id) and _index_row(X, bundle, req.ticket_id)
+    return SimilarResponse(matches=matches, indexed=indexed, model_version=bundle.version)
+
+def _use_model_priority(fields: dict, base: Optional[PredictResponse]) -> None:
+    # The learned risk head replaces the keyword priority whenever it is available.
+    if base is not None and base.priority:
+        fields["priority"] = base.priority
+
+class Deadline:
+    """Absolute monotonic deadline derived from a caller-supplied budget in milliseconds."""
+
+    def __init__(self, budget_ms: int):
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + max(0, budget_ms) / 1000.0
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+def _resolve_deadline(header_ms: Optional[str], body_ms: Optional[int]) -> Optional[Deadline]:
+    budget: Optional[int] = body_ms
+    if budget is None and header_ms:
         try:
-            pred_intent = str(intent_model.predict(X)[0])
+            budget = int(float(header_ms))
         except Exception:
-            pred_intent = "classify"
-    try:
-        prob = float(max(model.predict_proba(X)[0]))
-    except Exception:
-        prob = 0.5
+            budget = None
+    if budget is None and DEFAULT_DEADLINE_MS > 0:
+        budget = DEFAULT_DEADLINE_MS
+    if budget is None or budget <= 0:
+        return None
+    return Deadline(budget)
 
-    if is_security_text(req.text):
-        return PredictResponse(category="SECURITY_INCIDENT", intent="SECURITY_REPORT", confidence=max(round(prob, 3), 0.85))
+TIER_LOCAL_HF = "local_hf"
+TIER_CLOUD = "cloud"
+_ESCALATION_TIERS = [TIER_LOCAL_HF, TIER_CLOUD]
 
-    return PredictResponse(category=pred, intent=pred_intent, confidence=round(prob, 3))
+# Running estimate (seconds) of how long each slow tier takes; a tier is skipped
+# up front when the remaining budget is smaller than its estimate.
+_tier_estimates: Dict[str, float] = {TIER_LOCAL_HF: 0.3, TIER_CLOUD: 1.5}
 
-@app.post("/enrich", response_model=EnrichResponse)
-def enrich(req: EnrichRequest):
-    base = predict(PredictRequest(text=req.text))
-    summary = make_summary(req.text)
-    keywords = extract_keywords(req.text)
-    entities = extract_entities(req.text)
-    priority = guess_priority(req.text)
-
-    if not is_security_text(req.text):
-        if base.confidence < LOCAL_HF_TRIGGER_THRESHOLD:
-            local = _local_hf_enrich(req.text)
-            if isinstance(local, dict) and float(local.get("confidence", 0.0)) >= LOCAL_HF_MIN_SCORE:
-                cat = local.get("category")
-                it = local.get("intent")
-                cf = local.get("confidence")
-                if isinstance(cat, str) and cat.strip():
-                    base.category = cat.strip()
-                if isinstance(it, str) and it.strip():
-                    base.intent = it.strip()
-                if isinstance(cf, (int, float)):
-                    try:
-                        base.confidence = float(cf)
-                    except Exception:
-                        pass
-
-        if base.confidence < CLOUD_CONFIDENCE_THRESHOLD:
-            cloud = _cloud_enrich(req.text)
-            if isinstance(cloud, dict):
-                cat = cloud.get("category")
-                it = cloud.get("intent")
-                pr = cloud.get("priority")
-                cf = cloud.get("confidence")
-
-                if isinstance(cat, str) and cat.strip():
-                    base.category = cat.strip()
-                if isinstance(it, str) and it.strip():
-                    base.intent = it.strip()
-                if pr in ("LOW", "MEDIUM", "HIGH"):
-                    priority = pr
-                if isinstance(cf, (int, float)):
-                    try:
-                        base.confidence = float(cf)
-                    except Exception:
-                        pass
-
-    auto_resolvable, wf, at, ab = suggest_workflow(req.text, base.category)
+def _record_tier_duration(tier: str, seconds: float) -> None:
+    prev = _tier_estimates.get(tier, seconds)
+    _tier_estimates[tier] = 0.8 * prev + 0.2 * seconds
+
+def _base_tier(base: PredictResponse) -> str:
+    # Rows the model could not score (no model, or no in-vocabulary term) come from the keyword rules.
+    return "tfidf" if base.model_version else "keyword"
+
+def _apply_local_hf(base: PredictResponse, local: Optional[dict]) -> bool:
+    if not isinstance(local, dict) or float(local.get("confidence", 0.0)) < LOCAL_HF_MIN_SCORE:
+        return False
+    cat = local.get("category")
+    it = local.get("intent")
+    cf = local.get("confidence")
+    if isinstance(cat, str) and cat.strip():
+        base.category = cat.strip()
+    if isinstance(it, str) and it.strip():
+        base.intent = it.strip()
+    if isinstance(cf, (int, float)):
+        try:
+            base.confidence = float(cf)
+        except Exception:
+            pass
+    return True
+
+def _cloud_heads(cloud: Optional[dict]) -> List[str]:
+    # Training heads the cloud answer actually labelled.
+    if not isinstance(cloud, dict):
+        return []
+    heads = [
+        head for head, key in (("domain", "category"), ("intent", "intent"))
+        if isinstance(cloud.get(key), str) and cloud[key].strip()
+    ]
+    if cloud.get("priority") in ("LOW", "MEDIUM", "HIGH"):
+        heads.append("risk")
+    return heads
+
+def _log_teacher_label(text: str, base: PredictResponse, priority: str, tier: str, heads: List[str]) -> None:
+    if label_log is None:
+        return
+    # Only labels train.py has a class for are worth distilling; the rest of the answer is dropped.
+    domain, intent, risk, heads = teacher_labels(base.category, base.intent, priority, heads)
+    if not heads:
+        return
+    label_log.append(text, domain, intent, risk, tier, base.confidence, heads, model_registry.version)
+
+def _apply_cloud(base: PredictResponse, priority: str, cloud: Optional[dict]) -> str:
+    if not isinstance(cloud, dict):
+        return priority
+    cat = cloud.get("category")
+    it = cloud.get("intent")
+    pr = cloud.get("priority")
+    cf = cloud.get("confidence")
+
+    if isinstance(cat, str) and cat.strip():
+        base.category = cat.strip()
+    if isinstance(it, str) and it.strip():
+        base.intent = it.strip()
+    if pr in ("LOW", "MEDIUM", "HIGH"):
+        priority = pr
+    if isinstance(cf, (int, float)):
+        try:
+            base.confidence = float(cf)
+        except Exception:
+            pass
+    return priority
+
+async def _escalate(
+    text: str,
+    base: PredictResponse,
+    priority: str,
+    deadline: Optional[Deadline],
+    tiers: List[str],
+    hits: Optional[FrozenSet[str]] = None,
+) -> tuple[str, List[str], List[str]]:
+    """Run the slow tiers in order within the deadline.
+
+    Returns (priority, tiers_run, tiers_skipped). A tier is skipped when the
+    remaining budget is below its running estimate, or cancelled when it
+    overruns the budget; the result so far is kept either way.
+    """
+    ran: List[str] = []
+    skipped: List[str] = []
+    teacher: Optional[tuple[str, List[str]]] = None  # (tier, heads) of the last answer applied
+    if is_security_text(text, hits):
+        TIER_DECISIONS.inc(tier="all", outcome="security")
+        return priority, ran, skipped
+
+    for tier in tiers:
+        if tier == TIER_LOCAL_HF:
+            enabled, threshold = bool(hf_batcher), LOCAL_HF_TRIGGER_THRESHOLD
+        elif tier == TIER_CLOUD:
+            enabled, threshold = _cloud_enabled(), CLOUD_CONFIDENCE_THRESHOLD
+        else:
+            continue
+        if not enabled or base.confidence >= threshold:
+            TIER_DECISIONS.inc(tier=tier, outcome="disabled" if not enabled else "confident")
+            continue
+        if admission is not None and admission.degraded():
+            # Overloaded: serve the fast path only, so the queue drains at its rate.
+            TIER_DECISIONS.inc(tier=tier, outcome="shed")
+            skipped.append(tier)
+            continue
+        if tier == TIER_CLOUD and _get_cloud_client().is_open():
+            # Failing provider: skip it outright instead of waiting for another timeout.
+            TIER_DECISIONS.inc(tier=tier, outcome="circuit_open")
+            continue
+
+        budget = deadline.remaining() if deadline is not None else None
+        if budget is not None and budget < _tier_estimates.get(tier, 0.0):
+            TIER_DECISIONS.inc(tier=tier, outcome="budget")
+            skipped.append(tier)
+            continue
+
+        started = time.monotonic()
+        call = _run_local_hf(text) if tier == TIER_LOCAL_HF else _cloud_enrich(text)
+        try:
+            res = await asyncio.wait_for(call, timeout=budget)
+        except asyncio.TimeoutError:
+            metrics.record_stage(tier, time.monotonic() - started)
+            TIER_DECISIONS.inc(tier=tier, outcome="timeout")
+            skipped.append(tier)
+            continue
+        elapsed = time.monotonic() - started
+        metrics.record_stage(tier, elapsed)
+        _record_tier_duration(tier, elapsed)
+        TIER_DECISIONS.inc(tier=tier, outcome="ran" if res is not None else "no_result")
+        ran.append(tier)
+
+        if tier == TIER_LOCAL_HF:
+            if _apply_local_hf(base, res):
+                teacher = (tier, ["domain", "intent"])
+        else:
+            priority = _apply_cloud(base, priority, res)
+            if _cloud_heads(res):
+                teacher = (tier, _cloud_heads(res))
+
+    if teacher is not None:
+        _log_teacher_label(text, base, priority, *teacher)
+    return priority, ran, skipped
+
+def _build_enrich_response(text: str, base: PredictResponse, fields: dict, priority: str, tiers_run: List[str], partial: bool) -> EnrichResponse:
+    auto_resolvable, wf, at, ab = suggest_workflow(text, base.category, fields.get("hits"))
     return EnrichResponse(
         category=base.category,
         intent=base.intent,
         confidence=base.confidence,
-        summary=summary,
+        summary=fields["summary"],
         priority=priority,
-        keywords=keywords,
-        entities=entities,
+        keywords=fields["keywords"],
+        entities=fields["entities"],
         auto_resolvable=auto_resolvable,
         suggested_workflow=wf,
         approval_title=at,
         approval_body=ab,
+        tiers_run=tiers_run,
+        partial=partial,
+        model_version=fields.get("model_version"),
+        similar=fields.get("similar"),
+    )
+
+# Upgraded results of background completions, keyed by result_id. Bounded by
+# size and age; None marks a completion that is still running.
+_result_store: "OrderedDict[str, tuple[float, Optional[EnrichResponse]]]" = OrderedDict()
+_background_tasks: set = set()
+
+def _store_result(result_id: str, result: Optional[EnrichResponse]) -> None:
+    now = time.monotonic()
+    _result_store[result_id] = (now, result)
+    _result_store.move_to_end(result_id)
+    while _result_store:
+        oldest_id, (stored_at, _) = next(iter(_result_store.items()))
+        if len(_result_store) <= RESULT_STORE_MAX and now - stored_at <= RESULT_STORE_TTL_SECONDS:
+            break
+        _result_store.pop(oldest_id, None)
+
+def _cache_store(cache_key: Optional[str], result: EnrichResponse, fields: dict) -> None:
+    # Only the classification is cached; summary, keywords and entities are cheap
+    # and depend on the exact text, so they are always recomputed.
+    if result_cache is None or not cache_key or result.partial:
+        return
+    result_cache.put(cache_key, fingerprint=_cache_fingerprint(fields.get("model_version")), value={
+        "category": result.category,
+        "intent": result.intent,
+        "confidence": result.confidence,
+        "priority": result.priority,
+        "tiers_run": result.tiers_run,
+    })
+
+def _response_from_cache(text: str, fields: dict, cached: dict) -> EnrichResponse:
+    base = PredictResponse(category=cached["category"], intent=cached["intent"], confidence=cached["confidence"])
+    priority = cached.get("priority") or fields["priority"]
+    result = _build_enrich_response(text, base, fields, priority, list(cached.get("tiers_run") or []), False)
+    result.cached = True
+    return result
+
+async def _complete_in_background(
+    result_id: str,
+    text: str,
+    partial: EnrichResponse,
+    fields: dict,
+    tiers: List[str],
+    callback_url: Optional[str],
+    cache_key: Optional[str] = None,
+) -> None:
+    try:
+        base = PredictResponse(category=partial.category, intent=partial.intent, confidence=partial.confidence)
+        priority, ran, skipped = await _escalate(text, base, partial.priority, None, tiers, fields.get("hits"))
+        result = _build_enrich_response(text, base, fields, priority, partial.tiers_run + ran, bool(skipped))
+        result.result_id = result_id
+    except Exception as e:
+        print(f"Background enrichment {result_id} failed: {e}")
+        result = partial.model_copy(update={"result_id": result_id})
+    _store_result(result_id, result)
+    _cache_store(cache_key, result, fields)
+
+    if callback_url:
+        try:
+            await _get_http_client().post(callback_url, json=result.model_dump())
+        except Exception as e:
+            print(f"Enrichment callback to {callback_url} failed: {e}")
+
+def _valid_callback_url(url: Optional[str]) -> bool:
+    return not url or url.startswith("http://") or url.startswith("https://")
+
+async def _enrich_async(
+    text: str,
+    base: Optional[PredictResponse],
+    fields: dict,
+    deadline: Optional[Deadline] = None,
+    complete_in_background: bool = False,
+    callback_url: Optional[str] = None,
+    cached: Optional[dict] = None,
+    cache_key: Optional[str] = None,
+) -> EnrichResponse:
+    if cached is not None:
+        return _response_from_cache(text, fields, cached)
+
+    priority, ran, skipped = await _escalate(
+        text, base, fields["priority"], deadline, _ESCALATION_TIERS, fields.get("hits")
+    )
+    result = _build_enrich_response(
+        text, base, fields, priority, [_base_tier(base)] + ran, bool(skipped)
+    )
+    _cache_store(cache_key, result, fields)
+
+    if skipped and (complete_in_background or callback_url):
+        result_id = uuid.uuid4().hex
+        result.result_id = result_id
+        _store_result(result_id, None)
+        task = asyncio.create_task(
+            _complete_in_background(result_id, text, result.model_copy(), fields, skipped, callback_url, cache_key)
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return result
+
+def _check_batch_size(items: List[BatchItem]) -> None:
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(items)} items (max {BATCH_MAX_ITEMS})")
+
+def _predict_batch_items(
+    items: List[BatchItem],
+    norms: Optional[List[NormalizedText]] = None,
+    bundle: Optional[ModelBundle] = None,
+) -> List[tuple[Optional[PredictResponse], Optional[str]]]:
+    # Returns (result, error) per item, in request order. Valid items are classified
+    # together in chunks of BATCH_CHUNK_SIZE so the sparse matrix stays bounded.
+    if bundle is None:
+        bundle = model_registry.current()
+    out: List[tuple[Optional[PredictResponse], Optional[str]]] = [(None, None)] * len(items)
+    valid: List[int] = []
+    for i, item in enumerate(items):
+        if not isinstance(item.text, str) or not item.text.strip():
+            out[i] = (None, "text is required")
+        else:
+            valid.append(i)
+
+    chunk_size = max(1, BATCH_CHUNK_SIZE)
+    for start in range(0, len(valid), chunk_size):
+        idx = valid[start:start + chunk_size]
+        try:
+            chunk_norms = [norms[i] for i in idx] if norms is not None else None
+            preds = _predict_many([items[i].text for i in idx], None, bundle, None, chunk_norms)
+            for i, p in zip(idx, preds):
+                out[i] = (p, None)
+        except Exception:
+            # Isolate the failing item(s) instead of failing the whole chunk.
+            for i in idx:
+                try:
+                    out[i] = (_predict_many([items[i].text], None, bundle)[0], None)
+                except Exception as e:
+                    out[i] = (None, f"prediction failed: {e}")
+    return out
+
+@app.post("/predict", response_model=PredictResponse)
+@app.post("/", response_model=PredictResponse)  # Also support root endpoint for backward compatibility
+async def predict(req: PredictRequest):
+    return (await _run_inference(_predict_many, [req.text]))[0]
+
+# Only the HIGH-priority phrases (security terms included), for ranking before admission.
+_urgent_matcher = KeywordMatcher(p for priority, phrases in _PRIORITY_RULES if priority == "HIGH" for p in phrases)
+
+def admission_priority(text: str) -> int:
+    """Queue rank of a request, from its first AI_ADMISSION_RANK_CHARS characters.
+
+    Runs on the event loop for every request, including the ones that will be
+    shed, so it stays a short scan; the full normalization runs after admission.
+    """
+    head = text[:ADMISSION_RANK_CHARS] if ADMISSION_RANK_CHARS > 0 else ""
+    return PRIORITY_HIGH if _urgent_matcher.match(head.lower()) else PRIORITY_NORMAL
+
+async def _admit(priority: int, deadline: Optional[Deadline]) -> None:
+    try:
+        await admission.acquire(priority, deadline.remaining() if deadline is not None else None)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+async def _admit_bulk() -> None:
+    # A stream chunk cannot be answered with 503, so it waits for a slot instead:
+    # a shed attempt is retried after a pause, which also stops the body from being
+    # read meanwhile.
+    while True:
+        try:
+            await admission.acquire(PRIORITY_BULK)
+            return
+        except Overloaded:
+            await asyncio.sleep(1.0)
+
+@app.post("/enrich", response_model=EnrichResponse)
+async def enrich(req: EnrichRequest, x_deadline_ms: Optional[str] = Header(default=None)):
+    if not _valid_callback_url(req.callback_url):
+        raise HTTPException(status_code=422, detail="callback_url must be an http(s) URL")
+    deadline = _resolve_deadline(x_deadline_ms, req.deadline_ms)
+    if admission is not None:
+        await _admit(admission_priority(req.text), deadline)
+    try:
+        base, fields, cached, cache_key = await _run_inference(_prepare_enrich, req.text, req.ticket_id, req.similar_k)
+        return await _enrich_async(
+            fields["text"], base, fields, deadline, req.complete_in_background, req.callback_url, cached, cache_key
+        )
+    finally:
+        if admission is not None:
+            admission.release()
+
+@app.get("/enrich/results/{result_id}", response_model=EnrichResultStatus)
+def enrich_result(result_id: str):
+    entry = _result_store.get(result_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired result_id")
+    _, result = entry
+    return EnrichResultStatus(result_id=result_id, status="done" if result is not None else "pending", result=result)
+
+@app.post("/predict_batch", response_model=PredictBatchResponse)
+async def predict_batch(req: BatchRequest):
+    _check_batch_size(req.items)
+    results = await _run_inference(_predict_batch_items, req.items)
+    return PredictBatchResponse(
+        results=[
+            PredictBatchResult(id=item.id, result=res, error=err)
+            for item, (res, err) in zip(req.items, results)
+        ]
+    )
+
+def _enrich_batch_fields(
+    items: List[BatchItem],
+) -> List[tuple[Optional[PredictResponse], Optional[dict], Optional[dict], Optional[str], Optional[str]]]:
+    # Returns (base, fields, cached, cache_key, error) per item. Cache hits are
+    # resolved first so only the misses go through the vectorized prediction.
+    bundle = model_registry.current()
+    out: list = [(None, None, None, None, "text is required")] * len(items)
+    norms: Dict[int, NormalizedText] = {}
+    misses: List[int] = []
+    for i, item in enumerate(items):
+        if not isinstance(item.text, str) or not item.text.strip():
+            continue
+        try:
+            norm = normalize_text(item.text)
+            fields = _enrich_fields(norm, bundle)
+            cached, key = _cache_lookup(norm, bundle)
+        except Exception as e:
+            out[i] = (None, None, None, None, f"enrichment failed: {e}")
+            continue
+        out[i] = (None, fields, cached, key, None)
+        if cached is None:
+            misses.append(i)
+            norms[i] = norm
+
+    miss_norms = [norms[i] for i in misses]
+    for i, (base, err) in zip(misses, _predict_batch_items([items[i] for i in misses], miss_norms, bundle)):
+        _, fields, _, key, _ = out[i]
+        _use_model_priority(fields, base)
+        out[i] = (base, fields, None, key, None) if base is not None else (None, None, None, None, err)
+    return out
+
+@app.post("/enrich_batch", response_model=EnrichBatchResponse)
+async def enrich_batch(req: BatchRequest, x_deadline_ms: Optional[str] = Header(default=None)):
+    _check_batch_size(req.items)
+    if not _valid_callback_url(req.callback_url):
+        raise HTTPException(status_code=422, detail="callback_url must be an http(s) URL")
+    deadline = _resolve_deadline(x_deadline_ms, req.deadline_ms)
+    # A batch takes one admission slot, behind interactive /enrich requests.
+    if admission is not None:
+        await _admit(PRIORITY_BULK, deadline)
+    try:
+        results = await _enrich_items(req.items, deadline, req.complete_in_background, req.callback_url)
+    finally:
+        if admission is not None:
+            admission.release()
+    return EnrichBatchResponse(results=results)
+
+async def _enrich_items(
+    items: List[BatchItem],
+    deadline: Optional[Deadline] = None,
+    complete_in_background: bool = False,
+    callback_url: Optional[str] = None,
+) -> List[EnrichBatchResult]:
+    prepared = await _run_inference(_enrich_batch_fields, items)
+
+    async def finish(
+        item: BatchItem,
+        base: Optional[PredictResponse],
+        fields: Optional[dict],
+        cached: Optional[dict],
+        cache_key: Optional[str],
+        err: Optional[str],
+    ) -> EnrichBatchResult:
+        if err is not None or fields is None:
+            return EnrichBatchResult(id=item.id, error=err)
+        try:
+            result = await _enrich_async(
+                fields["text"], base, fields, deadline, complete_in_background, callback_url, cached, cache_key
+            )
+            return EnrichBatchResult(id=item.id, result=result)
+        except Exception as e:
+            return EnrichBatchResult(id=item.id, error=f"enrichment failed: {e}")
+
+    # Escalations run concurrently; the cloud client bounds and batches the fan-out.
+    return list(await asyncio.gather(*(finish(item, *p) for item, p in zip(items, prepared))))
+
+# === Streaming NDJSON (/predict_stream, /enrich_stream and backfill.py) ===
+# One {"id", "text"} object per input line; one {"line", "id", "result", "error"}
+# object per output line, in input order. Input is read one chunk at a time.
+
+StreamLine = tuple[int, Optional[BatchItem], Optional[str]]  # (line number, item, parse error)
+
+def parse_ndjson_line(line_no: int, raw: bytes) -> StreamLine:
+    try:
+        obj = json.loads(raw)
+    except Exception:
+        return line_no, None, "invalid JSON"
+    if not isinstance(obj, dict):
+        return line_no, None, "expected a JSON object"
+    ticket_id = obj.get("id")
+    text = obj.get("text")
+    return line_no, BatchItem(
+        id=str(ticket_id) if ticket_id is not None else None, text=text if isinstance(text, str) else None
+    ), None
+
+def _stream_record(line: StreamLine, result: Optional[BaseModel], error: Optional[str]) -> dict:
+    line_no, item, parse_error = line
+    return {
+        "line": line_no,
+        "id": item.id if item is not None else None,
+        "result": result.model_dump() if result is not None and parse_error is None else None,
+        "error": parse_error or error,
+    }
+
+def predict_stream_chunk(lines: List[StreamLine]) -> List[dict]:
+    results = _predict_batch_items([item or BatchItem() for _, item, _ in lines])
+    return [_stream_record(line, res, err) for line, (res, err) in zip(lines, results)]
+
+async def enrich_stream_chunk(lines: List[StreamLine], deadline_ms: Optional[int] = None) -> List[dict]:
+    # deadline_ms is a budget per chunk, not for the whole stream; it starts once
+    # the chunk holds an admission slot.
+    if admission is not None:
+        await _admit_bulk()
+    try:
+        deadline = Deadline(deadline_ms) if deadline_ms else None
+        results = await _enrich_items([item or BatchItem() for _, item, _ in lines], deadline)
+    finally:
+        if admission is not None:
+            admission.release()
+    return [_stream_record(line, r.result, r.error) for line, r in zip(lines, results)]
+
+async def _ndjson_chunks(request: Request, chunk_size: int):
+    # Reads only as fast as results are written back, so a slow consumer
+    # stops the body from being pulled off the socket.
+    pending = b""
+    chunk: List[StreamLine] = []
+    line_no = 0
+    skipping = False  # inside a line that exceeded STREAM_MAX_LINE_BYTES
+    async for data in request.stream():
+        parts = (pending + data).split(b"\n")
+        pending = parts.pop()
+        for raw in parts:
+            line_no += 1
+            if skipping or len(raw) > STREAM_MAX_LINE_BYTES:
+                skipping = False
+                chunk.append((line_no, None, f"line longer than {STREAM_MAX_LINE_BYTES} bytes"))
+            elif raw.strip():
+                chunk.append(parse_ndjson_line(line_no, raw))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if len(pending) > STREAM_MAX_LINE_BYTES:
+            pending = b""
+            skipping = True
+    if skipping or pending.strip():
+        line_no += 1
+        chunk.append(
+            (line_no, None, f"line longer than {STREAM_MAX_LINE_BYTES} bytes") if skipping
+            else parse_ndjson_line(line_no, pending)
+        )
+    if chunk:
+        yield chunk
+
+async def _stream_results(request: Request, mode: str, deadline_ms: Optional[int]):
+    # One chunk is scored while the next one is being read.
+    async def run(lines: List[StreamLine]) -> bytes:
+        if mode == "predict":
+            records = await _run_inference(predict_stream_chunk, lines)
+        else:
+            records = await enrich_stream_chunk(lines, deadline_ms)
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+
+    in_flight: Optional[asyncio.Task] = None
+    try:
+        # While the body is being read, a dropped client ends request.stream()
+        # with ClientDisconnect; once it has been read, it is polled for.
+        async for lines in _ndjson_chunks(request, max(1, BATCH_CHUNK_SIZE)):
+            task = asyncio.create_task(run(lines))
+            if in_flight is not None:
+                yield await in_flight
+            in_flight = task
+        if in_flight is not None and not await request.is_disconnected():
+            yield await in_flight
+            in_flight = None
+    except ClientDisconnect:
+        pass
+    finally:
+        if in_flight is not None:
+            in_flight.cancel()
+
+class NDJSONStream(StreamingResponse):
+    # The body generator reads the request while the response is being
+    # written; StreamingResponse's disconnect listener would consume those
+    # request messages, so only the streaming half is run here and
+    # _stream_results watches for the disconnect itself.
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        finally:
+            # A failed send leaves the generator suspended: close it so the chunk
+            # being scored is cancelled instead of finishing for nobody.
+            await self.body_iterator.aclose()
+
+@app.post("/predict_stream")
+async def predict_stream(request: Request):
+    return NDJSONStream(_stream_results(request, "predict", None), media_type="application/x-ndjson")
+
+@app.post("/enrich_stream")
+async def enrich_stream(request: Request, x_deadline_ms: Optional[str] = Header(default=None)):
+    # X-Deadline-Ms applies to each chunk; see enrich_stream_chunk.
+    deadline = _resolve_deadline(x_deadline_ms, None)
+    deadline_ms = deadline.budget_ms if deadline is not None else None
+    return NDJSONStream(_stream_results(request, "enrich", deadline_ms), media_type="application/x-ndjson")
+
+@app.post("/similar", response_model=SimilarResponse)
+async def similar(req: SimilarRequest):
+    if similar_index is None:
+        raise HTTPException(status_code=404, detail="Similarity index is disabled (AI_SIMILAR_ENABLED)")
+    return await _run_inference(_similar, req)
+
+@app.get("/similar/stats")
+def similar_stats():
+    if similar_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **similar_index.stats()}
+
+def _require_kb() -> KBIndex:
+    if kb_index is None:
+        raise HTTPException(status_code=404, detail=f"KB search is disabled ({_kb_disabled_reason})")
+    if kb_index.encoder is None:
+        raise HTTPException(status_code=503, detail="KB search needs a loaded model for the tfidf encoder")
+    return kb_index
+
+@app.post("/kb/articles")
+async def kb_ingest(req: KBIngestRequest):
+    index = _require_kb()
+    # Bulk encoding can take a while: keep it off the inference pool.
+    added, updated = await asyncio.to_thread(index.upsert, [a.model_dump() for a in req.articles])
+    return {"added": added, "updated": updated, "total": len(index)}
+
+@app.delete("/kb/articles/{article_id}")
+def kb_delete(article_id: str):
+    index = _require_kb()
+    if not index.delete(article_id):
+        raise HTTPException(status_code=404, detail="Unknown article id")
+    return {"deleted": article_id, "total": len(index)}
+
+def _kb_search(req: KBSearchRequest) -> KBSearchResponse:
+    with metrics.stage("kb_search"):
+        results = kb_index.search(req.text, max(1, min(req.k, 100)), req.category, req.min_score)
+    return KBSearchResponse(results=[KBSearchResult(**r) for r in results], encoder=kb_index.encoder.signature)
+
+@app.post("/kb/search", response_model=KBSearchResponse)
+async def kb_search(req: KBSearchRequest):
+    _require_kb()
+    return await _run_inference(_kb_search, req)
+
+@app.get("/kb/stats")
+def kb_stats():
+    if kb_index is None:
+        return {"enabled": False, "reason": _kb_disabled_reason}
+    return {"enabled": True, **kb_index.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cloud/stats")
+def cloud_stats():
+    if _cloud_client is None:
+        return {"enabled": _cloud_enabled()}
+    return {"enabled": True, **_cloud_client.stats()}
+
+@app.get("/admission/stats")
+def admission_stats():
+    if admission is None:
+        return {"enabled": False}
+    return {"enabled": True, **admission.stats()}
+
+@app.get("/cache/stats")
+def cache_stats():
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+def _is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token == ADMIN_TOKEN
+
+def _require_admin(token: Optional[str]) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set AI_ADMIN_TOKEN)")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/admin/reload")
+async def admin_reload(force: bool = False, x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    previous = model_registry.version
+    # Load and warm off the event loop; serving continues on the current bundle meanwhile.
+    swapped, error = await asyncio.to_thread(model_registry.reload, force)
+    if error:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving {previous}: {error}")
+    return {"swapped": swapped, "previous_version": previous, "model_version": model_registry.version}
+
+@app.get("/admin/profiles")
+def admin_profiles(x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    if profiler is None:
+        return {"enabled": False, "profiles": []}
+    return {"enabled": True, **profiler.stats(), "profiles": profiler.list()}
+
+@app.get("/admin/profiles/{profile_id}")
+def admin_profile(profile_id: str, format: str = "collapsed", x_admin_token: Optional[str] = Header(default=None)):
+    # format=collapsed feeds flamegraph.pl / speedscope; format=json adds timings and input size.
+    _require_admin(x_admin_token)
+    profile = profiler.get(profile_id) if profiler is not None else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Unknown or evicted profile")
+    if format == "json":
+        return {**profile["meta"], "collapsed": profile["collapsed"]}
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'},
     )
 
 @app.get("/")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "model_version": model_registry.version}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the AI NLP classifier")
+    parser.add_argument("--host", type=str, default=os.getenv("AI_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("AI_PORT", "8001")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="Worker processes; >1 pre-forks workers that share the loaded models",
+    )
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if kb_index is not None:
+            # --workers given without AI_WORKERS: the import-time check did not see it.
+            logger.warning("KB search is disabled: the KB index is per process and %d workers are configured", args.workers)
+            _disable_kb("not supported with more than one worker process")
+        if similar_index is not None:
+            print(
+                f"Similarity index: each of the {args.workers} workers indexes only the tickets it serves,"
+                " so /similar sees roughly 1/N of them until a restart merges the per-worker snapshots"
+            )
+        import prefork
+        prefork.serve(app, args.host, args.port, args.workers)
+    else:
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Offline bulk classification of historical tickets.
+
+Reads NDJSON ticket records ({"id": ..., "text": ...} per line) and writes one
+result line per input line, in input order, in the same format as the
+service's /predict_stream and /enrich_stream endpoints:
+
+    {"line": 1, "id": "T-1", "result": {...}, "error": null}
+
+Chunks of --chunk-size lines are scored by a process pool; every worker loads
+the service (app.py) once and runs the same code the endpoints do, so
+--mode enrich escalates to the local and cloud tiers exactly as a request
+would. At most two chunks per worker are in flight, so memory stays flat
+whatever the size of the input.
+
+After each chunk is written, --checkpoint (default: <output>.checkpoint.json)
+records the input byte offset and the output size. Re-running the same
+command resumes from there: the output is cut back to the recorded size and
+the input is read from the recorded offset. --restart starts over.
+
+    python backfill.py --input data/history.jsonl --output data/history.classified.jsonl --workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+# Per worker process, set by _init_worker.
+_app = None
+_loop = None
+
+
+def _init_worker() -> None:
+    global _app, _loop
+    import asyncio
+    from multiprocessing.util import Finalize
+
+    # Artifacts stay fixed for the whole run.
+    os.environ["AI_MODEL_WATCH_INTERVAL_SECONDS"] = "0"
+    import app as app_module
+
+    _app = app_module
+    # One loop per worker for its lifetime: the cloud client is bound to the loop it first ran on.
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    if _app.label_log is not None:
+        # Pool workers skip atexit; Finalize still runs when they shut down.
+        Finalize(None, _app.label_log.close, exitpriority=10)
+
+
+def _score_chunk(mode: str, lines: List[Tuple[int, bytes]], deadline_ms: Optional[int]) -> bytes:
+    parsed = [_app.parse_ndjson_line(line_no, raw) for line_no, raw in lines]
+    if mode == "predict":
+        records = _app.predict_stream_chunk(parsed)
+    else:
+        records = _loop.run_until_complete(_app.enrich_stream_chunk(parsed, deadline_ms))
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+
+
+def iter_chunks(f, line_no: int, chunk_size: int) -> Iterator[Tuple[List[Tuple[int, bytes]], int, int]]:
+    """(lines, line number and byte offset after the chunk) from the current position of a binary file."""
+    chunk: List[Tuple[int, bytes]] = []
+    for raw in f:
+        line_no += 1
+        if raw.strip():
+            chunk.append((line_no, raw.rstrip(b"\r\n")))
+        if len(chunk) >= chunk_size:
+            yield chunk, line_no, f.tell()
+            chunk = []
+    if chunk:
+        yield chunk, line_no, f.tell()
+
+
+def load_checkpoint(path: Path, input_path: str, output_path: str) -> Optional[dict]:
+    if not path.exists():
+        return None
+    state = json.loads(path.read_text(encoding="utf-8"))
+    if state.get("input") != os.path.abspath(input_path) or state.get("output") != os.path.abspath(output_path):
+        raise ValueError(f"{path} belongs to a run over {state.get('input')} -> {state.get('output')}")
+    return state
+
+
+def save_checkpoint(path: Path, state: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a JSONL file of tickets with the service pipeline")
+    parser.add_argument("--input", type=str, required=True, help="NDJSON tickets, one {id, text} object per line")
+    parser.add_argument("--output", type=str, required=True, help="NDJSON results, one line per input line")
+    parser.add_argument("--mode", choices=["predict", "enrich"], default="predict", help="Fast path only, or with escalation")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=512, help="Lines scored per task")
+    parser.add_argument("--deadline-ms", type=int, default=0, help="Escalation budget per chunk (--mode enrich, 0 = none)")
+    parser.add_argument("--checkpoint", type=str, default="", help="Resume state (default: <output>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    args = parser.parse_args()
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    chunk_size = max(1, args.chunk_size)
+    deadline_ms = args.deadline_ms if args.deadline_ms > 0 else None
+    checkpoint = Path(args.checkpoint or args.output + ".checkpoint.json")
+
+    try:
+        state = None if args.restart else load_checkpoint(checkpoint, args.input, args.output)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if state is None:
+        state = {
+            "input": os.path.abspath(args.input),
+            "output": os.path.abspath(args.output),
+            "input_offset": 0,
+            "lines": 0,
+            "output_bytes": 0,
+            "done": False,
+        }
+    elif state.get("done"):
+        print(f"Already complete ({state['lines']} lines); use --restart to run again", file=sys.stderr)
+        return
+
+    out_path = Path(args.output)
+    if state["output_bytes"] and (not out_path.exists() or out_path.stat().st_size < state["output_bytes"]):
+        print(f"{args.output} is shorter than {checkpoint} records; use --restart", file=sys.stderr)
+        sys.exit(1)
+    if state["lines"]:
+        print(f"Resuming at line {state['lines'] + 1}", file=sys.stderr)
+
+    started = time.perf_counter()
+    done_lines = 0
+    with open(args.input, "rb") as f_in, open(out_path, "r+b" if out_path.exists() else "wb") as f_out:
+        # Anything past the last checkpoint is from an interrupted chunk and is written again.
+        f_out.truncate(state["output_bytes"])
+        f_out.seek(state["output_bytes"])
+        f_in.seek(state["input_offset"])
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pending: deque = deque()
+
+            def write_oldest() -> None:
+                nonlocal done_lines
+                future, line_no, offset = pending.popleft()
+                f_out.write(future.result())
+                f_out.flush()
+                os.fsync(f_out.fileno())
+                done_lines += line_no - state["lines"]
+                state.update(input_offset=offset, lines=line_no, output_bytes=f_out.tell())
+                save_checkpoint(checkpoint, state)
+                rate = done_lines / max(1e-9, time.perf_counter() - started)
+                print(f"\r{line_no} lines ({rate:.0f}/s)", end="", file=sys.stderr, flush=True)
+
+            for lines, line_no, offset in iter_chunks(f_in, state["lines"], chunk_size):
+                pending.append((pool.submit(_score_chunk, args.mode, lines, deadline_ms), line_no, offset))
+                if len(pending) >= 2 * workers:
+                    write_oldest()
+            while pending:
+                write_oldest()
+
+    state["done"] = True
+    save_checkpoint(checkpoint, state)
+    seconds = time.perf_counter() - started
+    print(f"\nClassified {done_lines} lines in {seconds:.1f}s -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
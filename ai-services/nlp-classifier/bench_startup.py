@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the classifier service.
+
+Imports app.py in fresh interpreters, once loading the native NumPy bundle and
+once forcing the legacy .pkl path, and reports wall time to "model ready" plus
+whether scikit-learn/transformers ended up imported. Prints JSON; exits 1 when
+--min-speedup is given and not met.
+
+    python bench_startup.py --runs 5 --min-speedup 1.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+import app
+ready = app.model_registry.current() is not None
+t1 = time.perf_counter()
+print(json.dumps({
+    "seconds": t1 - t0,
+    "ready": ready,
+    "source": app.model_registry.current().source if ready else None,
+    "sklearn_imported": "sklearn" in sys.modules,
+    "transformers_imported": "transformers" in sys.modules,
+}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=str(Path(__file__).resolve().parent),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure(env: dict, runs: int) -> dict:
+    samples = [run_once(env) for _ in range(runs)]
+    times = [s["seconds"] for s in samples]
+    out = dict(samples[-1])
+    out.update({
+        "runs": runs,
+        "median_seconds": round(statistics.median(times), 4),
+        "min_seconds": round(min(times), 4),
+    })
+    del out["seconds"]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare service startup: native bundle vs pickled estimators")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--min-speedup", type=float, default=0.0, help="Fail unless pickle/native >= this")
+    args = parser.parse_args()
+
+    base = dict(os.environ)
+    base.setdefault("AI_CACHE_ENABLED", "0")
+    base["AI_MODEL_WATCH_INTERVAL_SECONDS"] = "0"
+
+    native = measure(dict(base), args.runs)
+    legacy = measure(dict(base, MODEL_BUNDLE_DIR=""), args.runs)
+
+    speedup = legacy["median_seconds"] / native["median_seconds"] if native["median_seconds"] > 0 else 0.0
+    report = {"native": native, "pickle": legacy, "speedup": round(speedup, 2)}
+    print(json.dumps(report, indent=2))
+
+    if native["source"] != "native":
+        print("Native bundle was not loaded; run train.py to export it.", file=sys.stderr)
+        sys.exit(1)
+    if args.min_speedup and speedup < args.min_speedup:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
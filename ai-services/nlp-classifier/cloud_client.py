@@ -0,0 +1,429 @@
+"""
+Client layer for the cloud enrichment tier (HF inference API or OpenAI).
+
+Every call goes through the shared keep-alive httpx client and, per provider,
+through:
+- a token bucket that caps upstream requests per second,
+- a circuit breaker that skips the provider for a cool-down period after
+  repeated failures (one probe request is let through when it ends),
+- in-flight coalescing, so identical tickets waiting on the provider share
+  one upstream request,
+- a micro-batcher that packs tickets arriving within max_wait_ms into one
+  multi-item prompt when the provider can answer several at once.
+
+classify() never raises: every failure resolves to None and is reported
+through the record(outcome) callback.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+_ALLOWED = (
+    "Allowed priority: LOW, MEDIUM, HIGH.\n"
+    "Allowed intent examples: INCIDENT, SERVICE_REQUEST, HOW_TO, SECURITY_REPORT, ACCOUNT_ACCESS, UNKNOWN.\n"
+    "Allowed category examples: IDENTITY_ACCESS, NETWORK_VPN_WIFI, EMAIL_COLLAB, ENDPOINT_DEVICE, BUSINESS_APP_ERP_CRM, "
+    "SOFTWARE_INSTALL_LICENSE, HARDWARE_PERIPHERAL, SECURITY_INCIDENT, KB_GENERAL, OTHER.\n\n"
+)
+
+# Marker before the JSON array of {id, text} in multi-item prompts.
+MULTI_ITEM_MARKER = "Tickets (JSON array of {id, text}):\n"
+
+
+def single_prompt(text: str) -> str:
+    return (
+        "You are an IT support ticket classifier. Return ONLY valid JSON with keys: "
+        "category, intent, priority, confidence.\n\n"
+        + _ALLOWED
+        + f"Ticket:\n{text}\n"
+    )
+
+
+def multi_prompt(texts: List[str]) -> str:
+    # The instructions are sent once for the whole batch.
+    tickets = json.dumps([{"id": i, "text": t} for i, t in enumerate(texts)], ensure_ascii=False)
+    return (
+        "You are an IT support ticket classifier. Classify every ticket below. Return ONLY a valid JSON array "
+        "with one object per ticket, in the same order, each with keys: id, category, intent, priority, confidence.\n\n"
+        + _ALLOWED
+        + MULTI_ITEM_MARKER
+        + tickets
+        + "\n"
+    )
+
+
+def extract_json_object(text: str) -> Optional[dict]:
+    # Extract the first JSON object found in a possibly chatty model response.
+    if not text:
+        return None
+    m = re.search(r"\{[\s\S]*\}", text)
+    if not m:
+        return None
+    try:
+        parsed = json.loads(m.group(0))
+    except Exception:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def extract_json_items(text: str, count: int) -> List[Optional[dict]]:
+    """Per-ticket answers from a multi-item response, matched on "id" (else position)."""
+    out: List[Optional[dict]] = [None] * count
+    if not text:
+        return out
+    items = None
+    m = re.search(r"\[[\s\S]*\]", text)
+    if m:
+        try:
+            items = json.loads(m.group(0))
+        except Exception:
+            items = None
+    if items is None:
+        # Some models wrap the array: {"results": [...]}
+        wrapped = extract_json_object(text)
+        if wrapped is not None:
+            items = next((v for v in wrapped.values() if isinstance(v, list)), None)
+    if not isinstance(items, list):
+        return out
+    for pos, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        idx = item.get("id", pos)
+        try:
+            idx = int(idx)
+        except Exception:
+            idx = pos
+        if 0 <= idx < count and out[idx] is None:
+            out[idx] = item
+    return out
+
+
+class CloudProvider:
+    """Request/response format of one provider. max_batch > 1 means multi-item prompts are supported."""
+
+    name = ""
+    max_batch = 1
+
+    def request(self, prompt: str, items: int) -> Tuple[str, Dict[str, str], dict]:
+        raise NotImplementedError
+
+    def content(self, data) -> Optional[str]:
+        raise NotImplementedError
+
+
+class HFProvider(CloudProvider):
+    # Small instruct models are not reliable at answering a JSON array, so
+    # tickets are sent one per request.
+    name = "hf"
+    max_batch = 1
+
+    def __init__(self, token: str, model: str):
+        self.token = token
+        self.model = model
+
+    def request(self, prompt: str, items: int) -> Tuple[str, Dict[str, str], dict]:
+        url = f"https://api-inference.huggingface.co/models/{self.model}"
+        headers = {"Authorization": f"Bearer {self.token}"}
+        payload = {
+            "inputs": prompt,
+            "parameters": {"max_new_tokens": 180 * items, "temperature": 0.2, "return_full_text": False},
+        }
+        return url, headers, payload
+
+    def content(self, data) -> Optional[str]:
+        # Common response: [{"generated_text": "..."}]; errors come back as a dict.
+        if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
+            text_out = data[0].get("generated_text")
+            if isinstance(text_out, str):
+                return text_out
+        return None
+
+
+class OpenAIProvider(CloudProvider):
+    name = "openai"
+    max_batch = 32
+
+    def __init__(self, api_key: str, model: str):
+        self.api_key = api_key
+        self.model = model
+
+    def request(self, prompt: str, items: int) -> Tuple[str, Dict[str, str], dict]:
+        url = "https://api.openai.com/v1/chat/completions"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+        }
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "Return ONLY JSON. No markdown."},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0.2,
+            "max_tokens": 200 * items,
+        }
+        return url, headers, payload
+
+    def content(self, data) -> Optional[str]:
+        if not isinstance(data, dict):
+            return None
+        content = (data.get("choices") or [{}])[0].get("message", {}).get("content")
+        return content.strip() if isinstance(content, str) else None
+
+
+def make_provider(name: str, hf_token: str, hf_model: str, openai_key: str, openai_model: str) -> Optional[CloudProvider]:
+    if name == "hf" and hf_token and hf_model:
+        return HFProvider(hf_token, hf_model)
+    if name == "openai" and openai_key:
+        return OpenAIProvider(openai_key, openai_model)
+    return None
+
+
+class TokenBucket:
+    """Requests per second with a burst allowance; rate <= 0 disables limiting."""
+
+    def __init__(self, rate: float, burst: float = 0.0):
+        self.rate = max(0.0, rate)
+        self.capacity = max(1.0, burst if burst > 0 else self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, max_wait: float) -> bool:
+        """Take one token, waiting up to max_wait seconds; False when none became available."""
+        if self.rate <= 0:
+            return True
+        waited = 0.0
+        while True:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            wait = (1.0 - self._tokens) / self.rate
+            if waited + wait > max_wait:
+                return False
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; failure_threshold <= 0 disables it."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = max(0.0, cooldown_seconds)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def is_open(self) -> bool:
+        """True while cooling down; does not consume the half-open probe."""
+        return self.state == self.OPEN and time.monotonic() - self._opened_at < self.cooldown_seconds
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.is_open():
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            # One probe at a time decides whether the provider is back.
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failure_threshold <= 0:
+            return
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.opened += 1
+
+    def release(self) -> None:
+        # The probe was never sent (e.g. rate limited): let the next call probe instead.
+        self._probing = False
+
+
+class CloudClient:
+    """Rate-limited, coalescing, batching access to one provider. Use from one event loop."""
+
+    def __init__(
+        self,
+        provider: CloudProvider,
+        get_http_client: Callable[[], httpx.AsyncClient],
+        max_concurrency: int = 8,
+        rate_per_second: float = 0.0,
+        burst: float = 0.0,
+        max_batch: int = 8,
+        max_wait_ms: float = 20.0,
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 30.0,
+        queue_timeout_seconds: float = 10.0,
+        record: Optional[Callable[[str], None]] = None,
+    ):
+        self.provider = provider
+        self.get_http_client = get_http_client
+        self.max_batch = max(1, min(max_batch, provider.max_batch))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.queue_timeout = max(0.0, queue_timeout_seconds)
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown_seconds)
+        self._record = record or (lambda outcome: None)
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self._stats: Dict[str, int] = {
+            "calls": 0,
+            "coalesced": 0,
+            "circuit_open": 0,
+            "rate_limited": 0,
+            "upstream_requests": 0,
+            "batched_tickets": 0,
+        }
+
+    def _key(self, text: str) -> str:
+        h = hashlib.sha256()
+        h.update(f"{self.provider.name}:{getattr(self.provider, 'model', '')}".encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        return h.hexdigest()
+
+    def is_open(self) -> bool:
+        return self.breaker.is_open()
+
+    async def classify(self, text: str) -> Optional[dict]:
+        """{category, intent, priority, confidence} from the provider, or None."""
+        self._stats["calls"] += 1
+        key = self._key(text)
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self._stats["coalesced"] += 1
+            self._record("coalesced")
+            return await asyncio.shield(shared)
+
+        if not self.breaker.allow():
+            self._stats["circuit_open"] += 1
+            self._record("circuit_open")
+            return None
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._inflight[key] = fut
+        fut.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        # Shielded: a caller whose deadline expires must not cancel the answer for the others.
+        return await asyncio.shield(fut)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        results: List[Optional[dict]] = [None] * len(batch)
+        try:
+            results = await self._request([text for text, _ in batch])
+        except Exception as e:
+            self.breaker.record_failure()
+            self._record("error")
+            print(f"Cloud enrichment via {self.provider.name} failed: {e}")
+        finally:
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+    async def _request(self, texts: List[str]) -> List[Optional[dict]]:
+        failed: List[Optional[dict]] = [None] * len(texts)
+        if not await self.bucket.acquire(self.queue_timeout):
+            self.breaker.release()
+            self._stats["rate_limited"] += len(texts)
+            self._record("rate_limited")
+            return failed
+
+        prompt = single_prompt(texts[0]) if len(texts) == 1 else multi_prompt(texts)
+        url, headers, payload = self.provider.request(prompt, len(texts))
+        self._stats["upstream_requests"] += 1
+        if len(texts) > 1:
+            self._stats["batched_tickets"] += len(texts)
+        try:
+            async with self._semaphore:
+                res = await self.get_http_client().post(url, headers=headers, json=payload)
+        except httpx.TimeoutException:
+            self.breaker.record_failure()
+            self._record("timeout")
+            return failed
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            self._record("transport_error")
+            return failed
+        if not res.is_success:
+            # 429 and 5xx mean the provider is struggling; 401/403 will not fix themselves either.
+            self.breaker.record_failure()
+            self._record(f"http_{res.status_code // 100}xx")
+            return failed
+
+        self.breaker.record_success()
+        content = self.provider.content(res.json())
+        if len(texts) == 1:
+            parsed = [extract_json_object(content)] if content else failed
+        else:
+            parsed = extract_json_items(content, len(texts)) if content else failed
+        for item in parsed:
+            self._record("ok" if item is not None else "bad_response")
+        return parsed
+
+    async def aclose(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for _, fut in self._pending:
+            if not fut.done():
+                fut.set_result(None)
+        self._pending = []
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+
+    def stats(self) -> dict:
+        out: dict = dict(self._stats)
+        out["provider"] = self.provider.name
+        out["breaker_state"] = self.breaker.state
+        out["breaker_opened"] = self.breaker.opened
+        out["max_batch"] = self.max_batch
+        out["rate_per_second"] = self.bucket.rate
+        return out
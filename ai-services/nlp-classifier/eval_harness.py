@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Evaluation and latency benchmark for the classifier service.
+
+Replays a labeled JSONL corpus (ideally model/holdout.jsonl from
+`train.py --holdout`) against the in-process app and reports:
+
+  - accuracy per tier: keyword fallback, TF-IDF+LR, local zero-shot (when
+    AI_LOCAL_HF_ENABLED is set) and the full /enrich pipeline with the cloud
+    tier stubbed out;
+  - p50/p95/p99 latency and throughput of /predict and /enrich through a
+    FastAPI TestClient at each --concurrency level;
+  - resident memory of the worker after loading and after the load test;
+  - with --overload-concurrency, /enrich goodput (200s per second), shed
+    (503) and degraded (slow tiers skipped) counts at each level, to check
+    that admission control keeps throughput steady past saturation
+    (--min-goodput-ratio against the first level).
+
+The cloud stub answers like the OpenAI API with the gold label after
+--cloud-latency-ms, so its row is the ceiling the escalation policy can
+reach; the escalation rate and the latency it costs are the useful numbers.
+
+Results are written as JSON (--out). Any failed budget (--max-p95-ms,
+--min-accuracy, ...) makes the script exit 1.
+
+    python eval_harness.py --data model/holdout.jsonl --concurrency 1 8 --max-p95-ms 50 --min-accuracy 0.8
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+STUB_OPENAI_KEY = "evaluate-stub"
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024.0 * 1024.0 if platform.system() == "Darwin" else 1024.0), 1)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def load_texts(path: str, limit: int) -> List[str]:
+    # Plain JSON reader for the load test, so train.py (and scikit-learn) are not
+    # imported before the worker's memory is measured.
+    texts = []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            if line.strip():
+                text = str(json.loads(line.lstrip("\ufeff")).get("text") or "").strip()
+                if text:
+                    texts.append(text)
+                    if limit and len(texts) >= limit:
+                        break
+    return texts
+
+
+def load_corpus(path: str, limit: int) -> List[dict]:
+    # Gold labels come from train.py so the evaluation uses exactly the training
+    # relabelling (security override, unknown domains -> OTHER).
+    from train import iter_jsonl, to_sample
+
+    rows = []
+    for record in iter_jsonl(path):
+        sample = to_sample(record)
+        if sample is None:
+            continue
+        _, domain, intent, risk = sample
+        rows.append({"text": str(record["text"]).strip(), "category": domain, "intent": intent, "risk": risk})
+        if limit and len(rows) >= limit:
+            break
+    return rows
+
+
+def install_cloud_stub(app_module, gold: Dict[str, dict], latency_ms: float) -> None:
+    import asyncio
+
+    import httpx
+    from cloud_client import MULTI_ITEM_MARKER
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+
+        def answer(ticket: str) -> dict:
+            label = gold.get(ticket.strip(), {})
+            return {
+                "category": label.get("category", "OTHER"),
+                "intent": label.get("intent", "UNKNOWN"),
+                "priority": app_module._RISK_PRIORITY.get(label.get("risk", ""), "MEDIUM"),
+                "confidence": 0.9,
+            }
+
+        await asyncio.sleep(latency_ms / 1000.0)
+        if MULTI_ITEM_MARKER in prompt:
+            tickets = json.loads(prompt.split(MULTI_ITEM_MARKER, 1)[1])
+            content = json.dumps([{"id": t["id"], **answer(t["text"])} for t in tickets])
+        else:
+            content = json.dumps(answer(prompt.rsplit("Ticket:\n", 1)[-1]))
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    clients: Dict[int, httpx.AsyncClient] = {}
+
+    def stub_client() -> httpx.AsyncClient:
+        loop_id = id(asyncio.get_running_loop())
+        if loop_id not in clients:
+            clients[loop_id] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return clients[loop_id]
+
+    app_module._get_http_client = stub_client
+
+
+def accuracy(pairs: List[tuple]) -> Optional[float]:
+    return round(sum(1 for p, g in pairs if p == g) / len(pairs), 4) if pairs else None
+
+
+def evaluate_tiers(app_module, rows: List[dict], client) -> dict:
+    texts = [r["text"] for r in rows]
+    tiers: dict = {}
+
+    keyword = [app_module.fallback_classify(t) for t in texts]
+    tiers["keyword"] = {
+        "category_accuracy": accuracy([(p.category, r["category"]) for p, r in zip(keyword, rows)]),
+        "intent_accuracy": accuracy([(p.intent, r["intent"]) for p, r in zip(keyword, rows)]),
+        "priority_accuracy": accuracy([
+            (app_module.guess_priority(t), app_module._RISK_PRIORITY.get(r["risk"])) for t, r in zip(texts, rows)
+        ]),
+    }
+
+    bundle = app_module.model_registry.current()
+    if bundle is not None:
+        preds = app_module._predict_many(texts, None, bundle)
+        tiers["tfidf"] = {
+            "model_version": bundle.version,
+            "category_accuracy": accuracy([(p.category, r["category"]) for p, r in zip(preds, rows)]),
+            "intent_accuracy": accuracy([(p.intent, r["intent"]) for p, r in zip(preds, rows)]),
+            "priority_accuracy": accuracy([
+                (p.priority, app_module._RISK_PRIORITY.get(r["risk"])) for p, r in zip(preds, rows) if p.priority
+            ]),
+        }
+    else:
+        tiers["tfidf"] = {"skipped": "no model artifacts loaded"}
+
+    if app_module.hf_batcher is not None:
+        local = [app_module._local_hf_enrich(t) or {} for t in texts]
+        tiers["local_zero_shot"] = {
+            "category_accuracy": accuracy([(l.get("category"), r["category"]) for l, r in zip(local, rows)]),
+            "intent_accuracy": accuracy([(l.get("intent"), r["intent"]) for l, r in zip(local, rows)]),
+        }
+    else:
+        tiers["local_zero_shot"] = {"skipped": "AI_LOCAL_HF_ENABLED is off"}
+
+    enriched = [client.post("/enrich", json={"text": t}).json() for t in texts]
+    escalated = [e for e in enriched if "cloud" in (e.get("tiers_run") or [])]
+    tiers["pipeline_cloud_stub"] = {
+        "category_accuracy": accuracy([(e.get("category"), r["category"]) for e, r in zip(enriched, rows)]),
+        "intent_accuracy": accuracy([(e.get("intent"), r["intent"]) for e, r in zip(enriched, rows)]),
+        "priority_accuracy": accuracy([
+            (e.get("priority"), app_module._RISK_PRIORITY.get(r["risk"])) for e, r in zip(enriched, rows)
+        ]),
+        "cloud_escalation_rate": round(len(escalated) / len(enriched), 4) if enriched else 0.0,
+    }
+    return tiers
+
+
+def load_test(client, path: str, texts: List[str], requests: int, concurrency: int) -> dict:
+    payloads = [{"text": texts[i % len(texts)]} for i in range(requests)]
+
+    def call(payload: dict) -> tuple:
+        started = time.perf_counter()
+        res = client.post(path, json=payload)
+        return time.perf_counter() - started, res.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, payloads))
+    wall = time.perf_counter() - started
+
+    latencies = [r[0] * 1000.0 for r in results]
+    errors = sum(1 for r in results if r[1] != 200)
+    return {
+        "endpoint": path,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / wall, 1) if wall > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+    }
+
+
+def overload_test(client, texts: List[str], requests: int, concurrency: int) -> dict:
+    payloads = [{"text": texts[i % len(texts)]} for i in range(requests)]
+
+    def call(payload: dict) -> tuple:
+        started = time.perf_counter()
+        res = client.post("/enrich", json=payload)
+        partial = res.status_code == 200 and bool(res.json().get("partial"))
+        return time.perf_counter() - started, res.status_code, partial
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, payloads))
+    wall = time.perf_counter() - started
+
+    ok = [r[0] * 1000.0 for r in results if r[1] == 200]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(ok),
+        "shed": sum(1 for r in results if r[1] == 503),
+        "degraded": sum(1 for r in results if r[2]),
+        "errors": sum(1 for r in results if r[1] not in (200, 503)),
+        "goodput_rps": round(len(ok) / wall, 1) if wall > 0 else 0.0,
+        "p95_ok_ms": round(percentile(ok, 0.95), 2),
+        "p99_ok_ms": round(percentile(ok, 0.99), 2),
+    }
+
+
+def check_budgets(args, report: dict) -> List[dict]:
+    checks: List[dict] = []
+
+    def check(name: str, actual, limit, ok: bool) -> None:
+        checks.append({"budget": name, "limit": limit, "actual": actual, "ok": ok})
+
+    for run in report["latency"]:
+        label = f"{run['endpoint']}@{run['concurrency']}"
+        if args.max_p95_ms is not None:
+            check(f"p95_ms {label}", run["p95_ms"], args.max_p95_ms, run["p95_ms"] <= args.max_p95_ms)
+        if args.max_p99_ms is not None:
+            check(f"p99_ms {label}", run["p99_ms"], args.max_p99_ms, run["p99_ms"] <= args.max_p99_ms)
+        if args.min_throughput is not None:
+            check(
+                f"throughput_rps {label}",
+                run["throughput_rps"],
+                args.min_throughput,
+                run["throughput_rps"] >= args.min_throughput,
+            )
+        check(f"errors {label}", run["errors"], 0, run["errors"] == 0)
+
+    overload = report.get("overload") or []
+    for run in overload:
+        check(f"errors overload@{run['concurrency']}", run["errors"], 0, run["errors"] == 0)
+    if args.min_goodput_ratio is not None and len(overload) > 1:
+        baseline = overload[0]["goodput_rps"]
+        worst = min(run["goodput_rps"] for run in overload[1:])
+        ratio = round(worst / baseline, 3) if baseline > 0 else 0.0
+        check("overload goodput_ratio", ratio, args.min_goodput_ratio, ratio >= args.min_goodput_ratio)
+
+    if args.min_accuracy is not None:
+        acc = report["tiers"].get("tfidf", {}).get("category_accuracy")
+        check("tfidf category_accuracy", acc, args.min_accuracy, acc is not None and acc >= args.min_accuracy)
+    if args.max_rss_mb is not None:
+        rss = report["memory_mb"]["after_load_test"]
+        check("rss_mb", rss, args.max_rss_mb, rss <= args.max_rss_mb)
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate accuracy and latency of the classifier service")
+    default_data = "model/holdout.jsonl" if Path("model/holdout.jsonl").exists() else "data/train.jsonl"
+    parser.add_argument("--data", type=str, default=default_data, help="Labeled JSONL corpus to replay")
+    parser.add_argument("--limit", type=int, default=0, help="Max records to evaluate (0 = all)")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--endpoints", nargs="+", default=["/predict", "/enrich"])
+    parser.add_argument("--cloud-latency-ms", type=float, default=200.0, help="Latency of the stubbed cloud tier")
+    parser.add_argument("--no-cloud-stub", action="store_true", help="Leave the cloud tier as configured")
+    parser.add_argument("--out", type=str, default="", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    parser.add_argument("--max-p99-ms", type=float, default=None)
+    parser.add_argument("--min-throughput", type=float, default=None, help="Requests/second, per run")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="TF-IDF category accuracy")
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    parser.add_argument(
+        "--overload-concurrency", type=int, nargs="+", default=[],
+        help="/enrich concurrency levels for the overload run, nominal first (e.g. 8 64 256)",
+    )
+    parser.add_argument(
+        "--min-goodput-ratio", type=float, default=None,
+        help="Worst overload goodput as a fraction of the first level's",
+    )
+    args = parser.parse_args()
+
+    # Configure the app before importing it: latency must not be served from the
+    # result cache, and the model must not change underneath the run.
+    os.environ["AI_CACHE_ENABLED"] = "0"
+    os.environ["AI_MODEL_WATCH_INTERVAL_SECONDS"] = "0"
+    if not args.no_cloud_stub:
+        os.environ["AI_CLOUD_PROVIDER"] = "openai"
+        os.environ["OPENAI_API_KEY"] = STUB_OPENAI_KEY
+
+    rss_start = rss_mb()
+    import app as app_module
+    from fastapi.testclient import TestClient
+
+    rss_loaded = rss_mb()
+
+    texts = load_texts(args.data, args.limit)
+    if not texts:
+        print(f"No records in {args.data}", file=sys.stderr)
+        sys.exit(1)
+    gold: Dict[str, dict] = {}
+    if not args.no_cloud_stub:
+        install_cloud_stub(app_module, gold, args.cloud_latency_ms)
+
+    report: dict = {
+        "data": args.data,
+        "records": len(texts),
+        "model_version": app_module.model_registry.version,
+        "cloud": "stub" if not args.no_cloud_stub else (app_module.CLOUD_PROVIDER or "off"),
+    }
+    with TestClient(app_module.app) as client:
+        report["latency"] = [
+            load_test(client, endpoint, texts, max(1, args.requests), max(1, c))
+            for endpoint in args.endpoints
+            for c in args.concurrency
+        ]
+        report["overload"] = [
+            overload_test(client, texts, max(1, args.requests), max(1, c)) for c in args.overload_concurrency
+        ]
+        if args.overload_concurrency:
+            report["admission"] = client.get("/admission/stats").json()
+        report["memory_mb"] = {
+            "before_import": rss_start,
+            "after_load": rss_loaded,
+            "after_load_test": rss_mb(),
+        }
+
+        rows = load_corpus(args.data, args.limit)
+        gold.update({r["text"]: r for r in rows})
+        report["tiers"] = evaluate_tiers(app_module, rows, client)
+
+    checks = check_budgets(args, report)
+    report["budgets"] = checks
+    report["passed"] = all(c["ok"] for c in checks)
+
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        Path(args.out).write_text(out + "\n", encoding="utf-8")
+    if not report["passed"]:
+        for c in checks:
+            if not c["ok"]:
+                print(f"Budget failed: {c['budget']} = {c['actual']} (limit {c['limit']})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+KB article retrieval over a contiguous matrix of precomputed vectors.
+
+Articles are encoded once on ingest into rows of a float32 matrix (L2
+normalized), so a search is one matrix-vector product plus argpartition.
+Add/update write a row in place, delete moves the last row into the hole, and
+the matrix grows by doubling, so nothing is rebuilt on a single change.
+
+Two encoders produce the rows:
+
+  - TfidfProjectionEncoder: the classifier's TF-IDF vector, reduced to a
+    fixed width with a seeded random projection (a dense row per article over
+    the full vocabulary would be tens of KB each);
+  - EmbeddingEncoder: mean-pooled sentence embeddings from a local
+    transformers model, imported only when selected.
+
+Vectors are only comparable under one encoder; reencode() rebuilds the matrix
+from the stored article text when the encoder changes (e.g. a model swap).
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32, copy=False)
+
+
+class TfidfProjectionEncoder:
+    def __init__(self, model, version: str, preprocess: Callable[[str], str], dim: int = 256, seed: int = 13):
+        self.model = model
+        self.preprocess = preprocess
+        self.dim = dim
+        self.signature = f"tfidf:{version}:{dim}:{seed}"
+        rng = np.random.default_rng(seed)
+        self._projection = (rng.standard_normal((model.n_features, dim)) / np.sqrt(dim)).astype(np.float32)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        indptr, indices, data = self.model.transform([self.preprocess(t) for t in texts])
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        nonempty = np.flatnonzero(np.diff(indptr) > 0)
+        if len(nonempty):
+            contrib = self._projection[indices] * data[:, None].astype(np.float32)
+            out[nonempty] = np.add.reduceat(contrib, indptr[nonempty], axis=0)
+        return _normalize_rows(out)
+
+
+class EmbeddingEncoder:
+    def __init__(self, model_name: str, batch_size: int = 32, max_length: int = 256):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.dim = int(self.model.config.hidden_size)
+        self.signature = f"embedding:{model_name}"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        torch = self._torch
+        out = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="pt",
+            )
+            with torch.no_grad():
+                hidden = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            out.append(pooled.numpy())
+        if not out:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize_rows(np.concatenate(out).astype(np.float32))
+
+
+def article_text(article: dict) -> str:
+    parts = [article.get("title") or "", article.get("body") or "", " ".join(article.get("tags") or [])]
+    return "\n".join(p for p in parts if p)
+
+
+class KBIndex:
+    def __init__(self, encoder=None, initial_capacity: int = 1024):
+        self.encoder = encoder
+        self._lock = threading.RLock()
+        self._changes = 0  # bumped by every mutation; lets reencode() detect concurrent writes
+        self._initial_capacity = max(16, initial_capacity)
+        self._reset(encoder.dim if encoder is not None else 0)
+
+    def _reset(self, dim: int) -> None:
+        self._matrix = np.zeros((self._initial_capacity, dim), dtype=np.float32)
+        self._category_codes = np.zeros(self._initial_capacity, dtype=np.int32)
+        self._ids: List[str] = []
+        self._articles: List[dict] = []  # id, title, category, text
+        self._row: Dict[str, int] = {}
+        self._categories: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _category_code(self, category: Optional[str]) -> int:
+        key = (category or "").upper()
+        code = self._categories.get(key)
+        if code is None:
+            code = self._categories[key] = len(self._categories) + 1
+        return code
+
+    def _ensure_capacity(self, n: int) -> None:
+        cap = len(self._matrix)
+        if n <= cap:
+            return
+        while cap < n:
+            cap *= 2
+        matrix = np.zeros((cap, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        codes = np.zeros(cap, dtype=np.int32)
+        codes[:len(self._ids)] = self._category_codes[:len(self._ids)]
+        self._matrix, self._category_codes = matrix, codes
+
+    def upsert(self, articles: List[dict]) -> Tuple[int, int]:
+        """Add or replace articles ({id, title, body, category, tags}); returns (added, updated)."""
+        entries = [
+            {"id": str(a["id"]), "title": a.get("title") or "", "category": a.get("category"), "text": article_text(a)}
+            for a in articles
+        ]
+        return self._write(entries)
+
+    def _write(self, entries: List[dict], vectors: Optional[np.ndarray] = None, signature: str = "") -> Tuple[int, int]:
+        encoder = self.encoder
+        if encoder is None:
+            raise RuntimeError("KB index has no encoder (no model loaded)")
+        if vectors is None or signature != encoder.signature:
+            vectors = encoder.encode([e["text"] for e in entries])  # outside the lock
+        added = updated = 0
+        with self._lock:
+            if encoder is not self.encoder:
+                # The encoder changed while encoding; redo against the new one.
+                return self._write(entries)
+            self._changes += 1
+            self._ensure_capacity(len(self._ids) + len(entries))
+            for entry, vec in zip(entries, vectors):
+                row = self._row.get(entry["id"])
+                if row is None:
+                    row = len(self._ids)
+                    self._row[entry["id"]] = row
+                    self._ids.append(entry["id"])
+                    self._articles.append(entry)
+                    added += 1
+                else:
+                    self._articles[row] = entry
+                    updated += 1
+                self._matrix[row] = vec
+                self._category_codes[row] = self._category_code(entry["category"])
+        return added, updated
+
+    def delete(self, article_id: str) -> bool:
+        with self._lock:
+            row = self._row.pop(article_id, None)
+            if row is None:
+                return False
+            self._changes += 1
+            last = len(self._ids) - 1
+            if row != last:
+                # Keep rows contiguous: move the last article into the hole.
+                self._matrix[row] = self._matrix[last]
+                self._category_codes[row] = self._category_codes[last]
+                self._ids[row] = self._ids[last]
+                self._articles[row] = self._articles[last]
+                self._row[self._ids[row]] = row
+            self._ids.pop()
+            self._articles.pop()
+            self._matrix[last] = 0.0
+            return True
+
+    def search(
+        self, text: str, k: int = 5, category: Optional[str] = None, min_score: float = 0.0
+    ) -> List[dict]:
+        if self.encoder is None:
+            return []
+        query = self.encoder.encode([text])[0]
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or query.shape[0] != self._matrix.shape[1]:
+                return []
+            scores = self._matrix[:n] @ query
+            if category:
+                code = self._categories.get(category.upper())
+                if code is None:
+                    return []
+                scores = np.where(self._category_codes[:n] == code, scores, -np.inf)
+            k = max(1, min(k, n))
+            top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            out = []
+            for i in top.tolist():
+                score = float(scores[i])
+                if not np.isfinite(score) or score < min_score:
+                    break
+                a = self._articles[i]
+                out.append({"id": a["id"], "title": a["title"], "category": a["category"], "score": round(score, 4)})
+            return out
+
+    def reencode(self, encoder) -> int:
+        """Swap in a new encoder and rebuild every row from the stored article text."""
+        while True:
+            with self._lock:
+                articles = [dict(a) for a in self._articles]
+                changes = self._changes
+            vectors = encoder.encode([a["text"] for a in articles]) if articles else None
+            with self._lock:
+                if changes != self._changes:
+                    continue  # written to while encoding; start over from the new state
+                self.encoder = encoder
+                self._reset(encoder.dim)
+                self._ensure_capacity(len(articles))
+                for row, a in enumerate(articles):
+                    self._matrix[row] = vectors[row]
+                    self._row[a["id"]] = row
+                    self._ids.append(a["id"])
+                    self._articles.append(a)
+                    self._category_codes[row] = self._category_code(a["category"])
+                self._changes += 1
+                return len(articles)
+
+    def snapshot(self, path: str) -> int:
+        with self._lock:
+            n = len(self._ids)
+            arrays = {
+                "signature": np.array(self.encoder.signature if self.encoder is not None else ""),
+                "vectors": self._matrix[:n].copy(),
+                "ids": np.array(self._ids, dtype=str),
+                "titles": np.array([a["title"] for a in self._articles], dtype=str),
+                "categories": np.array([a["category"] or "" for a in self._articles], dtype=str),
+                "texts": np.array([a["text"] for a in self._articles], dtype=str),
+            }
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, target)
+        return n
+
+    def restore(self, path: str) -> int:
+        """Load a snapshot; vectors are reused when the encoder matches, re-encoded otherwise."""
+        if not path or not Path(path).exists() or self.encoder is None:
+            return 0
+        with np.load(path, allow_pickle=False) as snap:
+            entries = [
+                {"id": i, "title": t, "category": c or None, "text": x}
+                for i, t, c, x in zip(
+                    snap["ids"].tolist(), snap["titles"].tolist(), snap["categories"].tolist(), snap["texts"].tolist()
+                )
+            ]
+            if entries:
+                self._write(entries, snap["vectors"], str(snap["signature"]))
+        return len(entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "articles": len(self._ids),
+                "capacity": len(self._matrix),
+                "dim": int(self._matrix.shape[1]),
+                "matrix_bytes": int(self._matrix.nbytes),
+                "encoder": self.encoder.signature if self.encoder is not None else None,
+            }
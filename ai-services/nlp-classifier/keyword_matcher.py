@@ -0,0 +1,77 @@
+"""
+Single-pass multi-keyword matcher used by the rule-based helpers in app.py.
+
+All phrases are compiled into one alternation regex with word boundaries and
+the text is scanned once; every rule then reads from the resulting hit set.
+A phrase ending in "*" is a prefix ("install*" matches "installed",
+"installation"), anything else must match a whole word or phrase ("app" no
+longer matches inside "approve").
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, List
+
+# Characters that count as part of a word for boundary checks.
+_WORD = "a-z0-9"
+
+
+def keyword_label(phrase: str) -> str:
+    """Display form of a phrase (prefix marker stripped)."""
+    return phrase[:-1] if phrase.endswith("*") else phrase
+
+
+def _phrase_pattern(phrase: str) -> str:
+    if phrase.endswith("*"):
+        return re.escape(phrase[:-1]) + f"[{_WORD}]*"
+    return re.escape(phrase)
+
+
+class KeywordMatcher:
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases: List[str] = sorted({p.strip().lower() for p in phrases if p and p.strip()})
+        # Longest alternatives first so the widest phrase wins at each start position.
+        ordered = sorted(self.phrases, key=lambda p: len(keyword_label(p)), reverse=True)
+        alternation = "|".join(_phrase_pattern(p) for p in ordered)
+        # The lookahead does not consume text, so phrases starting inside an
+        # earlier, longer match are still found.
+        self._scan = re.compile(f"(?<![{_WORD}])(?=({alternation})(?![{_WORD}]))")
+
+        self._exact: Dict[str, str] = {p: p for p in self.phrases if not p.endswith("*")}
+        self._prefixes: List[str] = sorted(
+            (p for p in self.phrases if p.endswith("*")), key=len, reverse=True
+        )
+
+        # A match also implies every shorter phrase it contains at a word boundary
+        # ("data breach" -> "breach", "hacked" -> "hack*"), since only one
+        # alternative is reported per start position.
+        single = {p: re.compile(f"(?<![{_WORD}]){_phrase_pattern(p)}(?![{_WORD}])") for p in self.phrases}
+        self._implies: Dict[str, FrozenSet[str]] = {}
+        for p in self.phrases:
+            probe = keyword_label(p)
+            self._implies[p] = frozenset(q for q, rx in single.items() if rx.search(probe))
+
+    def _canonical(self, matched: str) -> str:
+        hit = self._exact.get(matched)
+        if hit is not None:
+            return hit
+        for p in self._prefixes:
+            if matched.startswith(p[:-1]):
+                return p
+        return matched
+
+    def match(self, lower_text: str) -> FrozenSet[str]:
+        """Scan already lower-cased text once and return the set of phrases that occur."""
+        hits: set = set()
+        seen: set = set()
+        for m in self._scan.finditer(lower_text):
+            matched = m.group(1)
+            if matched in seen:
+                continue
+            seen.add(matched)
+            phrase = self._canonical(matched)
+            hits.update(self._implies.get(phrase, (phrase,)))
+        return frozenset(hits)
+
+
+def any_hit(hits: FrozenSet[str], phrases: Iterable[str]) -> bool:
+    return any(p in hits for p in phrases)
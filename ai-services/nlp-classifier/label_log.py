@@ -0,0 +1,110 @@
+"""
+Append-only log of labels produced by the slow tiers.
+
+When the local zero-shot model or the cloud provider answers a ticket, the
+text and the teacher's labels are appended as one JSONL record in the format
+train.py reads (text, domain, intent, risk), plus a "teacher" object that
+`train.py --distill` turns into soft targets. Labels are in the training
+label space (see taxonomy.teacher_labels); a head the teacher did not label
+is left out of "heads" and its label may be null. train.py only reads these
+records with --distill:
+
+    {"text": ..., "domain": ..., "intent": ..., "risk": ...,
+     "teacher": {"tier": "cloud", "confidence": 0.86, "heads": ["domain", "intent", "risk"]},
+     "model_version": ..., "ts": ...}
+
+Records are written by a background thread so the request path only enqueues;
+when the queue is full the record is dropped and counted. Each record is one
+O_APPEND write, so pre-forked workers can share the file.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class LabelLog:
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._stats: Dict[str, int] = {"written": 0, "dropped": 0, "errors": 0}
+        self._lock = threading.Lock()
+        # The writer starts on first use so a log created before a fork runs in the worker.
+        self._thread: Optional[threading.Thread] = None
+        self._started_pid: Optional[int] = None
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._lock:
+            if self._started_pid == pid:
+                return
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._thread = threading.Thread(target=self._loop, name="label-log-writer", daemon=True)
+            self._thread.start()
+            self._started_pid = pid
+
+    def append(
+        self,
+        text: str,
+        domain: Optional[str],
+        intent: Optional[str],
+        risk: Optional[str],
+        tier: str,
+        confidence: float,
+        heads: List[str],
+        model_version: Optional[str] = None,
+    ) -> bool:
+        record = {
+            "text": text,
+            "domain": domain,
+            "intent": intent,
+            "risk": risk,
+            "teacher": {"tier": tier, "confidence": round(float(confidence), 4), "heads": heads},
+            "model_version": model_version,
+            "ts": round(time.time(), 3),
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            self._stats["dropped"] += 1
+            return False
+
+    def _loop(self) -> None:
+        fd = None
+        while True:
+            line = self._queue.get()
+            if line is None:
+                break
+            try:
+                if fd is None:
+                    fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                os.write(fd, line)
+                self._stats["written"] += 1
+            except OSError as e:
+                self._stats["errors"] += 1
+                print(f"Label log write to {self.path} failed: {e}")
+        if fd is not None:
+            os.close(fd)
+
+    def close(self) -> None:
+        if self._thread is not None and self._started_pid == os.getpid():
+            try:
+                self._queue.put(None, timeout=5.0)
+            except queue.Full:
+                return
+            self._thread.join(timeout=5.0)
+            self._started_pid = None
+
+    def stats(self) -> dict:
+        out: dict = dict(self._stats)
+        out["queued"] = self._queue.qsize()
+        out["path"] = self.path
+        return out
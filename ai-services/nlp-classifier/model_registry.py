@@ -0,0 +1,199 @@
+"""
+Versioned, hot-reloadable registry for the TF-IDF classifier artifacts.
+
+The classifier, vectorizer and intent/risk classifiers are loaded together as one
+ModelBundle whose version is a hash of the artifact contents. A reload builds
+and warms the new bundle in the background and then swaps the reference in a
+single assignment; requests that already took a bundle keep using it until
+they finish.
+
+The native bundle exported by train.py (see native_model.py) is preferred: it
+is a few NumPy arrays and a manifest, so loading it needs neither joblib nor
+scikit-learn. The pickled estimators are only read, and converted, when no
+native bundle exists.
+"""
+
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from native_model import MANIFEST_NAME, NativeTextModel
+
+
+class ModelBundle:
+    __slots__ = ("version", "model", "source", "loaded_at", "paths")
+
+    def __init__(self, version: str, model: NativeTextModel, source: str, paths: Dict[str, str]):
+        self.version = version
+        self.model = model
+        self.source = source  # "native" | "pickle"
+        self.loaded_at = time.time()
+        self.paths = paths
+
+    @property
+    def has_intent(self) -> bool:
+        return "intent" in self.model.heads
+
+    @property
+    def has_risk(self) -> bool:
+        return "risk" in self.model.heads
+
+
+def artifact_version(paths: List[str]) -> str:
+    h = hashlib.sha256()
+    for p in paths:
+        path = Path(p)
+        h.update(path.name.encode("utf-8"))
+        h.update(path.read_bytes() if path.exists() else b"missing")
+    return h.hexdigest()[:16]
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        model_path: str,
+        vectorizer_path: str,
+        intent_model_path: str,
+        risk_model_path: str = "",
+        bundle_dir: str = "",
+        warmup: Optional[Callable[[ModelBundle], None]] = None,
+        mmap_mode: Optional[str] = None,
+    ):
+        self.paths = {
+            "model": model_path,
+            "vectorizer": vectorizer_path,
+            "intent_model": intent_model_path,
+            "risk_model": risk_model_path,
+        }
+        self.bundle_dir = bundle_dir
+        self.warmup = warmup
+        # "r" maps the numeric arrays (coefficients, idf, vocabulary table)
+        # read-only from the bundle files so every worker process shares one copy in the page cache.
+        self.mmap_mode = mmap_mode
+        self._current: Optional[ModelBundle] = None
+        self._reload_lock = threading.Lock()
+        self._listeners: List[Callable[[Optional[ModelBundle]], None]] = []
+        self._watch_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_signature = self._signature()
+        self.last_error: Optional[str] = None
+
+    def current(self) -> Optional[ModelBundle]:
+        """Snapshot of the active bundle; hold on to it for the whole request."""
+        return self._current
+
+    @property
+    def version(self) -> Optional[str]:
+        bundle = self._current
+        return bundle.version if bundle is not None else None
+
+    def on_swap(self, listener: Callable[[Optional[ModelBundle]], None]) -> None:
+        self._listeners.append(listener)
+
+    def _manifest_path(self) -> Optional[Path]:
+        return Path(self.bundle_dir) / MANIFEST_NAME if self.bundle_dir else None
+
+    def _signature(self) -> Tuple:
+        # Cheap change detection: (mtime, size) per artifact. The manifest is
+        # written last by train.py, so it stands in for the whole native bundle.
+        sig = []
+        manifest = self._manifest_path()
+        for p in [*self.paths.values(), *([manifest] if manifest else [])]:
+            try:
+                st = Path(p).stat()
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _load_bundle(self) -> Optional[ModelBundle]:
+        manifest = self._manifest_path()
+        if manifest is not None and manifest.exists():
+            model = NativeTextModel.load(self.bundle_dir, mmap_mode=self.mmap_mode)
+            return ModelBundle(model.version, model, "native", dict(self.paths, bundle=self.bundle_dir))
+        return self._load_pickles()
+
+    def _load_pickles(self) -> Optional[ModelBundle]:
+        model_path = Path(self.paths["model"])
+        vectorizer_path = Path(self.paths["vectorizer"])
+        if not model_path.exists() or not vectorizer_path.exists():
+            return None
+        # Only artifacts from before the native format get here; unpickling
+        # them is what pulls in scikit-learn.
+        import joblib
+
+        version = artifact_version(list(self.paths.values()))
+        heads = {"category": joblib.load(model_path)}
+        vectorizer = joblib.load(vectorizer_path)
+        intent_path = Path(self.paths["intent_model"])
+        if intent_path.exists():
+            heads["intent"] = joblib.load(intent_path)
+        risk_path = self.paths["risk_model"]
+        if risk_path and Path(risk_path).exists():
+            heads["risk"] = joblib.load(risk_path)
+        model = NativeTextModel.from_sklearn(vectorizer, heads, version)
+        return ModelBundle(version, model, "pickle", dict(self.paths))
+
+    def reload(self, force: bool = False) -> Tuple[bool, Optional[str]]:
+        """Load, warm and swap in the artifacts on disk.
+
+        Returns (swapped, error). The active bundle is left untouched when the
+        artifacts are unchanged, missing or fail to load or warm up.
+        """
+        with self._reload_lock:
+            self._last_signature = self._signature()
+            try:
+                bundle = self._load_bundle()
+                if bundle is None:
+                    raise FileNotFoundError(
+                        f"Model files not found: {self.paths['model']}, {self.paths['vectorizer']}"
+                    )
+                current = self._current
+                if not force and current is not None and current.version == bundle.version:
+                    return False, None
+                if self.warmup is not None:
+                    self.warmup(bundle)
+            except Exception as e:
+                self.last_error = str(e)
+                return False, self.last_error
+
+            self._current = bundle
+            self.last_error = None
+            for listener in self._listeners:
+                try:
+                    listener(bundle)
+                except Exception as e:
+                    print(f"Model swap listener failed: {e}")
+            return True, None
+
+    def start_watching(self, interval_seconds: float) -> None:
+        if interval_seconds <= 0 or self._watch_thread is not None:
+            return
+        self._watch_thread = threading.Thread(
+            target=self._watch, args=(interval_seconds,), name="model-registry-watch", daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+    def _watch(self, interval_seconds: float) -> None:
+        pending: Optional[Tuple] = None
+        while not self._stop.wait(interval_seconds):
+            sig = self._signature()
+            if sig == self._last_signature:
+                pending = None
+                continue
+            # Require the files to be unchanged for a full interval so a
+            # half-written set of artifacts is never picked up.
+            if sig != pending:
+                pending = sig
+                continue
+            pending = None
+            swapped, error = self.reload()
+            if swapped:
+                print(f"Model registry: swapped to version {self.version}")
+            elif error:
+                print(f"Model registry: reload failed, keeping version {self.version}: {error}")
@@ -0,0 +1,402 @@
+"""
+NumPy-only TF-IDF + linear model inference.
+
+train.py exports a compact bundle directory next to the joblib artifacts:
+
+    manifest.json        analyzer settings, head classes, version
+    vocab_keys.npy       open-addressing hash table: 64-bit term hashes (0 = empty)
+    vocab_values.npy     feature index for each table slot
+    idf.npy              idf vector
+    coef_t.npy           (n_features, n_columns) coefficients of every head side by side,
+                         feature-major; manifest "stacked_heads" gives the column order
+    <head>_intercept.npy (n_columns,) intercepts per head (one column for a binary head)
+
+The serving path reproduces TfidfVectorizer(analyzer="word").transform and
+LogisticRegression.predict_proba on those arrays, so neither scikit-learn nor
+joblib is imported at startup. All arrays can be memory-mapped read-only and
+shared between worker processes. Every head is scored by one gather of the
+stacked matrix per request (score_heads): a document's features select
+contiguous rows, one per feature, holding all heads' columns. Format 1 bundles
+(one <head>_coef.npy per head) still load; their matrix is stacked in memory.
+
+A head may carry a "temperature" in the manifest (fit by train.py on a
+calibration split): its scores are divided by it before the probabilities are
+computed, so the confidences the service thresholds on are calibrated.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BUNDLE_FORMAT = 2
+_SUPPORTED_FORMATS = (1, 2)
+MANIFEST_NAME = "manifest.json"
+
+
+def term_hash(term: str) -> int:
+    h = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+    return h or 1  # 0 marks an empty slot
+
+
+def build_hash_table(terms: List[str]) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Open-addressing (linear probing) table mapping term hash -> feature index.
+
+    Returns (keys, values, max_probe).
+    """
+    size = 1
+    while size < max(8, 2 * len(terms)):
+        size *= 2
+    mask = size - 1
+    keys = np.zeros(size, dtype=np.uint64)
+    values = np.full(size, -1, dtype=np.int32)
+    max_probe = 1
+    for index, term in enumerate(terms):
+        h = term_hash(term)
+        slot = h & mask
+        probe = 1
+        while keys[slot] != 0:
+            if int(keys[slot]) == h:
+                raise ValueError(f"64-bit hash collision for term {term!r}")
+            slot = (slot + 1) & mask
+            probe += 1
+        keys[slot] = h
+        values[slot] = index
+        max_probe = max(max_probe, probe)
+    return keys, values, max_probe
+
+
+def _proba_kind(estimator) -> str:
+    n_classes = len(estimator.classes_)
+    if n_classes == 2:
+        return "binary"
+    if type(estimator).__name__ == "LogisticRegression":
+        multi_class = getattr(estimator, "multi_class", "auto")
+        if multi_class == "ovr" or (multi_class == "auto" and estimator.solver == "liblinear"):
+            return "ovr"
+        return "multinomial"
+    return "ovr"
+
+
+def _analyzer_config(vectorizer) -> dict:
+    if vectorizer.analyzer != "word" or vectorizer.preprocessor is not None or vectorizer.tokenizer is not None:
+        raise ValueError("Only word analyzers with the default preprocessor/tokenizer can be exported")
+    if vectorizer.stop_words is not None or vectorizer.strip_accents is not None:
+        raise ValueError("stop_words/strip_accents are not supported by the native bundle")
+    return {
+        "lowercase": bool(vectorizer.lowercase),
+        "token_pattern": vectorizer.token_pattern,
+        "ngram_range": list(vectorizer.ngram_range),
+        "norm": vectorizer.norm,
+        "use_idf": bool(vectorizer.use_idf),
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+    }
+
+
+def proba_from_scores(kind: str, scores: np.ndarray) -> np.ndarray:
+    """predict_proba of a linear head from its (n_docs, n_columns) decision scores."""
+    if kind == "binary":
+        p1 = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+        return np.column_stack([1.0 - p1, p1])
+    if kind == "multinomial":
+        z = scores - scores.max(axis=1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=1, keepdims=True)
+    p = 1.0 / (1.0 + np.exp(-scores))
+    total = p.sum(axis=1, keepdims=True)
+    total[total == 0] = 1.0
+    return p / total
+
+
+def fit_temperature(kind: str, scores: np.ndarray, y: np.ndarray) -> float:
+    """Temperature minimizing the negative log-likelihood of class indices y.
+
+    Golden-section search over log(T) in [1/20, 20]; the NLL is unimodal in T.
+    """
+    rows = np.arange(len(y))
+
+    def nll(log_t: float) -> float:
+        proba = proba_from_scores(kind, scores / np.exp(log_t))
+        return float(-np.log(np.clip(proba[rows, y], 1e-12, 1.0)).mean())
+
+    lo, hi = -math.log(20.0), math.log(20.0)
+    ratio = (math.sqrt(5.0) - 1.0) / 2.0
+    a, b = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+    fa, fb = nll(a), nll(b)
+    for _ in range(60):
+        if fa < fb:
+            hi, b, fb = b, a, fa
+            a = hi - ratio * (hi - lo)
+            fa = nll(a)
+        else:
+            lo, a, fa = a, b, fb
+            b = lo + ratio * (hi - lo)
+            fb = nll(b)
+    return float(math.exp((lo + hi) / 2.0))
+
+
+def arrays_from_sklearn(
+    vectorizer, heads: Dict[str, object], temperatures: Optional[Dict[str, float]] = None
+) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Extract (manifest, arrays) from a fitted TfidfVectorizer and linear classifiers."""
+    vocab = vectorizer.vocabulary_
+    terms = [""] * len(vocab)
+    for term, index in vocab.items():
+        terms[index] = term
+    keys, values, max_probe = build_hash_table(terms)
+
+    arrays: Dict[str, np.ndarray] = {"vocab_keys": keys, "vocab_values": values}
+    if vectorizer.use_idf:
+        arrays["idf"] = np.asarray(vectorizer.idf_, dtype=np.float64)
+
+    manifest: dict = {
+        "format": BUNDLE_FORMAT,
+        "analyzer": _analyzer_config(vectorizer),
+        "n_features": len(terms),
+        "max_probe": max_probe,
+        "heads": {},
+        "stacked_heads": [],
+    }
+    coefs: List[np.ndarray] = []
+    for name, est in heads.items():
+        if est is None:
+            continue
+        coefs.append(np.asarray(est.coef_, dtype=np.float64))
+        manifest["stacked_heads"].append(name)
+        arrays[f"{name}_intercept"] = np.asarray(est.intercept_).reshape(-1)
+        manifest["heads"][name] = {
+            "classes": [str(c) for c in est.classes_],
+            "proba": _proba_kind(est),
+            "n_columns": int(coefs[-1].shape[0]),
+        }
+        if temperatures and name in temperatures:
+            manifest["heads"][name]["temperature"] = float(temperatures[name])
+    arrays["coef_t"] = np.ascontiguousarray(np.vstack(coefs).T) if coefs else np.zeros((len(terms), 0))
+    return manifest, arrays
+
+
+def export_bundle(
+    out_dir: Path, vectorizer, heads: Dict[str, object], temperatures: Optional[Dict[str, float]] = None
+) -> str:
+    """Write a native bundle; arrays first, manifest last (atomically). Returns the version."""
+    manifest, arrays = arrays_from_sklearn(vectorizer, heads, temperatures)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8"))
+    for name in sorted(arrays):
+        arr = np.ascontiguousarray(arrays[name])
+        h.update(name.encode("utf-8"))
+        h.update(arr.tobytes())
+        tmp = out_dir / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, out_dir / f"{name}.npy")
+    manifest["version"] = h.hexdigest()[:16]
+    tmp = out_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, out_dir / MANIFEST_NAME)
+    return manifest["version"]
+
+
+class Head:
+    __slots__ = ("name", "classes", "proba", "coef", "intercept", "temperature")
+
+    def __init__(
+        self,
+        name: str,
+        classes: List[str],
+        proba: str,
+        coef: np.ndarray,
+        intercept: np.ndarray,
+        temperature: float = 1.0,
+    ):
+        self.name = name
+        self.classes = classes
+        self.proba = proba
+        self.coef = coef
+        self.intercept = intercept
+        self.temperature = temperature
+
+
+class NativeTextModel:
+    """TF-IDF featurizer plus linear heads, evaluated with NumPy only."""
+
+    def __init__(self, manifest: dict, arrays: Dict[str, np.ndarray], version: Optional[str] = None):
+        analyzer = manifest["analyzer"]
+        self.version = version or manifest.get("version")
+        self.lowercase = analyzer["lowercase"]
+        self.token_re = re.compile(analyzer["token_pattern"])
+        self.min_n, self.max_n = analyzer["ngram_range"]
+        self.norm = analyzer["norm"]
+        self.sublinear_tf = analyzer["sublinear_tf"]
+        self.n_features = int(manifest["n_features"])
+        self.max_probe = int(manifest["max_probe"])
+        self.keys = arrays["vocab_keys"]
+        self.values = arrays["vocab_values"]
+        self.mask = np.uint64(len(self.keys) - 1)
+        self.idf = arrays.get("idf") if analyzer["use_idf"] else None
+        order = manifest.get("stacked_heads")
+        if "coef_t" in arrays and order is not None:
+            self.coef_t = arrays["coef_t"]
+        else:
+            # Format 1: per-head matrices, stacked here (in process memory, not shared).
+            order = list(manifest["heads"])
+            self.coef_t = np.ascontiguousarray(np.vstack([arrays[f"{name}_coef"] for name in order]).T)
+        self.heads: Dict[str, Head] = {}
+        self._columns: Dict[str, slice] = {}
+        start = 0
+        for name in order:
+            spec = manifest["heads"][name]
+            # A binary head has one column, not one per class; older manifests have no n_columns,
+            # but the intercept always has one entry per column.
+            stop = start + int(spec.get("n_columns", len(arrays[f"{name}_intercept"])))
+            self._columns[name] = slice(start, stop)
+            self.heads[name] = Head(
+                name,
+                list(spec["classes"]),
+                spec["proba"],
+                self.coef_t[:, start:stop].T,
+                arrays[f"{name}_intercept"],
+                float(spec.get("temperature", 1.0)),
+            )
+            start = stop
+        self.intercept = np.concatenate([self.heads[name].intercept for name in order]) if order else np.zeros(0)
+
+    @classmethod
+    def load(cls, bundle_dir: str, mmap_mode: Optional[str] = "r") -> "NativeTextModel":
+        root = Path(bundle_dir)
+        manifest = json.loads((root / MANIFEST_NAME).read_text(encoding="utf-8"))
+        if manifest.get("format") not in _SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported bundle format {manifest.get('format')!r} in {bundle_dir}")
+        names = ["vocab_keys", "vocab_values"]
+        if manifest["analyzer"]["use_idf"]:
+            names.append("idf")
+        if manifest["format"] >= 2:
+            names.append("coef_t")
+        for head in manifest["heads"]:
+            if manifest["format"] == 1:
+                names.append(f"{head}_coef")
+            names.append(f"{head}_intercept")
+        arrays = {name: np.load(root / f"{name}.npy", mmap_mode=mmap_mode) for name in names}
+        return cls(manifest, arrays)
+
+    @classmethod
+    def from_sklearn(cls, vectorizer, heads: Dict[str, object], version: Optional[str] = None) -> "NativeTextModel":
+        manifest, arrays = arrays_from_sklearn(vectorizer, heads)
+        return cls(manifest, arrays, version)
+
+    def _analyze(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        if self.max_n == 1:
+            return tokens
+        out = list(tokens) if self.min_n == 1 else []
+        n_tokens = len(tokens)
+        for n in range(max(self.min_n, 2), min(self.max_n + 1, n_tokens + 1)):
+            for i in range(n_tokens - n + 1):
+                out.append(" ".join(tokens[i:i + n]))
+        return out
+
+    def _lookup(self, hashes: np.ndarray) -> np.ndarray:
+        # Vectorized linear probing; returns the feature index or -1 per hash.
+        result = np.full(len(hashes), -1, dtype=np.int64)
+        slots = hashes & self.mask
+        pending = np.arange(len(hashes))
+        for _ in range(self.max_probe):
+            if len(pending) == 0:
+                break
+            k = self.keys[slots[pending]]
+            found = k == hashes[pending]
+            result[pending[found]] = self.values[slots[pending[found]]]
+            pending = pending[~found & (k != 0)]
+            slots[pending] = (slots[pending] + np.uint64(1)) & self.mask
+        return result
+
+    def transform(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """CSR (indptr, indices, data) TF-IDF rows, matching TfidfVectorizer.transform."""
+        doc_ids: List[int] = []
+        hashes: List[int] = []
+        for d, text in enumerate(texts):
+            for term in self._analyze(text):
+                doc_ids.append(d)
+                hashes.append(term_hash(term))
+
+        n_docs = len(texts)
+        if not hashes:
+            return np.zeros(n_docs + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        feats = self._lookup(np.array(hashes, dtype=np.uint64))
+        docs = np.array(doc_ids, dtype=np.int64)
+        known = feats >= 0
+        docs, feats = docs[known], feats[known]
+
+        # Term counts per (doc, feature); keys come back sorted by doc then feature.
+        keys, counts = np.unique(docs * self.n_features + feats, return_counts=True)
+        row = keys // self.n_features
+        indices = keys % self.n_features
+        data = counts.astype(np.float64)
+        if self.sublinear_tf:
+            data = np.log(data) + 1.0
+        if self.idf is not None:
+            data *= self.idf[indices]
+
+        indptr = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row, minlength=n_docs), out=indptr[1:])
+        if self.norm == "l2":
+            norms = np.sqrt(np.bincount(row, weights=data * data, minlength=n_docs))
+        elif self.norm == "l1":
+            norms = np.bincount(row, weights=np.abs(data), minlength=n_docs)
+        else:
+            norms = None
+        if norms is not None:
+            norms[norms == 0] = 1.0
+            data /= norms[row]
+        return indptr, indices, data
+
+    @staticmethod
+    def empty_rows(csr: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        """Mask of documents with no in-vocabulary term; their scores are the intercepts alone."""
+        return np.diff(csr[0]) == 0
+
+    def score_heads(self, csr: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Linear scores X @ coef.T + intercept of every head, from one pass over the stacked matrix."""
+        indptr, indices, data = csr
+        n_docs = len(indptr) - 1
+        scores = np.zeros((n_docs, self.coef_t.shape[1]))
+        nonempty = np.flatnonzero(np.diff(indptr) > 0)
+        if len(nonempty):
+            contrib = self.coef_t[indices] * data[:, None]
+            scores[nonempty] = np.add.reduceat(contrib, indptr[nonempty], axis=0)
+        scores += self.intercept
+        return {name: scores[:, cols] for name, cols in self._columns.items()}
+
+    def decision_function(self, head: str, csr: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        """(n_docs, n_columns) linear scores: X @ coef.T + intercept."""
+        return self.score_heads(csr)[head]
+
+    def predict_proba(self, head: str, scores: np.ndarray) -> np.ndarray:
+        h = self.heads[head]
+        if h.temperature != 1.0:
+            scores = scores / h.temperature
+        return proba_from_scores(h.proba, scores)
+
+    def predict(self, head: str, csr) -> Tuple[List[str], np.ndarray]:
+        """Labels and their probabilities; the linear scores are computed once."""
+        proba = self.predict_proba(head, self.decision_function(head, csr))
+        best = proba.argmax(axis=1)
+        classes = self.heads[head].classes
+        return [classes[i] for i in best], proba[np.arange(len(best)), best]
+
+    def top_k(self, head: str, proba: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        """The k most probable (label, probability) pairs per row, best first."""
+        classes = self.heads[head].classes
+        k = max(1, min(k, proba.shape[1]))
+        # Stable sort on the negated row: ties keep class order, as argmax does.
+        order = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+        picked = np.take_along_axis(proba, order, axis=1)
+        return [[(classes[i], float(p)) for i, p in zip(row, probs)] for row, probs in zip(order, picked)]
@@ -0,0 +1,132 @@
+"""
+Pre-fork multi-process serving for the classifier.
+
+The parent imports the app (loading every model once), binds the listening
+socket and forks the workers. Workers inherit the loaded models as
+copy-on-write pages; numeric arrays are additionally memory-mapped from the
+artifact files (see AI_MODEL_MMAP_MODE), so adding a worker costs little more
+than its own Python heap. Dead workers are restarted until the parent is
+asked to stop; a worker that keeps dying soon after it starts (bad bundle,
+port error) is restarted with an exponentially growing delay, and after
+max_failures such deaths in a row the server gives up.
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Dict, Optional
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class RestartPolicy:
+    """Restart delay per worker slot.
+
+    A worker that exits within min_uptime seconds of starting counts as a
+    failure; each failure in a row doubles the delay (base_delay up to
+    max_delay), and a worker that ran longer resets its slot.
+    """
+
+    def __init__(self, min_uptime: float = 10.0, base_delay: float = 0.5, max_delay: float = 30.0, max_failures: int = 5):
+        self.min_uptime = min_uptime
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_failures = max(1, max_failures)
+        self._started: Dict[int, float] = {}
+        self._failures: Dict[int, int] = {}
+
+    def started(self, slot: int, now: float) -> None:
+        self._started[slot] = now
+
+    def exited(self, slot: int, now: float) -> Optional[float]:
+        """Seconds to wait before restarting the slot; None to give up."""
+        if now - self._started.get(slot, now) >= self.min_uptime:
+            self._failures[slot] = 0
+            return 0.0
+        failures = self._failures.get(slot, 0) + 1
+        self._failures[slot] = failures
+        if failures >= self.max_failures:
+            return None
+        return min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+
+
+def serve(app, host: str, port: int, workers: int, log_level: str = "info", policy: Optional[RestartPolicy] = None) -> None:
+    import uvicorn
+
+    sock = _bind(host, port)
+    # Move everything allocated so far (models, vocabularies) out of the GC's
+    # reach so collections in the workers don't touch, and copy, those pages.
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    stopping = False
+    failed = False
+    policy = policy or RestartPolicy()
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Lets per-process state (e.g. the similarity snapshot) use a file per worker slot.
+            os.environ["AI_WORKER_ID"] = str(slot)
+            config = uvicorn.Config(app, log_level=log_level)
+            uvicorn.Server(config).run(sockets=[sock])
+            os._exit(0)
+        children[pid] = slot
+        policy.started(slot, time.monotonic())
+        print(f"Started worker {slot} (pid {pid})")
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+    print(f"Serving on {host}:{port} with {workers} workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        delay = policy.exited(slot, time.monotonic())
+        if delay is None:
+            print(f"Worker {slot} (pid {pid}) exited with status {status}; it keeps failing on start, shutting down")
+            failed = True
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"Worker {slot} (pid {pid}) exited with status {status}; restarting in {delay:.1f}s")
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(min(0.1, deadline - time.monotonic()))
+        if not stopping:
+            spawn(slot)
+
+    sock.close()
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,219 @@
+"""
+Opt-in sampling profiler for slow requests.
+
+While a request is being profiled, a background thread samples the Python
+stacks of the threads working on it every few milliseconds: the event loop
+thread it was received on, plus any inference thread it is running on (see
+call_tracked). Samples are folded into collapsed-stack lines
+
+    event-loop;_instrument (app.py:690);enrich (app.py:1362);... 17
+
+which flamegraph.pl, speedscope and inferno read directly. Requests that end
+up slower than the threshold (or asked to be profiled) are kept in a bounded
+ring buffer with their stage timings and input size, and optionally written
+to a directory as <id>.collapsed plus <id>.json.
+
+The event loop thread is shared, so its samples can include other requests
+that were in flight at the same time; inference thread samples cannot.
+"""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MAX_DEPTH = 128
+
+_current: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+
+def current() -> Optional["ProfileSession"]:
+    return _current.get()
+
+
+def call_tracked(fn, *args):
+    """fn(*args), with this thread sampled for the current request's profile, if any."""
+    session = _current.get()
+    if session is None:
+        return fn(*args)
+    ident = threading.get_ident()
+    session.add_thread(ident, "inference")
+    try:
+        return fn(*args)
+    finally:
+        session.remove_thread(ident)
+
+
+class ProfileSession:
+    def __init__(self, forced: bool):
+        self.id = uuid.uuid4().hex[:16]
+        self.forced = forced
+        self.started = time.time()
+        self.samples: Counter = Counter()
+        self.threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def add_thread(self, ident: int, role: str) -> None:
+        with self._lock:
+            self.threads[ident] = role
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self.threads.pop(ident, None)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = sorted(self.samples.items())
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+
+class RequestProfiler:
+    def __init__(self, interval_ms: float = 5.0, slow_ms: float = 500.0, keep: int = 50, out_dir: str = ""):
+        self.interval = max(0.001, interval_ms / 1000.0)
+        self.slow_ms = slow_ms
+        self.keep = max(1, keep)
+        self.out_dir = Path(out_dir) if out_dir else None
+        self._sessions: Dict[str, ProfileSession] = {}
+        self._profiles: "OrderedDict[str, dict]" = OrderedDict()
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stats: Dict[str, int] = {"profiled": 0, "kept": 0, "evicted": 0, "samples": 0}
+        # The sampler starts on first use so a profiler created before a fork runs in the worker.
+        self._started_pid: Optional[int] = None
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._lock:
+            if self._started_pid == pid:
+                return
+            self._sessions = {}
+            self._wake = threading.Event()
+            threading.Thread(target=self._loop, name="request-profiler", daemon=True).start()
+            self._started_pid = pid
+
+    def start(self, forced: bool = False) -> tuple:
+        """Starts sampling the calling thread; returns (session, contextvar token) for finish()."""
+        self._ensure_started()
+        session = ProfileSession(forced)
+        session.add_thread(threading.get_ident(), "event-loop")
+        with self._lock:
+            self._sessions[session.id] = session
+            self._stats["profiled"] += 1
+        self._wake.set()
+        return session, _current.set(session)
+
+    def finish(
+        self,
+        handle: tuple,
+        endpoint: str,
+        status: int,
+        elapsed_seconds: float,
+        timings: Dict[str, float],
+        input_bytes: Optional[int],
+    ) -> Optional[str]:
+        """Stops sampling; returns the profile id when the request was kept."""
+        session, token = handle
+        _current.reset(token)
+        with self._lock:
+            self._sessions.pop(session.id, None)
+        duration_ms = elapsed_seconds * 1000.0
+        if not session.forced and duration_ms < self.slow_ms:
+            return None
+        meta = {
+            "id": session.id,
+            "endpoint": endpoint,
+            "status": status,
+            "started": round(session.started, 3),
+            "duration_ms": round(duration_ms, 2),
+            "input_bytes": input_bytes,
+            "stages_ms": {name: round(seconds * 1000.0, 2) for name, seconds in timings.items()},
+            "samples": sum(session.samples.values()),
+            "interval_ms": round(self.interval * 1000.0, 2),
+            "forced": session.forced,
+        }
+        collapsed = session.collapsed()
+        evicted: List[str] = []
+        with self._lock:
+            self._profiles[session.id] = {"meta": meta, "collapsed": collapsed}
+            self._stats["kept"] += 1
+            while len(self._profiles) > self.keep:
+                evicted.append(self._profiles.popitem(last=False)[0])
+                self._stats["evicted"] += 1
+        if self.out_dir is not None:
+            self._write_files(session.id, meta, collapsed, evicted)
+        return session.id
+
+    def _write_files(self, profile_id: str, meta: dict, collapsed: str, evicted: List[str]) -> None:
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            (self.out_dir / f"{profile_id}.collapsed").write_text(collapsed, encoding="utf-8")
+            (self.out_dir / f"{profile_id}.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            for old in evicted:
+                for suffix in (".collapsed", ".json"):
+                    (self.out_dir / f"{old}{suffix}").unlink(missing_ok=True)
+        except OSError as e:
+            print(f"Failed to write profile {profile_id} to {self.out_dir}: {e}")
+
+    def _frame_label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label.replace(";", ":")
+        return label
+
+    def _collapse(self, role: str, frame) -> str:
+        stack: List[str] = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            stack.append(self._frame_label(frame.f_code))
+            frame = frame.f_back
+        stack.append(role)
+        return ";".join(reversed(stack))
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.wait()
+            with self._lock:
+                sessions = list(self._sessions.values())
+                if not sessions:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for session in sessions:
+                with session._lock:
+                    threads = list(session.threads.items())
+                for ident, role in threads:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stack = self._collapse(role, frame)
+                        with session._lock:
+                            session.samples[stack] += 1
+                        self._stats["samples"] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [p["meta"] for p in reversed(self._profiles.values())]
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def stats(self) -> dict:
+        out: dict = dict(self._stats)
+        with self._lock:
+            out["stored"] = len(self._profiles)
+            out["active"] = len(self._sessions)
+        out["slow_ms"] = self.slow_ms
+        return out
@@ -0,0 +1,178 @@
+"""
+Content-addressed cache for /enrich results.
+
+Entries are keyed on the normalized ticket text plus a model fingerprint, so a
+new model (or a different escalation setup) never serves stale answers. The
+in-process tier is an LRU bounded by size and TTL; an optional SQLite tier
+keeps warm entries across restarts. The SQLite table is bounded too: every
+db_purge_every writes, expired rows are deleted and the oldest rows beyond
+db_max_entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def make_key(fingerprint: str, normalized_text: str) -> str:
+    h = hashlib.sha256()
+    h.update(fingerprint.encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalized_text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400.0,
+        db_path: str = "",
+        db_max_entries: int = 100000,
+        db_purge_every: int = 1000,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.fingerprint = ""
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "disk_evictions": 0,
+        }
+        self.db_path = db_path
+        self.db_max_entries = max(1, db_max_entries)
+        self.db_purge_every = max(1, db_purge_every)
+        self._db_writes = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # One connection per process: a SQLite handle must not cross a fork.
+        if not self.db_path:
+            return None
+        pid = os.getpid()
+        if self._conn is None or self._conn_pid != pid:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS enrich_cache ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, created_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS enrich_cache_created_at ON enrich_cache (created_at)")
+            self._conn = conn
+            self._conn_pid = pid
+        return self._conn
+
+    def set_fingerprint(self, fingerprint: str) -> None:
+        # A new fingerprint means new model artifacts: drop everything computed by the old ones.
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+            self.fingerprint = fingerprint
+            if self._entries:
+                self._stats["invalidations"] += len(self._entries)
+                self._entries.clear()
+            if self._db is not None:
+                cur = self._db.execute("DELETE FROM enrich_cache WHERE fingerprint != ?", (fingerprint,))
+                self._stats["invalidations"] += max(0, cur.rowcount)
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created_at, value FROM enrich_cache WHERE key = ? AND fingerprint = ?",
+                    (key, self.fingerprint),
+                ).fetchone()
+                if row is not None:
+                    created_at, raw = row
+                    if now - created_at <= self.ttl_seconds:
+                        value = json.loads(raw)
+                        self._insert(key, created_at, value)
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM enrich_cache WHERE key = ?", (key,))
+                    self._stats["expirations"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: dict, fingerprint: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            if fingerprint is not None and fingerprint != self.fingerprint:
+                # Computed by a model that has since been swapped out.
+                return
+            self._insert(key, now, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO enrich_cache (key, fingerprint, created_at, value) VALUES (?, ?, ?, ?)",
+                    (key, self.fingerprint, now, json.dumps(value)),
+                )
+                self._db_writes += 1
+                if self._db_writes % self.db_purge_every == 0:
+                    self._purge_db(now)
+
+    def _insert(self, key: str, created_at: float, value: dict) -> None:
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def purge_expired(self) -> None:
+        now = time.time()
+        cutoff = now - self.ttl_seconds
+        with self._lock:
+            for key in [k for k, (created_at, _) in self._entries.items() if created_at < cutoff]:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            if self._db is not None:
+                self._purge_db(now)
+
+    def _purge_db(self, now: float) -> None:
+        # Called with the lock held. Rows are only dropped here and on an expired
+        # read, so between purges the table can exceed db_max_entries by db_purge_every.
+        cur = self._db.execute("DELETE FROM enrich_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._stats["expirations"] += max(0, cur.rowcount)
+        cur = self._db.execute(
+            "DELETE FROM enrich_cache WHERE key IN "
+            "(SELECT key FROM enrich_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.db_max_entries,),
+        )
+        self._stats["disk_evictions"] += max(0, cur.rowcount)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out: dict = dict(self._stats)
+            out["size"] = len(self._entries)
+            out["max_entries"] = self.max_entries
+            lookups = out["hits"] + out["disk_hits"] + out["misses"]
+            out["hit_rate"] = round((out["hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+            out["disk_enabled"] = bool(self.db_path)
+            out["disk_max_entries"] = self.db_max_entries
+            out["fingerprint"] = self.fingerprint
+            return out
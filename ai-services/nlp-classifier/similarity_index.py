@@ -0,0 +1,262 @@
+"""
+Incremental similar-ticket index over the TF-IDF vectors the classifier
+already computes.
+
+Vectors are L2-normalized, so cosine similarity is a sparse dot product.
+Each feature keeps a posting list (doc ids and weights in growable NumPy
+arrays); a query walks only the postings of its own terms. Documents live in a
+fixed ring of max_entries slots, which caps memory: a new document overwrites
+the oldest slot, and postings that point at overwritten or expired documents
+are skipped at query time and compacted away once they outnumber live ones.
+
+Vectors are only comparable within one model version, so the index is bound
+to the version it was built with (see reset()). Each worker process keeps its
+own index; under pre-fork serving each worker snapshots to its own file
+(worker_snapshot_path()) and restore() merges them all, so a restart starts
+every worker from the union of what the workers had indexed.
+"""
+
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+def worker_snapshot_path(path: str, worker: Optional[str]) -> str:
+    """Snapshot file of one pre-fork worker; the shared path itself when not a worker."""
+    return f"{path}.worker{worker}" if worker else path
+
+
+def snapshot_paths(path: str) -> List[str]:
+    """The shared snapshot and every per-worker snapshot next to it; none without a path."""
+    if not path:
+        return []
+    base = Path(path)
+    if not base.parent.exists():
+        return [path]
+    pattern = re.compile(re.escape(base.name) + r"\.worker\d+")
+    workers = sorted(str(p) for p in base.parent.iterdir() if pattern.fullmatch(p.name))
+    return [path] + workers
+
+
+class _Postings:
+    __slots__ = ("docs", "weights", "size")
+
+    def __init__(self):
+        self.docs = np.empty(8, dtype=np.int64)
+        self.weights = np.empty(8, dtype=np.float32)
+        self.size = 0
+
+    def append(self, doc: int, weight: float) -> None:
+        if self.size == len(self.docs):
+            self.docs = np.resize(self.docs, self.size * 2)
+            self.weights = np.resize(self.weights, self.size * 2)
+        self.docs[self.size] = doc
+        self.weights[self.size] = weight
+        self.size += 1
+
+
+class SimilarityIndex:
+    def __init__(self, max_entries: int = 50000, window_seconds: float = 86400.0):
+        self.max_entries = max(1, max_entries)
+        self.window_seconds = window_seconds
+        self.version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self) -> None:
+        cap = self.max_entries
+        self._slot_doc = np.full(cap, -1, dtype=np.int64)  # doc id held by each slot
+        self._slot_time = np.zeros(cap, dtype=np.float64)
+        self._slot_ticket: List[Optional[str]] = [None] * cap
+        self._slot_vector: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * cap
+        self._ticket_doc: Dict[str, int] = {}
+        self._postings: Dict[int, _Postings] = {}
+        self._next_doc = 0
+        self._total_postings = 0
+        self._live_postings = 0
+
+    def reset(self, version: Optional[str]) -> None:
+        """Drop everything; vectors from another model version are not comparable."""
+        with self._lock:
+            self.version = version
+            self._clear()
+
+    def __len__(self) -> int:
+        return len(self._ticket_doc)
+
+    def _live(self, docs: np.ndarray, now: float) -> np.ndarray:
+        slots = docs % self.max_entries
+        ok = self._slot_doc[slots] == docs
+        if self.window_seconds > 0:
+            ok &= self._slot_time[slots] >= now - self.window_seconds
+        return ok
+
+    def _evict_slot(self, slot: int) -> None:
+        ticket = self._slot_ticket[slot]
+        if ticket is not None and self._ticket_doc.get(ticket) == self._slot_doc[slot]:
+            del self._ticket_doc[ticket]
+        vec = self._slot_vector[slot]
+        if vec is not None:
+            self._live_postings -= len(vec[0])
+        self._slot_doc[slot] = -1
+        self._slot_ticket[slot] = None
+        self._slot_vector[slot] = None
+
+    def add(self, ticket_id: str, indices: np.ndarray, data: np.ndarray, now: Optional[float] = None) -> None:
+        """Index a ticket's normalized TF-IDF row; re-adding a ticket replaces it."""
+        now = time.time() if now is None else now
+        with self._lock:
+            old = self._ticket_doc.get(ticket_id)
+            if old is not None:
+                self._evict_slot(old % self.max_entries)
+            doc = self._next_doc
+            self._next_doc += 1
+            slot = doc % self.max_entries
+            self._evict_slot(slot)
+            self._slot_doc[slot] = doc
+            self._slot_time[slot] = now
+            self._slot_ticket[slot] = ticket_id
+            self._slot_vector[slot] = (np.asarray(indices, dtype=np.int64), np.asarray(data, dtype=np.float32))
+            self._ticket_doc[ticket_id] = doc
+            for f, w in zip(indices.tolist(), data.tolist()):
+                p = self._postings.get(f)
+                if p is None:
+                    p = self._postings[f] = _Postings()
+                p.append(doc, w)
+            self._total_postings += len(indices)
+            self._live_postings += len(indices)
+            if self._total_postings > 2 * max(self._live_postings, 1024):
+                self._compact(now)
+
+    def _compact(self, now: float) -> None:
+        if self.window_seconds > 0:
+            cutoff = now - self.window_seconds
+            for slot in np.flatnonzero((self._slot_doc >= 0) & (self._slot_time < cutoff)).tolist():
+                self._evict_slot(slot)
+        for f in list(self._postings):
+            p = self._postings[f]
+            keep = self._live(p.docs[:p.size], now)
+            n = int(keep.sum())
+            if n == 0:
+                del self._postings[f]
+                continue
+            p.docs[:n] = p.docs[:p.size][keep]
+            p.weights[:n] = p.weights[:p.size][keep]
+            p.size = n
+        self._total_postings = sum(p.size for p in self._postings.values())
+        self._live_postings = self._total_postings
+
+    def query(
+        self,
+        indices: np.ndarray,
+        data: np.ndarray,
+        k: int = 5,
+        min_score: float = 0.0,
+        exclude: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> List[Tuple[str, float, float]]:
+        """Top-k (ticket_id, cosine, age_seconds) with score >= min_score, best first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            docs_parts, score_parts = [], []
+            for f, w in zip(indices.tolist(), data.tolist()):
+                p = self._postings.get(f)
+                if p is not None and p.size:
+                    docs_parts.append(p.docs[:p.size])
+                    score_parts.append(p.weights[:p.size] * w)
+            if not docs_parts:
+                return []
+            docs = np.concatenate(docs_parts)
+            contrib = np.concatenate(score_parts)
+            live = self._live(docs, now)
+            docs, contrib = docs[live], contrib[live]
+            if len(docs) == 0:
+                return []
+            uniq, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=contrib)
+
+            exclude_doc = self._ticket_doc.get(exclude) if exclude is not None else None
+            if exclude_doc is not None:
+                scores[uniq == exclude_doc] = -1.0
+            n = min(k + 1, len(scores))
+            top = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            out = []
+            for i in top:
+                score = float(scores[i])
+                if score < min_score or score < 0:
+                    break
+                slot = int(uniq[i] % self.max_entries)
+                out.append((self._slot_ticket[slot], min(score, 1.0), now - float(self._slot_time[slot])))
+                if len(out) >= k:
+                    break
+            return out
+
+    def snapshot(self, path: str) -> int:
+        """Write live entries to path (.npz, atomically); returns the count."""
+        now = time.time()
+        with self._lock:
+            slots = [s for s in range(self.max_entries) if self._slot_vector[s] is not None]
+            slots = [s for s in slots if self._live(self._slot_doc[s:s + 1], now)[0]]
+            slots.sort(key=lambda s: self._slot_doc[s])
+            vectors = [self._slot_vector[s] for s in slots]
+            indptr = np.zeros(len(slots) + 1, dtype=np.int64)
+            np.cumsum([len(v[0]) for v in vectors], out=indptr[1:])
+            arrays = {
+                "version": np.array(self.version or ""),
+                "tickets": np.array([self._slot_ticket[s] for s in slots], dtype=str),
+                "times": self._slot_time[slots],
+                "indptr": indptr,
+                "indices": np.concatenate([v[0] for v in vectors]) if vectors else np.zeros(0, dtype=np.int64),
+                "data": np.concatenate([v[1] for v in vectors]) if vectors else np.zeros(0, dtype=np.float32),
+            }
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, target)
+        return len(slots)
+
+    def restore(self, paths: Union[str, Sequence[str]], version: Optional[str]) -> int:
+        """Load snapshots taken with the same model version; returns the count restored.
+
+        Several snapshots (one per worker) are merged oldest first, so the newest
+        copy of a ticket wins and a full ring keeps the newest tickets.
+        """
+        rows: List[Tuple[float, str, np.ndarray, np.ndarray]] = []
+        matched = False
+        for path in [paths] if isinstance(paths, str) else paths:
+            if not path or not Path(path).exists():
+                continue
+            with np.load(path, allow_pickle=False) as snap:
+                if str(snap["version"]) != (version or ""):
+                    continue
+                matched = True
+                tickets, times = snap["tickets"], snap["times"]
+                indptr, indices, data = snap["indptr"], snap["indices"], snap["data"]
+                for i, ticket in enumerate(tickets.tolist()):
+                    rows.append((float(times[i]), ticket, indices[indptr[i]:indptr[i + 1]], data[indptr[i]:indptr[i + 1]]))
+        if not matched:
+            return 0
+        rows.sort(key=lambda r: r[0])
+        self.reset(version)
+        for at, ticket, indices, data in rows:
+            self.add(ticket, indices, data, at)
+        return len(self)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._ticket_doc),
+                "max_entries": self.max_entries,
+                "window_seconds": self.window_seconds,
+                "postings": self._total_postings,
+                "live_postings": self._live_postings,
+                "model_version": self.version,
+            }
@@ -0,0 +1,96 @@
+"""
+Label sets the classifier heads are trained on, shared by app.py and train.py,
+and the label sets the local zero-shot model scores, shared by app.py and
+zero_shot_export.py.
+
+The slow tiers do not always answer in these labels: the local zero-shot
+model scores PASSWORD_RESET and ACCOUNT_UNLOCK (easier to tell apart in plain
+language than ACCOUNT_ACCESS), and a cloud model may answer anything.
+teacher_labels() maps such an answer onto the training labels before it is
+logged for `train.py --distill`, and drops the heads it cannot map.
+"""
+
+from typing import List, Optional, Tuple
+
+DOMAINS = (
+    "IDENTITY_ACCESS",
+    "NETWORK_VPN_WIFI",
+    "EMAIL_COLLAB",
+    "ENDPOINT_DEVICE",
+    "BUSINESS_APP_ERP_CRM",
+    "SOFTWARE_INSTALL_LICENSE",
+    "HARDWARE_PERIPHERAL",
+    "SECURITY_INCIDENT",
+    "KB_GENERAL",
+    "OTHER",
+)
+
+INTENTS = (
+    "INCIDENT",
+    "SERVICE_REQUEST",
+    "HOW_TO",
+    "SECURITY_REPORT",
+    "ACCOUNT_ACCESS",
+    "UNKNOWN",
+)
+
+RISKS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+# Candidate labels of the local zero-shot tier, in the order they are served.
+ZERO_SHOT_LABEL_SETS = {
+    "category": [
+        "IDENTITY_ACCESS",
+        "NETWORK_VPN_WIFI",
+        "EMAIL_COLLAB",
+        "ENDPOINT_DEVICE",
+        "HARDWARE_PERIPHERAL",
+        "SOFTWARE_INSTALL_LICENSE",
+        "BUSINESS_APP_ERP_CRM",
+        "SECURITY_INCIDENT",
+        "KB_GENERAL",
+        "OTHER",
+    ],
+    "intent": [
+        "INCIDENT",
+        "SERVICE_REQUEST",
+        "HOW_TO",
+        "SECURITY_REPORT",
+        "PASSWORD_RESET",
+        "ACCOUNT_UNLOCK",
+        "UNKNOWN",
+    ],
+}
+
+# Finer-grained answers that have a training label.
+INTENT_ALIASES = {
+    "PASSWORD_RESET": "ACCOUNT_ACCESS",
+    "ACCOUNT_UNLOCK": "ACCOUNT_ACCESS",
+}
+
+
+def canonical_label(label) -> Optional[str]:
+    """"network vpn-wifi " -> "NETWORK_VPN_WIFI"; None for anything that is not a non-empty string."""
+    if not isinstance(label, str) or not label.strip():
+        return None
+    return "_".join(label.replace("-", " ").split()).upper()
+
+
+def teacher_labels(
+    domain, intent, risk, heads: List[str]
+) -> Tuple[Optional[str], Optional[str], Optional[str], List[str]]:
+    """(domain, intent, risk, heads) in the training label space.
+
+    A head is kept only when its label maps onto a training label; the labels of
+    dropped heads are returned as None.
+    """
+    domain = canonical_label(domain)
+    intent = canonical_label(intent)
+    intent = INTENT_ALIASES.get(intent, intent)
+    risk = canonical_label(risk)
+    mapped = {
+        "domain": domain if domain in DOMAINS else None,
+        "intent": intent if intent in INTENTS else None,
+        "risk": risk if risk in RISKS else None,
+    }
+    kept = [h for h in heads if mapped.get(h) is not None]
+    return mapped["domain"], mapped["intent"], mapped["risk"], kept
@@ -0,0 +1,90 @@
+"""
+Unit tests for the classifier service modules. Run from ai-services/nlp-classifier:
+
+    python -m pytest -q tests
+
+App-level tests train a small model on data/train.jsonl into a temporary
+directory and import app.py against it, with every optional tier off.
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+TRAIN_DATA = SERVICE_DIR / "data" / "train.jsonl"
+
+
+@pytest.fixture(scope="session")
+def training_records():
+    with open(TRAIN_DATA, "r", encoding="utf-8-sig") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory):
+    """Artifacts trained on data/train.jsonl, laid out as train.py writes them."""
+    import train
+
+    out_dir = tmp_path_factory.mktemp("model")
+    trained = train.train_in_memory([str(TRAIN_DATA)], 1, (None, {}))
+    assert trained is not None
+    vectorizer, heads = trained
+    for name, clf in heads.items():
+        train.dump_atomic(clf, out_dir / train.HEADS[name][1])
+    train.dump_atomic(vectorizer, out_dir / "vectorizer.pkl")
+    train.export_bundle(out_dir / "bundle", vectorizer, {train.HEADS[name][2]: clf for name, clf in heads.items()})
+    return out_dir
+
+
+def load_app(model_dir, module_name="app", **overrides):
+    """Import app.py as module_name against model_dir, with no optional tiers or persistence.
+
+    A module_name other than "app" gives a fresh copy of the service, for settings
+    that are only read at import time.
+    """
+    env = {
+        "MODEL_PATH": str(model_dir / "classifier.pkl"),
+        "VECTORIZER_PATH": str(model_dir / "vectorizer.pkl"),
+        "INTENT_MODEL_PATH": str(model_dir / "intent_classifier.pkl"),
+        "RISK_MODEL_PATH": str(model_dir / "risk_classifier.pkl"),
+        "MODEL_BUNDLE_DIR": str(model_dir / "bundle"),
+        "AI_MODEL_WATCH_INTERVAL_SECONDS": "0",
+        "AI_WORKERS": "1",
+        "AI_THRESHOLDS_PATH": "",
+        "AI_CACHE_ENABLED": "0",
+        "AI_CLOUD_PROVIDER": "",
+        "AI_LOCAL_HF_ENABLED": "0",
+        "AI_LABEL_LOG_PATH": "",
+        "AI_SIMILAR_SNAPSHOT_PATH": "",
+        "AI_KB_SNAPSHOT_PATH": "",
+        **overrides,
+    }
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        if module_name == "app":
+            return importlib.import_module("app")
+        spec = importlib.util.spec_from_file_location(module_name, SERVICE_DIR / "app.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@pytest.fixture(scope="session")
+def app_module(model_dir):
+    """The service module, loaded once against model_dir."""
+    return load_app(model_dir)
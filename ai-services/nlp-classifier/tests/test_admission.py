@@ -0,0 +1,205 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import PRIORITY_HIGH, PRIORITY_NORMAL, AdmissionController, Overloaded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_max_concurrent_without_queueing():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=2, max_queue=4)
+        await ctl.acquire()
+        await ctl.acquire()
+        assert ctl.in_flight == 2
+        ctl.release()
+        ctl.release()
+        return ctl.stats()
+
+    stats = run(scenario())
+    assert stats["admitted"] == 2
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_release_hands_slot_to_most_urgent_then_oldest_waiter():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=4, max_wait_seconds=5.0)
+        await ctl.acquire()
+        order = []
+
+        async def waiter(name, priority):
+            await ctl.acquire(priority)
+            order.append(name)
+            ctl.release()
+
+        tasks = [
+            asyncio.create_task(waiter("normal-1", PRIORITY_NORMAL)),
+            asyncio.create_task(waiter("normal-2", PRIORITY_NORMAL)),
+            asyncio.create_task(waiter("high", PRIORITY_HIGH)),
+        ]
+        await asyncio.sleep(0)
+        assert ctl.stats()["queue_depth"] == 3
+        ctl.release()
+        await asyncio.gather(*tasks)
+        return order, ctl
+
+    order, ctl = run(scenario())
+    assert order == ["high", "normal-1", "normal-2"]
+    assert ctl.in_flight == 0
+    assert ctl.stats()["queue_depth"] == 0
+
+
+def test_sheds_newcomer_when_queue_is_full():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=1, max_wait_seconds=5.0)
+        await ctl.acquire()
+        waiting = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as exc:
+            await ctl.acquire()
+        ctl.release()
+        await waiting
+        ctl.release()
+        return exc.value, ctl.stats()
+
+    error, stats = run(scenario())
+    assert error.reason == "queue_full"
+    assert stats["shed"] == {"queue_full": 1}
+    assert stats["in_flight"] == 0
+
+
+def test_sheds_waiter_after_max_wait():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=4, max_wait_seconds=0.02)
+        await ctl.acquire()
+        with pytest.raises(Overloaded) as exc:
+            await ctl.acquire()
+        ctl.release()
+        return exc.value, ctl
+
+    error, ctl = run(scenario())
+    assert error.reason == "timeout"
+    assert ctl.stats()["queue_depth"] == 0
+    assert ctl.in_flight == 0
+    assert ctl.degraded()
+
+
+def test_degraded_once_queue_reaches_threshold():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=8, max_wait_seconds=5.0, degrade_queue_depth=2)
+        await ctl.acquire()
+        first = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        before = ctl.degraded()
+        second = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        after = ctl.degraded()
+        for _ in range(3):
+            ctl.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(first, second)
+        return before, after
+
+    before, after = run(scenario())
+    assert not before
+    assert after
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=4, max_wait_seconds=5.0)
+        await ctl.acquire()
+        waiting = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        depth = ctl.stats()["queue_depth"]
+        ctl.release()
+        return depth, ctl.in_flight
+
+    depth, in_flight = run(scenario())
+    assert depth == 0
+    assert in_flight == 0
+
+
+def test_full_queue_evicts_newest_less_urgent_waiter():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=2, max_wait_seconds=5.0)
+        await ctl.acquire()
+        first = asyncio.create_task(ctl.acquire(PRIORITY_NORMAL))
+        newest = asyncio.create_task(ctl.acquire(PRIORITY_NORMAL))
+        await asyncio.sleep(0)
+        urgent = asyncio.create_task(ctl.acquire(PRIORITY_HIGH))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as exc:
+            await newest
+        ctl.release()
+        await urgent
+        assert not first.done()
+        ctl.release()
+        await first
+        ctl.release()
+        return exc.value, ctl.stats()
+
+    error, stats = run(scenario())
+    assert error.reason == "evicted"
+    assert stats["shed"] == {"evicted": 1}
+    assert stats["in_flight"] == 0
+
+
+def test_load_generator_sheds_fast_and_keeps_goodput():
+    # Offered load is 2.5x what the stub can serve: 4 slots x 20 ms = 200/s against 500/s.
+    service_seconds, max_wait = 0.02, 0.1
+    n_requests, interval = 250, 0.002
+
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=4, max_queue=8, max_wait_seconds=max_wait, degrade_queue_depth=4)
+        outcomes = []
+
+        async def request(i):
+            priority = PRIORITY_HIGH if i % 10 == 0 else PRIORITY_NORMAL
+            started = time.monotonic()
+            try:
+                await ctl.acquire(priority)
+            except Overloaded as e:
+                outcomes.append((priority, e.reason, time.monotonic() - started))
+                return
+            try:
+                await asyncio.sleep(service_seconds)  # the slow stub
+            finally:
+                ctl.release()
+            outcomes.append((priority, "ok", time.monotonic() - started))
+
+        started = time.monotonic()
+        tasks = []
+        for i in range(n_requests):
+            tasks.append(asyncio.create_task(request(i)))
+            await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+        return outcomes, time.monotonic() - started, ctl
+
+    outcomes, elapsed, ctl = run(scenario())
+    served = [o for o in outcomes if o[1] == "ok"]
+    shed = [o for o in outcomes if o[1] != "ok"]
+    assert len(served) + len(shed) == n_requests
+    assert shed, "overload should shed"
+    # Shed requests are answered within the max wait, not after a timeout upstream.
+    assert max(o[2] for o in shed) < max_wait + 0.1
+    # Admitted requests never wait longer than the max wait either.
+    assert max(o[2] for o in served) < max_wait + service_seconds + 0.1
+    # Goodput stays near capacity: the slots are never idle while requests wait.
+    capacity = 4 / service_seconds
+    assert len(served) / elapsed > 0.6 * capacity
+    # Urgent requests take the place of normal ones instead of being shed.
+    urgent = [o for o in outcomes if o[0] == PRIORITY_HIGH]
+    assert sum(o[1] == "ok" for o in urgent) >= 0.9 * len(urgent)
+    assert sum(o[1] == "ok" for o in outcomes if o[0] == PRIORITY_NORMAL) < len(outcomes) - len(urgent)
+    assert ctl.stats()["in_flight"] == 0
+    assert ctl.stats()["queue_depth"] == 0
+    assert ctl.stats()["degraded"] >= 1
@@ -0,0 +1,280 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def client(app_module):
+    with TestClient(app_module.app) as c:
+        yield c
+
+
+def test_predict(client, app_module):
+    res = client.post("/predict", json={"text": "VPN disconnects every 5 minutes after password reset"})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["model_version"] == app_module.model_registry.version
+    assert body["category"] == body["top_categories"][0]["label"]
+    assert 0.0 <= body["confidence"] <= 1.0
+
+
+def test_predict_batch_matches_single_predictions(client):
+    texts = ["Printer is jammed", "Need access to Salesforce", "Outlook crashes on start"]
+    batch = client.post("/predict_batch", json={"items": [{"id": str(i), "text": t} for i, t in enumerate(texts)]})
+    assert batch.status_code == 200
+    results = batch.json()["results"]
+    for i, text in enumerate(texts):
+        single = client.post("/predict", json={"text": text}).json()
+        assert results[i]["id"] == str(i)
+        assert results[i]["result"]["category"] == single["category"]
+        assert results[i]["result"]["confidence"] == pytest.approx(single["confidence"])
+
+
+def test_predict_batch_reports_bad_items_individually(client):
+    res = client.post("/predict_batch", json={"items": [{"id": "a", "text": "vpn down"}, {"id": "b"}]})
+    assert res.status_code == 200
+    results = res.json()["results"]
+    assert results[0]["error"] is None
+    assert results[1]["result"] is None
+    assert results[1]["error"]
+
+
+def test_enrich(client):
+    res = client.post("/enrich", json={"text": "My laptop was stolen at the airport, error 0x80070005"})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["tiers_run"]
+    assert body["priority"] in ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+    assert "0x80070005" in body["entities"]["error_codes"]
+
+
+def test_predict_stream(client):
+    lines = [json.dumps({"id": "1", "text": "vpn down"}), "not json", json.dumps({"id": "3", "text": "printer jam"})]
+    res = client.post("/predict_stream", content="\n".join(lines) + "\n")
+    assert res.status_code == 200
+    records = [json.loads(line) for line in res.text.splitlines()]
+    assert [r["line"] for r in records] == [1, 2, 3]
+    assert records[0]["result"] and records[2]["result"]
+    assert records[1]["error"]
+
+
+def test_metrics_and_server_timing(client):
+    res = client.post("/predict", json={"text": "wifi slow"})
+    assert "total;dur=" in res.headers["Server-Timing"]
+    assert "ai_requests_total" in client.get("/metrics").text
+
+
+def test_teacher_labels_are_logged_in_training_label_space(app_module, tmp_path, monkeypatch):
+    from label_log import LabelLog
+
+    log = LabelLog(str(tmp_path / "train.generated.jsonl"))
+    monkeypatch.setattr(app_module, "label_log", log)
+    zero_shot = app_module.PredictResponse(category="IDENTITY_ACCESS", intent="PASSWORD_RESET", confidence=0.7)
+    app_module._log_teacher_label("forgot my password", zero_shot, "MEDIUM", "local_hf", ["domain", "intent"])
+    free_form = app_module.PredictResponse(category="Printers", intent="Complaint", confidence=0.9)
+    app_module._log_teacher_label("printer smudges", free_form, "LOW", "cloud", ["domain", "intent", "risk"])
+    unusable = app_module.PredictResponse(category="Printers", intent="Complaint", confidence=0.9)
+    app_module._log_teacher_label("printer noise", unusable, "MEDIUM", "cloud", ["domain", "intent"])
+    log.close()
+
+    records = [json.loads(line) for line in (tmp_path / "train.generated.jsonl").read_text().splitlines()]
+    assert [r["text"] for r in records] == ["forgot my password", "printer smudges"]
+    assert (records[0]["intent"], records[0]["teacher"]["heads"]) == ("ACCOUNT_ACCESS", ["domain", "intent"])
+    assert records[1]["domain"] is None
+    assert records[1]["teacher"]["heads"] == ["risk"]
+
+
+def test_admission_priority_reads_only_the_head(app_module, monkeypatch):
+    assert app_module.admission_priority("URGENT: payroll server is down") == app_module.PRIORITY_HIGH
+    assert app_module.admission_priority("Suspected phishing mail") == app_module.PRIORITY_HIGH
+    assert app_module.admission_priority("How do I share a calendar?") == app_module.PRIORITY_NORMAL
+    monkeypatch.setattr(app_module, "ADMISSION_RANK_CHARS", 100)
+    late = "please help " * 50 + "outage"
+    assert app_module.admission_priority(late) == app_module.PRIORITY_NORMAL
+
+
+def test_enrich_sheds_with_503_and_retry_after(client, app_module, monkeypatch):
+    from admission import AdmissionController
+
+    ctl = AdmissionController(max_concurrent=1, max_queue=0)
+    ctl.in_flight = 1  # every slot busy, no queue
+    monkeypatch.setattr(app_module, "admission", ctl)
+    normalized = []
+    monkeypatch.setattr(app_module, "normalize_text", lambda text: normalized.append(text))
+
+    res = client.post("/enrich", json={"text": "VPN is down"})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+    assert ctl.stats()["shed"] == {"queue_full": 1}
+    # A shed request is never normalized.
+    assert normalized == []
+
+
+def test_oov_text_is_reported_as_keyword_tier_and_escalates(client, app_module, monkeypatch):
+    text = "zzqx blorf wugga"
+    base = client.post("/enrich", json={"text": text}).json()
+    assert base["tiers_run"] == ["keyword"]
+    assert base["confidence"] < app_module.LOCAL_HF_TRIGGER_THRESHOLD
+    assert client.post("/predict", json={"text": text}).json()["confidence"] == base["confidence"]
+
+    asked = []
+
+    async def local_hf(t):
+        asked.append(t)
+        return {"category": "OTHER", "intent": "UNKNOWN", "confidence": 0.9}
+
+    monkeypatch.setattr(app_module, "hf_batcher", object())
+    monkeypatch.setattr(app_module, "_run_local_hf", local_hf)
+    escalated = client.post("/enrich", json={"text": text}).json()
+    assert asked
+    assert escalated["tiers_run"] == ["keyword", "local_hf"]
+    assert escalated["confidence"] == 0.9
+
+
+def test_in_vocabulary_text_is_reported_as_tfidf_tier(client):
+    assert client.post("/enrich", json={"text": "VPN disconnects every 5 minutes"}).json()["tiers_run"][0] == "tfidf"
+
+
+def test_batch_accepts_numeric_ids(client):
+    items = [{"id": 101, "text": "vpn down"}, {"id": "T-2", "text": "printer jam"}, {"text": "outlook crash"}]
+    res = client.post("/predict_batch", json={"items": items})
+    assert res.status_code == 200
+    assert [r["id"] for r in res.json()["results"]] == ["101", "T-2", None]
+    res = client.post("/enrich_batch", json={"items": items[:1]})
+    assert res.status_code == 200
+    assert res.json()["results"][0]["id"] == "101"
+
+
+def test_disabled_kb_reports_why(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "kb_index", app_module.kb_index)
+    monkeypatch.setattr(app_module, "_kb_disabled_reason", app_module._kb_disabled_reason)
+    app_module._disable_kb("not supported with more than one worker process")
+
+    res = client.post("/kb/articles", json={"articles": [{"id": "kb-1", "title": "VPN", "body": "Reconnect"}]})
+    assert res.status_code == 404
+    assert "more than one worker" in res.json()["detail"]
+    assert client.get("/kb/stats").json() == {"enabled": False, "reason": "not supported with more than one worker process"}
+    app_module._kb_on_swap(app_module.model_registry.current())  # a later model swap is a no-op
+
+
+def test_profile_header_needs_the_admin_token(client, app_module, monkeypatch):
+    from request_profiler import RequestProfiler
+
+    monkeypatch.setattr(app_module, "profiler", RequestProfiler(interval_ms=1.0, slow_ms=60000.0, keep=4))
+    monkeypatch.setattr(app_module, "PROFILE_HEADER_ENABLED", True)
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "secret")
+    body = {"text": "VPN disconnects every 5 minutes"}
+
+    assert "X-Profile-Id" not in client.post("/predict", json=body, headers={"X-Profile": "1"}).headers
+    wrong = {"X-Profile": "1", "X-Admin-Token": "guess"}
+    assert "X-Profile-Id" not in client.post("/predict", json=body, headers=wrong).headers
+    assert app_module.profiler.stats()["kept"] == 0
+    admin = {"X-Profile": "1", "X-Admin-Token": "secret"}
+    assert client.post("/predict", json=body, headers=admin).headers["X-Profile-Id"]
+
+
+def test_profile_header_is_off_by_default(app_module):
+    assert not app_module.PROFILE_HEADER_ENABLED
+    assert app_module.profiler is None
+
+
+def _stream_request(messages):
+    from starlette.requests import Request
+
+    received = []
+
+    async def receive():
+        message = messages.pop(0) if messages else {"type": "http.disconnect"}
+        received.append(message["type"])
+        return message
+
+    scope = {"type": "http", "method": "POST", "path": "/predict_stream", "headers": [], "query_string": b""}
+    return Request(scope, receive), received
+
+
+def _body(*texts, more_body=True):
+    lines = "".join(json.dumps({"id": str(i), "text": t}) + "\n" for i, t in enumerate(texts))
+    return {"type": "http.request", "body": lines.encode("utf-8"), "more_body": more_body}
+
+
+def test_stream_stops_when_the_client_drops_mid_body(app_module, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(app_module, "BATCH_CHUNK_SIZE", 1)
+    request, received = _stream_request([_body("vpn down", "printer jam", "outlook crash"), {"type": "http.disconnect"}])
+
+    async def consume():
+        return [chunk async for chunk in app_module._stream_results(request, "predict", None)]
+
+    out = asyncio.run(consume())
+    # Two chunks were answered while the third was scored; the disconnect ends the stream quietly.
+    assert len(out) == 2
+    assert received == ["http.request", "http.disconnect"]
+
+
+def test_stream_skips_the_last_chunk_once_the_client_is_gone(app_module, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(app_module, "BATCH_CHUNK_SIZE", 1)
+    request, received = _stream_request([_body("vpn down", "printer jam", more_body=False), {"type": "http.disconnect"}])
+
+    async def consume():
+        return [chunk async for chunk in app_module._stream_results(request, "predict", None)]
+
+    assert len(asyncio.run(consume())) == 1
+    assert received == ["http.request", "http.disconnect"]
+
+
+def test_enrich_batch_takes_an_admission_slot(client, app_module, monkeypatch):
+    from admission import AdmissionController
+
+    ctl = AdmissionController(max_concurrent=1, max_queue=0)
+    ctl.in_flight = 1
+    monkeypatch.setattr(app_module, "admission", ctl)
+    res = client.post("/enrich_batch", json={"items": [{"id": "1", "text": "VPN is down"}]})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+
+    ctl.in_flight = 0
+    assert client.post("/enrich_batch", json={"items": [{"id": "1", "text": "VPN is down"}]}).status_code == 200
+    assert ctl.stats()["admitted"] == 1
+    assert ctl.in_flight == 0
+
+
+def test_enrich_stream_chunks_wait_for_an_admission_slot(app_module, monkeypatch):
+    import asyncio
+
+    from admission import AdmissionController
+
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=4, max_wait_seconds=5.0)
+        monkeypatch.setattr(app_module, "admission", ctl)
+        await ctl.acquire()  # an interactive /enrich holds the only slot
+        lines = [app_module.parse_ndjson_line(1, json.dumps({"id": "1", "text": "VPN is down"}).encode())]
+        chunk = asyncio.create_task(app_module.enrich_stream_chunk(lines))
+        await asyncio.sleep(0.05)
+        waited = not chunk.done()
+        ctl.release()
+        records = await chunk
+        return waited, records, ctl
+
+    waited, records, ctl = asyncio.run(scenario())
+    assert waited
+    assert records[0]["result"] and records[0]["error"] is None
+    assert ctl.in_flight == 0
+
+
+@pytest.mark.parametrize("setting", ["AI_WORKERS", "WEB_CONCURRENCY"])
+def test_kb_is_disabled_at_import_with_several_workers(model_dir, monkeypatch, setting, caplog):
+    from conftest import load_app
+
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    overrides = {"AI_WORKERS": ""} if setting == "WEB_CONCURRENCY" else {}
+    overrides[setting] = "4"
+    with caplog.at_level("WARNING"):
+        module = load_app(model_dir, f"app_{setting.lower()}", **overrides)
+    assert module.WORKERS == 4
+    assert module.kb_index is None
+    assert "more than one worker" in module._kb_disabled_reason
+    assert "KB search is disabled" in caplog.text
@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+from backfill import iter_chunks, load_checkpoint, save_checkpoint
+
+
+def test_iter_chunks_skips_blank_lines_and_reports_offsets():
+    raw = b'{"id": 1}\n\n{"id": 2}\r\n{"id": 3}\n'
+    f = io.BytesIO(raw)
+    chunks = list(iter_chunks(f, 0, 2))
+    assert [lines for lines, _, _ in chunks] == [
+        [(1, b'{"id": 1}'), (3, b'{"id": 2}')],
+        [(4, b'{"id": 3}')],
+    ]
+    assert [(line_no, offset) for _, line_no, offset in chunks] == [(3, raw.index(b'{"id": 3}')), (4, len(raw))]
+
+
+def test_iter_chunks_resumes_from_offset():
+    raw = b"a\nb\nc\n"
+    f = io.BytesIO(raw)
+    f.seek(2)
+    assert list(iter_chunks(f, 1, 10)) == [([(2, b"b"), (3, b"c")], 3, len(raw))]
+
+
+def test_checkpoint_round_trip_and_mismatch(tmp_path):
+    path = tmp_path / "out.jsonl.checkpoint.json"
+    assert load_checkpoint(path, "in.jsonl", "out.jsonl") is None
+    state = {
+        "input": str((tmp_path / "in.jsonl").resolve()),
+        "output": str((tmp_path / "out.jsonl").resolve()),
+        "input_offset": 10,
+        "lines": 2,
+        "output_bytes": 40,
+        "done": False,
+    }
+    save_checkpoint(path, state)
+    assert load_checkpoint(path, str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")) == state
+    with pytest.raises(ValueError):
+        load_checkpoint(path, str(tmp_path / "other.jsonl"), str(tmp_path / "out.jsonl"))
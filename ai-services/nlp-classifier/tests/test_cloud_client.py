@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import httpx
+
+from cloud_client import CircuitBreaker, CloudClient, OpenAIProvider, extract_json_items, extract_json_object
+
+ANSWER = {"category": "NETWORK_VPN_WIFI", "intent": "INCIDENT", "priority": "MEDIUM", "confidence": 0.9}
+
+
+def test_extract_json_object_from_chatty_reply():
+    assert extract_json_object('Sure! {"category": "OTHER"} hope that helps') == {"category": "OTHER"}
+    assert extract_json_object("no json here") is None
+
+
+def test_extract_json_items_matches_on_id():
+    text = 'Here: [{"id": 1, "category": "B"}, {"id": 0, "category": "A"}, {"id": 7, "category": "X"}]'
+    assert extract_json_items(text, 3) == [{"id": 0, "category": "A"}, {"id": 1, "category": "B"}, None]
+    assert extract_json_items('{"results": [{"category": "A"}]}', 1) == [{"category": "A"}]
+
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # Cool-down over: exactly one probe goes through.
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def make_client(handler, **kwargs):
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = CloudClient(OpenAIProvider("key", "model"), lambda: http, **kwargs)
+    return client, http
+
+
+def openai_reply(content: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def test_identical_tickets_share_one_request():
+    calls = []
+
+    async def scenario():
+        def handler(request):
+            calls.append(request)
+            return openai_reply(json.dumps(ANSWER))
+
+        client, http = make_client(handler, max_batch=1)
+        results = await asyncio.gather(client.classify("vpn down"), client.classify("vpn down"))
+        await http.aclose()
+        return results, client.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [ANSWER, ANSWER]
+    assert len(calls) == 1
+    assert stats["coalesced"] == 1
+
+
+def test_tickets_are_batched_into_one_prompt():
+    calls = []
+
+    async def scenario():
+        def handler(request):
+            calls.append(request)
+            items = [dict(ANSWER, id=i, category=f"C{i}") for i in range(3)]
+            return openai_reply(json.dumps(items))
+
+        client, http = make_client(handler, max_batch=8, max_wait_ms=10)
+        results = await asyncio.gather(*(client.classify(f"ticket {i}") for i in range(3)))
+        await http.aclose()
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [r["category"] for r in results] == ["C0", "C1", "C2"]
+
+
+def test_failures_open_the_breaker():
+    async def scenario():
+        outcomes = []
+        client, http = make_client(
+            lambda request: httpx.Response(503),
+            max_batch=1,
+            failure_threshold=2,
+            cooldown_seconds=60,
+            record=outcomes.append,
+        )
+        results = [await client.classify(f"ticket {i}") for i in range(3)]
+        await http.aclose()
+        return results, outcomes, client
+
+    results, outcomes, client = asyncio.run(scenario())
+    assert results == [None, None, None]
+    assert outcomes == ["http_5xx", "http_5xx", "circuit_open"]
+    assert client.is_open()
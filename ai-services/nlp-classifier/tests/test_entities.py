@@ -0,0 +1,55 @@
+import re
+
+import pytest
+
+
+def reference_entities(text):
+    """The original, unbounded extractor: every type scanned over the whole text."""
+    entities = {}
+    emails = re.findall(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", text)
+    entities["emails"] = list(dict.fromkeys([e.lower() for e in emails]))[:5]
+    users = [m.group(2) for m in re.finditer(r"\b(username|user id|userid)\s*[:=]?\s*([a-zA-Z0-9._-]{3,})\b", text, re.IGNORECASE)]
+    entities["usernames"] = list(dict.fromkeys(users))[:5]
+    entities["asset_tags"] = list(dict.fromkeys(re.findall(r"\b([A-Z]{2,5}-\d{3,10})\b", text)))[:5]
+    entities["error_codes"] = list(dict.fromkeys(re.findall(r"\b(0x[0-9A-Fa-f]+|ERR_[A-Z0-9_]+|\d{3,5})\b", text)))[:5]
+    return entities
+
+
+MIXED = [
+    "username: 12345 cannot log in",
+    "Laptop ABC-1234 shows error 0x80070005",
+    "Contact John.Doe@Example.com about LT-12345 (user id jdoe) ERR_CONN_RESET",
+    "userid=42xyz mail 1234@corp.io and asset HR-999 code 404 then 500 and 503",
+    "errors 100 200 300 400 500 600 700, tags AB-111 AB-222 AB-333 AB-444 AB-555 AB-666",
+    "a@b.co a@b.co A@B.CO c@d.org e@f.net g@h.io i@j.dev k@l.app",
+    "x@y@z.com and plain text with no entities at all",
+    "",
+]
+
+
+@pytest.mark.parametrize("text", MIXED)
+def test_matches_reference_extractor(app_module, text):
+    assert app_module.extract_entities(text) == reference_entities(text)
+
+
+def test_overlapping_types(app_module):
+    entities = app_module.extract_entities("username: 12345, asset ABC-1234")
+    assert entities["usernames"] == ["12345"]
+    assert entities["asset_tags"] == ["ABC-1234"]
+    assert entities["error_codes"] == ["12345", "1234"]
+
+
+def test_long_bodies_are_scanned_in_windows(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "ENTITY_SCAN_HEAD_CHARS", 100)
+    monkeypatch.setattr(app_module, "ENTITY_SCAN_TAIL_CHARS", 50)
+    text = "error 0x1 " + "filler " * 1000 + "code 404 " + "filler " * 1000 + "asset AB-123"
+    entities = app_module.extract_entities(text)
+    assert entities["error_codes"] == ["0x1", "123"]
+    assert entities["asset_tags"] == ["AB-123"]
+
+
+def test_limit(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "ENTITY_LIMIT", 2)
+    assert app_module.extract_entities("100 200 300")["error_codes"] == ["100", "200"]
+    monkeypatch.setattr(app_module, "ENTITY_LIMIT", 0)
+    assert app_module.extract_entities("100 200 300") == {t: [] for t in app_module._ENTITY_TYPES}
@@ -0,0 +1,94 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from kb_index import KBIndex, TfidfProjectionEncoder, _normalize_rows
+
+
+class WordEncoder:
+    """Hashed bag of words; deterministic and dependency-free."""
+
+    def __init__(self, dim=64, signature="words"):
+        self.dim = dim
+        self.signature = signature
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        return _normalize_rows(out)
+
+
+ARTICLES = [
+    {"id": "kb-1", "title": "Reset your VPN token", "body": "vpn token reset steps", "category": "NETWORK_VPN_WIFI"},
+    {"id": "kb-2", "title": "Printer jam", "body": "clear the printer paper jam", "category": "HARDWARE_PERIPHERAL"},
+    {"id": "kb-3", "title": "Outlook profile", "body": "rebuild outlook profile", "category": "EMAIL_COLLAB"},
+]
+
+
+def test_search_ranks_matching_article_first():
+    index = KBIndex(WordEncoder())
+    assert index.upsert(ARTICLES) == (3, 0)
+    results = index.search("printer paper jam", k=2)
+    assert results[0]["id"] == "kb-2"
+    assert len(results) == 2
+
+
+def test_category_filter_and_min_score():
+    index = KBIndex(WordEncoder())
+    index.upsert(ARTICLES)
+    assert [r["id"] for r in index.search("printer jam", category="email_collab")] == ["kb-3"]
+    assert index.search("printer jam", category="UNKNOWN_CATEGORY") == []
+    assert [r["id"] for r in index.search("printer paper jam", min_score=0.5)] == ["kb-2"]
+
+
+def test_update_and_delete_keep_rows_contiguous():
+    index = KBIndex(WordEncoder(), initial_capacity=16)
+    index.upsert(ARTICLES)
+    assert index.upsert([{"id": "kb-2", "title": "Scanner", "body": "scanner driver"}]) == (0, 1)
+    assert index.delete("kb-1")
+    assert not index.delete("kb-1")
+    assert len(index) == 2
+    assert index.search("scanner driver")[0]["id"] == "kb-2"
+    assert index.search("outlook profile")[0]["id"] == "kb-3"
+
+
+def test_grows_past_initial_capacity():
+    index = KBIndex(WordEncoder(), initial_capacity=16)
+    index.upsert([{"id": f"kb-{i}", "title": f"article {i}"} for i in range(40)])
+    assert len(index) == 40
+    assert index.stats()["capacity"] >= 40
+
+
+def test_snapshot_restore_and_reencode(tmp_path):
+    path = str(tmp_path / "kb.npz")
+    index = KBIndex(WordEncoder())
+    index.upsert(ARTICLES)
+    assert index.snapshot(path) == 3
+
+    restored = KBIndex(WordEncoder(dim=32, signature="other"))
+    assert restored.restore(path) == 3
+    assert restored.search("printer paper jam")[0]["id"] == "kb-2"
+
+    assert index.reencode(WordEncoder(dim=128, signature="wide")) == 3
+    assert index.stats()["dim"] == 128
+    assert index.search("outlook profile")[0]["id"] == "kb-3"
+
+
+def test_without_encoder():
+    index = KBIndex(None)
+    assert index.search("anything") == []
+    with pytest.raises(RuntimeError):
+        index.upsert(ARTICLES)
+
+
+def test_tfidf_projection_encoder(app_module):
+    model = app_module.model_registry.current().model
+    encoder = TfidfProjectionEncoder(model, "v", app_module.clean_text, dim=32)
+    rows = encoder.encode(["vpn keeps disconnecting", "", "vpn keeps disconnecting"])
+    assert rows.shape == (3, 32)
+    assert np.allclose(rows[0], rows[2])
+    assert abs(float(np.linalg.norm(rows[0])) - 1.0) < 1e-5
+    assert not rows[1].any()
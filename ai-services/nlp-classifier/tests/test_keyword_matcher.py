@@ -0,0 +1,28 @@
+from keyword_matcher import KeywordMatcher, any_hit, keyword_label
+
+
+def test_whole_words_only():
+    matcher = KeywordMatcher(["app", "vpn"])
+    assert matcher.match("please approve") == frozenset()
+    assert matcher.match("the app crashed on vpn") == {"app", "vpn"}
+
+
+def test_prefix_phrases():
+    matcher = KeywordMatcher(["install*"])
+    assert matcher.match("installation failed") == {"install*"}
+    assert matcher.match("reinstall it") == frozenset()
+    assert keyword_label("install*") == "install"
+
+
+def test_longer_match_implies_contained_phrases():
+    matcher = KeywordMatcher(["data breach", "breach*", "hack*", "hacked"])
+    assert matcher.match("possible data breach") == {"data breach", "breach*"}
+    assert matcher.match("we got hacked") == {"hacked", "hack*"}
+
+
+def test_overlapping_phrases_are_all_found():
+    matcher = KeywordMatcher(["password reset", "reset"])
+    hits = matcher.match("password reset and reset again")
+    assert hits == {"password reset", "reset"}
+    assert any_hit(hits, ["vpn", "reset"])
+    assert not any_hit(hits, ["vpn"])
@@ -0,0 +1,29 @@
+import json
+
+from label_log import LabelLog
+
+
+def test_appends_records_in_train_format(tmp_path):
+    path = tmp_path / "train.generated.jsonl"
+    log = LabelLog(str(path))
+    assert log.append("vpn down", "NETWORK_VPN_WIFI", "INCIDENT", "MEDIUM", "cloud", 0.861234, ["domain", "intent"], "v1")
+    assert log.append("new laptop", "ENDPOINT_DEVICE", "SERVICE_REQUEST", "LOW", "local_hf", 0.7, ["domain"])
+    log.close()
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["text"] for r in records] == ["vpn down", "new laptop"]
+    assert records[0]["domain"] == "NETWORK_VPN_WIFI"
+    assert records[0]["teacher"] == {"tier": "cloud", "confidence": 0.8612, "heads": ["domain", "intent"]}
+    assert records[0]["model_version"] == "v1"
+    assert log.stats()["written"] == 2
+
+
+def test_drops_when_queue_is_full(tmp_path):
+    log = LabelLog(str(tmp_path / "log.jsonl"), max_queue=1)
+    log._ensure_started()
+    # A one-slot queue: whatever the writer has not drained yet is dropped, never blocked on.
+    accepted = sum(log.append("t", "OTHER", "UNKNOWN", "LOW", "cloud", 0.5, []) for _ in range(2000))
+    log.close()
+    stats = log.stats()
+    assert accepted + stats["dropped"] == 2000
+    assert stats["written"] == accepted
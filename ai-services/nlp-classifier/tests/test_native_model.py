@@ -0,0 +1,144 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from native_model import MANIFEST_NAME, NativeTextModel, export_bundle, fit_temperature, proba_from_scores
+
+TEXTS = [
+    "vpn disconnects after password reset",
+    "cannot login to sap",
+    "need access to salesforce",
+    "printer on floor 3 is jammed",
+    "outlook keeps crashing when opening attachments",
+    "laptop battery drains fast",
+    "phishing email asking for credentials",
+    "install visio license please",
+    "wifi is slow in the meeting room",
+    "how do i share a calendar in outlook",
+    "monitor flickers on docking station",
+    "account locked after too many attempts",
+]
+CATEGORIES = ["NET", "APP", "APP", "HW", "MAIL", "HW", "SEC", "SW", "NET", "MAIL", "HW", "ID"]
+INTENTS = ["INC", "INC", "REQ", "INC", "INC", "INC", "SEC", "REQ", "INC", "HOW", "INC", "INC"]
+RISKS = ["HIGH", "LOW", "LOW", "LOW", "HIGH", "LOW", "HIGH", "LOW", "LOW", "LOW", "LOW", "HIGH"]
+QUERIES = TEXTS + ["vpn and outlook both down", "totally unrelated words", "", "sap sap sap license"]
+
+
+def fit(X, labels, **kwargs):
+    return LogisticRegression(max_iter=2000, **kwargs).fit(X, labels)
+
+
+@pytest.fixture(scope="module")
+def vectorizer():
+    return TfidfVectorizer(ngram_range=(1, 2)).fit(TEXTS)
+
+
+@pytest.fixture(scope="module")
+def heads(vectorizer):
+    # The binary risk head has a single coefficient row and sits between two multiclass heads.
+    X = vectorizer.transform(TEXTS)
+    return {"intent": fit(X, INTENTS), "risk": fit(X, RISKS), "category": fit(X, CATEGORIES)}
+
+
+def assert_parity(model, vectorizer, heads):
+    csr = model.transform(QUERIES)
+    X = vectorizer.transform(QUERIES)
+    for name, clf in heads.items():
+        scores = model.decision_function(name, csr)
+        expected = clf.decision_function(X)
+        if expected.ndim == 1:
+            expected = expected[:, None]
+        np.testing.assert_allclose(scores, expected, atol=1e-10)
+        np.testing.assert_allclose(model.predict_proba(name, scores), clf.predict_proba(X), atol=1e-10)
+        labels, _ = model.predict(name, csr)
+        assert labels == [str(c) for c in clf.predict(X)]
+
+
+def test_transform_matches_tfidf_vectorizer(vectorizer, heads):
+    model = NativeTextModel.from_sklearn(vectorizer, heads)
+    indptr, indices, data = model.transform(QUERIES)
+    expected = vectorizer.transform(QUERIES).sorted_indices()
+    np.testing.assert_array_equal(indptr, expected.indptr)
+    np.testing.assert_array_equal(indices, expected.indices)
+    np.testing.assert_allclose(data, expected.data, atol=1e-12)
+
+
+def test_heads_match_sklearn(vectorizer, heads):
+    model = NativeTextModel.from_sklearn(vectorizer, heads)
+    assert model.coef_t.shape[1] == 4 + 1 + 7
+    assert model.heads["risk"].proba == "binary"
+    assert_parity(model, vectorizer, heads)
+
+
+def test_binary_head_first_or_last(vectorizer, heads):
+    for order in (["risk", "intent", "category"], ["category", "intent", "risk"]):
+        reordered = {name: heads[name] for name in order}
+        assert_parity(NativeTextModel.from_sklearn(vectorizer, reordered), vectorizer, reordered)
+
+
+def test_loads_bundles_without_column_counts(tmp_path, vectorizer, heads):
+    # Format 2 bundles written before n_columns was recorded.
+    export_bundle(tmp_path, vectorizer, heads)
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    for spec in manifest["heads"].values():
+        del spec["n_columns"]
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps(manifest), encoding="utf-8")
+    assert_parity(NativeTextModel.load(str(tmp_path)), vectorizer, heads)
+
+
+def test_bundle_round_trip(tmp_path, vectorizer, heads):
+    version = export_bundle(tmp_path, vectorizer, heads)
+    model = NativeTextModel.load(str(tmp_path))
+    assert model.version == version
+    assert isinstance(model.coef_t, np.memmap)
+    assert_parity(model, vectorizer, heads)
+
+
+def test_loads_format_1_bundles(tmp_path, vectorizer, heads):
+    export_bundle(tmp_path, vectorizer, heads)
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    coef_t = np.load(tmp_path / "coef_t.npy")
+    start = 0
+    for name in manifest["stacked_heads"]:
+        n = len(np.load(tmp_path / f"{name}_intercept.npy"))
+        np.save(tmp_path / f"{name}_coef.npy", coef_t[:, start:start + n].T)
+        start += n
+    (tmp_path / "coef_t.npy").unlink()
+    manifest["format"] = 1
+    del manifest["stacked_heads"]
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps(manifest), encoding="utf-8")
+    assert_parity(NativeTextModel.load(str(tmp_path)), vectorizer, heads)
+
+
+def test_empty_rows_and_top_k(vectorizer, heads):
+    model = NativeTextModel.from_sklearn(vectorizer, heads)
+    csr = model.transform(["vpn down", "", "zzz qqq"])
+    assert model.empty_rows(csr).tolist() == [False, True, True]
+    proba = model.predict_proba("category", model.decision_function("category", csr))
+    top = model.top_k("category", proba, 3)
+    assert len(top[0]) == 3
+    assert top[0][0][0] == model.predict("category", csr)[0][0]
+    assert [p for _, p in top[0]] == sorted((p for _, p in top[0]), reverse=True)
+
+
+def test_temperature_scales_scores(vectorizer, heads):
+    model = NativeTextModel.from_sklearn(vectorizer, heads)
+    csr = model.transform(QUERIES)
+    scores = model.decision_function("category", csr)
+    model.heads["category"].temperature = 2.0
+    np.testing.assert_allclose(
+        model.predict_proba("category", scores), proba_from_scores("multinomial", scores / 2.0)
+    )
+
+
+def test_fit_temperature_softens_overconfident_scores():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 3, size=400)
+    scores = rng.normal(size=(400, 3))
+    scores[np.arange(400), y] += 1.0
+    # Scaled up tenfold, the scores are far too confident; the fit should undo most of it.
+    t = fit_temperature("multinomial", scores * 10.0, y)
+    assert 5.0 < t < 20.0
@@ -0,0 +1,34 @@
+from prefork import RestartPolicy
+
+
+def test_quick_failures_back_off_exponentially_then_give_up():
+    policy = RestartPolicy(min_uptime=10.0, base_delay=0.5, max_delay=3.0, max_failures=5)
+    delays = []
+    now = 0.0
+    for _ in range(5):
+        policy.started(0, now)
+        now += 1.0
+        delays.append(policy.exited(0, now))
+    assert delays == [0.5, 1.0, 2.0, 3.0, None]
+
+
+def test_a_worker_that_ran_long_enough_resets_its_slot():
+    policy = RestartPolicy(min_uptime=10.0, base_delay=0.5, max_failures=3)
+    policy.started(0, 0.0)
+    assert policy.exited(0, 1.0) == 0.5
+    policy.started(0, 2.0)
+    assert policy.exited(0, 3.0) == 1.0
+    policy.started(0, 4.0)
+    assert policy.exited(0, 100.0) == 0.0
+    policy.started(0, 101.0)
+    assert policy.exited(0, 102.0) == 0.5
+
+
+def test_slots_are_tracked_separately():
+    policy = RestartPolicy(min_uptime=10.0, base_delay=0.5, max_failures=2)
+    policy.started(0, 0.0)
+    policy.started(1, 0.0)
+    assert policy.exited(0, 1.0) == 0.5
+    assert policy.exited(1, 1.0) == 0.5
+    policy.started(0, 2.0)
+    assert policy.exited(0, 3.0) is None
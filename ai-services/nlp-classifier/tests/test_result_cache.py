@@ -0,0 +1,85 @@
+import time
+
+from result_cache import ResultCache, make_key
+
+
+def test_key_depends_on_fingerprint_and_text():
+    assert make_key("a", "vpn down") == make_key("a", "vpn down")
+    assert make_key("a", "vpn down") != make_key("b", "vpn down")
+    assert make_key("a", "vpn down") != make_key("a", "vpn up")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = ResultCache(ttl_seconds=0.01)
+    cache.put("a", {"v": 1})
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_new_fingerprint_drops_entries_and_stale_writes():
+    cache = ResultCache()
+    cache.set_fingerprint("v1")
+    cache.put("a", {"v": 1})
+    cache.set_fingerprint("v2")
+    assert cache.get("a") is None
+    cache.put("b", {"v": 2}, fingerprint="v1")
+    assert cache.get("b") is None
+
+
+def test_sqlite_tier_survives_a_new_instance(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    first = ResultCache(db_path=db)
+    first.set_fingerprint("v1")
+    first.put("a", {"v": 1})
+
+    second = ResultCache(db_path=db)
+    second.set_fingerprint("v1")
+    assert second.get("a") == {"v": 1}
+    assert second.stats()["disk_hits"] == 1
+
+    third = ResultCache(db_path=db)
+    third.set_fingerprint("v2")
+    assert third.get("a") is None
+
+
+def _rows(db):
+    import sqlite3
+
+    with sqlite3.connect(db) as conn:
+        return [r[0] for r in conn.execute("SELECT key FROM enrich_cache ORDER BY created_at")]
+
+
+def test_sqlite_tier_is_capped_every_n_writes(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(max_entries=2, db_path=db, db_max_entries=3, db_purge_every=4)
+    cache.set_fingerprint("v1")
+    for i in range(7):
+        cache.put(f"k{i}", {"v": i})
+    # Purged after the 4th write (k0 evicted); k4..k6 are written since.
+    assert _rows(db) == ["k1", "k2", "k3", "k4", "k5", "k6"]
+    cache.put("k7", {"v": 7})
+    assert _rows(db) == ["k5", "k6", "k7"]
+    assert cache.stats()["disk_evictions"] == 5
+    assert ResultCache(db_path=db).get("k1") is None
+
+
+def test_sqlite_tier_drops_expired_rows_periodically(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(ttl_seconds=0.05, db_path=db, db_purge_every=2)
+    cache.put("old", {"v": 0})
+    time.sleep(0.06)
+    cache.put("new", {"v": 1})
+    assert _rows(db) == ["new"]
+    assert cache.stats()["expirations"] == 1
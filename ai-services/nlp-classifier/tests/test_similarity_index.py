@@ -0,0 +1,102 @@
+import numpy as np
+
+from similarity_index import SimilarityIndex
+
+
+def vec(weights):
+    """Sparse L2-normalized row from {feature: weight}."""
+    indices = np.array(sorted(weights), dtype=np.int64)
+    data = np.array([weights[i] for i in indices], dtype=np.float64)
+    return indices, data / np.linalg.norm(data)
+
+
+def test_finds_most_similar_first():
+    index = SimilarityIndex(max_entries=10, window_seconds=0)
+    index.add("T-1", *vec({1: 1.0, 2: 1.0}))
+    index.add("T-2", *vec({1: 1.0, 3: 1.0}))
+    index.add("T-3", *vec({4: 1.0}))
+    matches = index.query(*vec({1: 1.0, 2: 1.0}), k=5)
+    assert [m[0] for m in matches] == ["T-1", "T-2"]
+    assert abs(matches[0][1] - 1.0) < 1e-6
+    assert abs(matches[1][1] - 0.5) < 1e-6
+
+
+def test_exclude_and_min_score():
+    index = SimilarityIndex(max_entries=10, window_seconds=0)
+    index.add("T-1", *vec({1: 1.0, 2: 1.0}))
+    index.add("T-2", *vec({1: 1.0, 3: 1.0}))
+    assert [m[0] for m in index.query(*vec({1: 1.0, 2: 1.0}), exclude="T-1")] == ["T-2"]
+    assert [m[0] for m in index.query(*vec({1: 1.0, 2: 1.0}), min_score=0.9)] == ["T-1"]
+
+
+def test_re_adding_a_ticket_replaces_it():
+    index = SimilarityIndex(max_entries=10, window_seconds=0)
+    index.add("T-1", *vec({1: 1.0}))
+    index.add("T-1", *vec({2: 1.0}))
+    assert len(index) == 1
+    assert index.query(*vec({1: 1.0})) == []
+    assert [m[0] for m in index.query(*vec({2: 1.0}))] == ["T-1"]
+
+
+def test_ring_overwrites_oldest():
+    index = SimilarityIndex(max_entries=2, window_seconds=0)
+    for i in range(3):
+        index.add(f"T-{i}", *vec({1: 1.0}))
+    assert sorted(m[0] for m in index.query(*vec({1: 1.0}))) == ["T-1", "T-2"]
+
+
+def test_time_window():
+    index = SimilarityIndex(max_entries=10, window_seconds=60)
+    index.add("old", *vec({1: 1.0}), now=1000.0)
+    index.add("new", *vec({1: 1.0}), now=1100.0)
+    assert [m[0] for m in index.query(*vec({1: 1.0}), now=1110.0)] == ["new"]
+
+
+def test_snapshot_restore_round_trip(tmp_path):
+    path = str(tmp_path / "similar.npz")
+    index = SimilarityIndex(max_entries=10, window_seconds=0)
+    index.reset("v1")
+    index.add("T-1", *vec({1: 1.0, 2: 1.0}))
+    index.add("T-2", *vec({3: 1.0}))
+    assert index.snapshot(path) == 2
+
+    restored = SimilarityIndex(max_entries=10, window_seconds=0)
+    assert restored.restore(path, "v1") == 2
+    assert [m[0] for m in restored.query(*vec({1: 1.0, 2: 1.0}))] == ["T-1"]
+    assert SimilarityIndex().restore(path, "v2") == 0
+
+
+def test_per_worker_snapshots_are_merged_on_restore(tmp_path):
+    from similarity_index import snapshot_paths, worker_snapshot_path
+
+    path = str(tmp_path / "similar.npz")
+    assert worker_snapshot_path(path, None) == path
+    for worker, tickets in (("0", [("T-1", 1000.0), ("T-2", 1001.0)]), ("1", [("T-3", 1002.0), ("T-1", 1003.0)])):
+        index = SimilarityIndex(max_entries=10, window_seconds=0)
+        index.reset("v1")
+        for ticket, at in tickets:
+            index.add(ticket, *vec({int(ticket[-1]): 1.0}), now=at)
+        index.snapshot(worker_snapshot_path(path, worker))
+    (tmp_path / "similar.npz.worker1.123.tmp").write_bytes(b"partial")
+
+    paths = snapshot_paths(path)
+    assert paths == [path, path + ".worker0", path + ".worker1"]
+    restored = SimilarityIndex(max_entries=10, window_seconds=0)
+    assert restored.restore(paths, "v1") == 3
+    assert sorted(m[0] for m in restored.query(*vec({1: 1.0}))) == ["T-1"]
+    assert [m[0] for m in restored.query(*vec({3: 1.0}))] == ["T-3"]
+
+    # A full ring keeps the newest tickets across all files.
+    small = SimilarityIndex(max_entries=2, window_seconds=0)
+    assert small.restore(paths, "v1") == 2
+    assert {m[0] for v in (1, 2, 3) for m in small.query(*vec({v: 1.0}))} == {"T-1", "T-3"}
+    assert SimilarityIndex().restore(paths, "v2") == 0
+
+
+def test_no_snapshot_path_means_no_snapshots(tmp_path, monkeypatch):
+    from similarity_index import snapshot_paths
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".worker0").write_bytes(b"unrelated")
+    assert snapshot_paths("") == []
+    assert SimilarityIndex().restore(snapshot_paths(""), "v1") == 0
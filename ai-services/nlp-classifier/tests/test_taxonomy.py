@@ -0,0 +1,31 @@
+from taxonomy import canonical_label, teacher_labels
+
+
+def test_canonical_label():
+    assert canonical_label(" network vpn-wifi ") == "NETWORK_VPN_WIFI"
+    assert canonical_label("") is None
+    assert canonical_label(None) is None
+    assert canonical_label(0.5) is None
+
+
+def test_zero_shot_intents_map_to_account_access():
+    assert teacher_labels("IDENTITY_ACCESS", "PASSWORD_RESET", "LOW", ["domain", "intent"]) == (
+        "IDENTITY_ACCESS",
+        "ACCOUNT_ACCESS",
+        "LOW",
+        ["domain", "intent"],
+    )
+    assert teacher_labels("IDENTITY_ACCESS", "ACCOUNT_UNLOCK", None, ["intent"])[1] == "ACCOUNT_ACCESS"
+
+
+def test_heads_without_a_training_label_are_dropped():
+    domain, intent, risk, heads = teacher_labels("Printers", "incident", "URGENT", ["domain", "intent", "risk"])
+    assert (domain, intent, risk) == (None, "INCIDENT", None)
+    assert heads == ["intent"]
+
+
+def test_every_zero_shot_label_has_a_training_label():
+    from taxonomy import DOMAINS, INTENT_ALIASES, INTENTS, ZERO_SHOT_LABEL_SETS
+
+    assert set(ZERO_SHOT_LABEL_SETS["category"]) == set(DOMAINS)
+    assert {INTENT_ALIASES.get(i, i) for i in ZERO_SHOT_LABEL_SETS["intent"]} == set(INTENTS)
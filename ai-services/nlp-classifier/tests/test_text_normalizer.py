@@ -0,0 +1,70 @@
+import time
+
+from text_normalizer import NormalizedText, TextNormalizer
+
+
+def test_short_ticket_is_unchanged():
+    norm = TextNormalizer().normalize("VPN drops every 5 minutes!")
+    assert norm.text == "VPN drops every 5 minutes!"
+    assert norm.trimmed == ()
+    assert norm.clean == "vpn drops every 5 minutes"
+    assert norm.key == "vpn drops every 5 minutes"
+
+
+def test_variants():
+    norm = NormalizedText("Outlook  keeps\ncrashing (again)")
+    assert norm.lower == "outlook  keeps\ncrashing (again)"
+    assert norm.collapsed == "Outlook keeps crashing (again)"
+    assert norm.key == "outlook keeps crashing again"
+
+
+def test_cuts_reply_chain():
+    text = "Printer on floor 3 is jammed.\n\nOn Mon, 3 Jun 2024, Bob wrote:\n> VPN is down again\n"
+    norm = TextNormalizer().normalize(text)
+    assert "VPN" not in norm.text
+    assert "reply" in norm.trimmed
+
+
+def test_cuts_outlook_header_and_signature():
+    text = (
+        "Cannot open the shared mailbox.\n"
+        "--\n"
+        "Jane Doe | Finance\n"
+        "From: Helpdesk\n"
+        "Sent: Monday\n"
+        "Subject: old ticket\n"
+    )
+    norm = TextNormalizer().normalize(text)
+    assert norm.text.strip() == "Cannot open the shared mailbox."
+
+
+def test_drops_quoted_lines_and_base64():
+    blob = "QUJD" * 100
+    text = f"Laptop will not boot.\n> earlier message\nattachment: {blob}\n"
+    norm = TextNormalizer().normalize(text)
+    assert "earlier message" not in norm.text
+    assert blob not in norm.text
+    assert set(norm.trimmed) >= {"quoted", "base64"}
+
+
+def test_keeps_text_when_a_step_would_leave_nothing():
+    text = "> only a quoted line"
+    assert TextNormalizer().normalize(text).text == text
+    assert TextNormalizer().normalize("--\nsignature only").text == "--\nsignature only"
+
+
+def test_windows_long_text_on_whitespace():
+    text = "start " + "word " * 20000 + "finish"
+    norm = TextNormalizer(head_chars=100, tail_chars=50).normalize(text)
+    assert "window" in norm.trimmed
+    assert norm.text.startswith("start ")
+    assert norm.text.endswith("finish")
+    assert len(norm.text) <= 151
+    assert all(w in ("start", "word", "finish") for w in norm.text.split())
+
+
+def test_cost_is_bounded_by_windows():
+    text = "x " * 2_000_000
+    started = time.perf_counter()
+    TextNormalizer().normalize(text)
+    assert time.perf_counter() - started < 1.0
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+import train
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    return str(path)
+
+
+def test_small_calibration_slice_goes_back_into_training(tmp_path, training_records):
+    paths = [write_jsonl(tmp_path / "train.jsonl", training_records)]
+    assert train.usable_calibration(paths, 0.0, 0.0) == 0.0
+    assert train.usable_calibration(paths, 0.0, 0.1) == 0.0
+    assert len(list(train.iter_samples(paths, 0.0, 0.0))) == len(training_records)
+
+
+def test_large_calibration_slice_is_kept(tmp_path):
+    records = [{"text": f"ticket number {i}", "domain": "OTHER", "intent": "INCIDENT"} for i in range(400)]
+    paths = [write_jsonl(tmp_path / "train.jsonl", records)]
+    assert train.usable_calibration(paths, 0.0, 0.1) == 0.1
+    held = len(list(train.iter_calibration_samples(paths, 0.0, 0.1)))
+    assert held >= train.MIN_CALIBRATION_SAMPLES
+    assert len(list(train.iter_samples(paths, 0.0, 0.1))) == 400 - held
+
+
+GOLD = {"text": "vpn keeps dropping", "domain": "NETWORK_VPN_WIFI", "intent": "INCIDENT", "risk": "MEDIUM"}
+
+
+def teacher_record(text, domain, intent, risk, heads, confidence=0.8):
+    return {
+        "text": text,
+        "domain": domain,
+        "intent": intent,
+        "risk": risk,
+        "teacher": {"tier": "cloud", "confidence": confidence, "heads": heads},
+    }
+
+
+def test_teacher_records_are_not_gold(tmp_path):
+    paths = [
+        write_jsonl(
+            tmp_path / "train.jsonl",
+            [GOLD, teacher_record("reset my password", "IDENTITY_ACCESS", "ACCOUNT_ACCESS", "LOW", ["domain"])],
+        )
+    ]
+    assert [s[0] for s in train.iter_samples(paths)] == ["vpn keeps dropping"]
+    assert len(list(train.iter_calibration_samples(paths, 0.0, 1.0))) == 1
+
+
+def test_teacher_labels_are_mapped_or_dropped(tmp_path):
+    paths = [
+        write_jsonl(
+            tmp_path / "train.jsonl",
+            [
+                GOLD,
+                teacher_record("reset my password", "IDENTITY_ACCESS", "PASSWORD_RESET", "LOW", ["domain", "intent"]),
+                teacher_record("printer smudges", "Printing", "incident", "MEDIUM", ["domain", "intent", "risk"]),
+                teacher_record("no usable head", "Printing", "Complaint", None, ["domain", "intent"]),
+            ],
+        )
+    ]
+    pairs = list(train.iter_samples_with_teacher(paths))
+    assert len(pairs) == 3
+    (gold, gold_teacher), (reset, reset_teacher), (printer, printer_teacher) = pairs
+    assert gold_teacher is None
+    assert reset[1:3] == ("IDENTITY_ACCESS", "ACCOUNT_ACCESS")
+    assert reset_teacher == (0.8, ["domain", "intent"])
+    assert printer[2] == "INCIDENT"
+    assert printer_teacher == (0.8, ["intent", "risk"])
+
+
+def test_soft_targets_skip_heads_the_teacher_did_not_label():
+    labels = ["A", "B", "A", "B"]
+    teachers = [None, None, (0.8, ["intent"]), (0.6, ["domain"])]
+    rows, out, weights = train.soft_targets(labels, teachers, "domain")
+    assert rows.tolist() == [0, 1, 3, 3]
+    assert out == ["A", "B", "A", "B"]
+    assert weights.tolist() == pytest.approx([1.0, 1.0, 0.4, 0.6])
+
+
+def test_balanced_sample_weight_balances_summed_weights():
+    y = ["A", "A", "A", "B", "B", "A", "B"]
+    weights = [1.0, 1.0, 1.0, 1.0, 0.1, 0.1, 0.8]
+    balanced = train.balanced_sample_weight(y, weights)
+    totals = {label: sum(w for l, w in zip(y, balanced) if l == label) for label in "AB"}
+    assert totals["A"] == pytest.approx(totals["B"])
+    assert sum(balanced) == pytest.approx(sum(weights))
+    assert train.balanced_sample_weight(["A", "A", "B"], [1.0, 1.0, 1.0]).tolist() == pytest.approx([0.75, 0.75, 1.5])
+
+
+def test_gold_only_training_is_unchanged_by_an_empty_label_log(tmp_path, training_records):
+    gold = write_jsonl(tmp_path / "train.jsonl", training_records)
+    generated = write_jsonl(tmp_path / "train.generated.jsonl", [])
+    _, plain = train.train_in_memory([gold], 1, (None, {}))
+    _, distilled = train.train_in_memory([gold, generated], 1, (None, {}), distill=True)
+    assert set(distilled) == set(plain)
+    for name, clf in plain.items():
+        assert distilled[name].coef_ == pytest.approx(clf.coef_)
+        assert distilled[name].intercept_ == pytest.approx(clf.intercept_)
+
+
+def test_unit_sample_weights_fit_like_class_weight_balanced(training_records):
+    samples = [train.to_sample(r) for r in training_records]
+    samples = [s for s in samples if s is not None]
+    X = train.TfidfVectorizer().fit_transform([s[0] for s in samples])
+    y = [s[1] for s in samples]
+    unweighted = train._fit_head(X, y, None)
+    weighted = train._fit_head(X, y, None, [1.0] * len(y))
+    assert weighted.coef_ == pytest.approx(unweighted.coef_, abs=1e-4)
+
+
+def test_scan_corpus_matches_tfidf_below_the_vocab_cap(tmp_path, training_records):
+    paths = [write_jsonl(tmp_path / "train.jsonl", training_records)]
+    texts = [s[0] for s in train.iter_samples(paths)]
+    fitted = train.TfidfVectorizer(max_features=500, ngram_range=(1, 2)).fit(texts)
+    vocabulary, idf, _, n_docs = train.scan_corpus(paths, fitted.build_analyzer(), 500, 10**6)
+    assert n_docs == len(texts)
+    assert vocabulary == fitted.vocabulary_
+    assert idf == pytest.approx(fitted.idf_)
@@ -0,0 +1,37 @@
+from zero_shot_batcher import ZeroShotBatcher
+
+
+class FakePipeline:
+    """Pipeline without a tokenizer: scores each label by how often it occurs in the text."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, candidate_labels, multi_label, hypothesis_template):
+        self.calls.append(len(texts))
+        out = []
+        for text in texts:
+            counts = [text.count(label.lower()) + 1 for label in candidate_labels]
+            ranked = sorted(zip(candidate_labels, counts), key=lambda p: p[1], reverse=True)
+            total = sum(counts)
+            out.append({"labels": [l for l, _ in ranked], "scores": [c / total for _, c in ranked]})
+        return out
+
+
+def test_classify_batch_matches_submit_and_splits_by_batch_size():
+    pipe = FakePipeline()
+    label_sets = {"category": ["NETWORK", "EMAIL"], "intent": ["INCIDENT", "HOW_TO"]}
+    batcher = ZeroShotBatcher(pipe, label_sets, max_batch_size=2, max_wait_ms=0)
+    texts = ["network incident", "email how_to", "email email network", "incident"]
+
+    results = batcher.classify_batch(texts)
+    assert pipe.calls == [2, 2, 2, 2]  # two label sets per chunk of two texts
+    assert [r["category"]["labels"][0] for r in results] == ["NETWORK", "EMAIL", "EMAIL", "NETWORK"]
+    assert [r["intent"]["labels"][0] for r in results] == ["INCIDENT", "HOW_TO", "INCIDENT", "INCIDENT"]
+
+    try:
+        queued = [batcher.submit(t).result(timeout=5) for t in texts]
+    finally:
+        batcher.stop()
+    assert queued == results
+    assert batcher.classify_batch([]) == []
@@ -0,0 +1,113 @@
+"""
+Once-per-request normalization of ticket text.
+
+Tickets created from emails arrive with whatever the email parser passed
+through: the reply chain, signatures, base64 parts. normalize() reduces the
+body to the part worth analysing and derives every variant the service needs
+from it, once:
+
+    text       analysed text, original case (entities, slow tiers, label log)
+    lower      lower-cased (keyword matcher)
+    clean      lower-cased, [a-z0-9] and whitespace only (TF-IDF, as clean_text)
+    collapsed  whitespace runs collapsed to one space (summary)
+    key        clean with collapsed whitespace (result cache key)
+
+Steps, each with precompiled patterns and bounded input:
+
+  1. cut at the first reply header ("On ... wrote:", "-----Original
+     Message-----", an Outlook From:/Sent: block) found in the head window;
+  2. keep a head and a tail window of the rest, cut on whitespace;
+  3. drop ">" quoted lines, base64 runs and everything after a signature
+     delimiter ("-- ", "Sent from my ...").
+
+A step that would leave nothing is skipped, so short tickets and forwarded
+messages keep their text. Cost is bounded by the window sizes, not by the
+size of the email.
+"""
+
+import re
+from typing import Tuple
+
+_REPLY_HEADER = re.compile(
+    r"^[ \t]*(?:"
+    r"-{2,}[ \t]*(?:Original|Forwarded) Message[ \t]*-{2,}"
+    r"|On\b[^\n]{0,200}(?:\n[^\n]{0,200})?\bwrote:[ \t]*$"
+    r"|From:[^\n]*\n(?:[^\n]*\n){0,3}?[ \t]*(?:Sent|Date):"
+    r"|_{10,}[ \t]*$"
+    r")",
+    re.MULTILINE | re.IGNORECASE,
+)
+_QUOTED_LINE = re.compile(r"^[ \t]*>[^\n]*(?:\n|$)", re.MULTILINE)
+_SIGNATURE = re.compile(r"^(?:--[ \t]?|__[ \t]*|Sent from my [^\n]*)$", re.MULTILINE | re.IGNORECASE)
+# MIME bodies wrap base64 at 76 columns; inline blobs are one long run. Both
+# alternatives only start at a line or run start, so the scan stays linear.
+_BASE64 = re.compile(
+    r"^(?:[A-Za-z0-9+/=]{60,}[ \t]*\r?\n){3,}|(?<![A-Za-z0-9+/])[A-Za-z0-9+/]{200,}={0,2}", re.MULTILINE
+)
+_NON_ALNUM = re.compile(r"[^a-z0-9\s]")
+
+
+class NormalizedText:
+    __slots__ = ("text", "lower", "clean", "collapsed", "key", "trimmed")
+
+    def __init__(self, text: str, trimmed: Tuple[str, ...] = ()):
+        self.text = text
+        self.lower = text.lower()
+        self.clean = _NON_ALNUM.sub("", self.lower)
+        self.collapsed = " ".join(text.split())
+        self.key = " ".join(self.clean.split())
+        self.trimmed = trimmed  # which steps shortened the text
+
+
+def _has_text(s: str) -> bool:
+    return bool(s) and not s.isspace()
+
+
+class TextNormalizer:
+    def __init__(
+        self,
+        head_chars: int = 8000,
+        tail_chars: int = 2000,
+        strip_replies: bool = True,
+        strip_signatures: bool = True,
+    ):
+        self.head_chars = max(1, head_chars)
+        self.tail_chars = max(0, tail_chars)
+        self.strip_replies = strip_replies
+        self.strip_signatures = strip_signatures
+
+    def _window(self, text: str) -> str:
+        head_end = text.rfind(" ", 0, self.head_chars)
+        head_end = head_end if head_end > 0 else self.head_chars
+        if self.tail_chars == 0:
+            return text[:head_end]
+        tail_start = text.find(" ", len(text) - self.tail_chars)
+        tail_start = tail_start if tail_start >= 0 else len(text) - self.tail_chars
+        return text[:head_end] + "\n" + text[tail_start:]
+
+    def normalize(self, text: str) -> NormalizedText:
+        trimmed = []
+        if self.strip_replies:
+            # Replies start near the top; only the head window is searched.
+            m = _REPLY_HEADER.search(text, 0, self.head_chars + self.tail_chars)
+            if m is not None and _has_text(text[:m.start()]):
+                text = text[:m.start()]
+                trimmed.append("reply")
+        if len(text) > self.head_chars + self.tail_chars:
+            text = self._window(text)
+            trimmed.append("window")
+        if self.strip_replies:
+            unquoted = _QUOTED_LINE.sub("", text)
+            if len(unquoted) != len(text) and _has_text(unquoted):
+                text = unquoted
+                trimmed.append("quoted")
+        unblobbed = _BASE64.sub(" ", text)
+        if len(unblobbed) != len(text) and _has_text(unblobbed):
+            text = unblobbed
+            trimmed.append("base64")
+        if self.strip_signatures:
+            m = _SIGNATURE.search(text)
+            if m is not None and _has_text(text[:m.start()]):
+                text = text[:m.start()]
+                trimmed.append("signature")
+        return NormalizedText(text, tuple(trimmed))
@@ -1,50 +1,58 @@
 #!/usr/bin/env python3
 """
 Baseline training script for IT ticket classification.
-Generates classifier.pkl and vectorizer.pkl from JSONL training data.
+Generates classifier.pkl and vectorizer.pkl from JSONL training data, plus
+the native NumPy bundle (model/bundle/) the service loads without sklearn.
+
+The domain, intent and risk heads share one TF-IDF matrix and are fit in
+parallel. --warm-start continues from the artifacts already in --out-dir
+(coefficients are carried over term by term when the vocabulary changes).
+--holdout keeps a deterministic slice out of training for eval_harness.py.
+--calibration keeps another slice out to fit a temperature per head (off by
+default; a slice too small to fit on goes back into training); the
+temperatures ship in the native bundle so the service thresholds calibrated
+confidences (see tune_thresholds.py).
+
+--distill fits the heads on teacher labels appended by the service
+(AI_LABEL_LOG_PATH, e.g. data/train.generated.jsonl) as soft targets: each
+teacher record is spread over the classes by the teacher's confidence, so the
+fast path learns the cases it used to escalate. Without --distill those
+records are ignored, never read as gold labels.
+
+--streaming trains out-of-core for corpora that do not fit in memory: one
+pass builds the vocabulary and document frequencies, then the models are fit
+with partial_fit over mini-batches read straight from the JSONL files. Peak
+memory is set by --batch-size and --vocab-cap, not by the corpus size. Once
+the corpus holds more than --vocab-cap distinct terms the rarer candidates are
+pruned along with their document frequencies, so term counts and idf are
+approximate (exact below the cap).
 """
 
+import hashlib
+import itertools
 import json
+import math
+import os
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import joblib
+import numpy as np
+from joblib import Parallel, delayed
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import classification_report
 
-# === Intent taxonomy (closed set) ===
-INTENT_MAP = {
-    "INCIDENT": "INCIDENT",
-    "SERVICE_REQUEST": "SERVICE_REQUEST",
-    "HOW_TO": "HOW_TO",
-    "SECURITY_REPORT": "SECURITY_REPORT",
-    "ACCOUNT_ACCESS": "ACCOUNT_ACCESS",
-    "UNKNOWN": "UNKNOWN",
-}
+from native_model import NativeTextModel, export_bundle, fit_temperature, proba_from_scores
+from taxonomy import DOMAINS, INTENT_ALIASES, INTENTS, RISKS, teacher_labels
 
-# === Domain mapping ===
-DOMAIN_MAP = {
-    "IDENTITY_ACCESS": "IDENTITY_ACCESS",
-    "NETWORK_VPN_WIFI": "NETWORK_VPN_WIFI",
-    "EMAIL_COLLAB": "EMAIL_COLLAB",
-    "ENDPOINT_DEVICE": "ENDPOINT_DEVICE",
-    "BUSINESS_APP_ERP_CRM": "BUSINESS_APP_ERP_CRM",
-    "SOFTWARE_INSTALL_LICENSE": "SOFTWARE_INSTALL_LICENSE",
-    "HARDWARE_PERIPHERAL": "HARDWARE_PERIPHERAL",
-    "SECURITY_INCIDENT": "SECURITY_INCIDENT",
-    "KB_GENERAL": "KB_GENERAL",
-    "OTHER": "OTHER",
-}
-
-# === Risk levels ===
-RISK_MAP = {
-    "LOW": "LOW",
-    "MEDIUM": "MEDIUM",
-    "HIGH": "HIGH",
-    "CRITICAL": "CRITICAL",
-}
+# === Label taxonomy (closed sets, shared with the service) ===
+INTENT_MAP = {intent: intent for intent in INTENTS}
+DOMAIN_MAP = {domain: domain for domain in DOMAINS}
+RISK_MAP = {risk: risk for risk in RISKS}
 
 # === Security escalation keywords ===
 SECURITY_KEYWORDS = [
@@ -61,10 +69,9 @@ def clean_text(text: str) -> str:
     text = re.sub(r"[^a-z0-9\s]", "", text)
     return text
 
-def load_jsonl(path: str) -> List[Dict]:
+def iter_jsonl(path: str) -> Iterator[Dict]:
     if not Path(path).exists():
         raise FileNotFoundError(f"Training data not found: {path}")
-    data = []
     # Note: some generators (e.g. PowerShell) may write UTF-8 BOM.
     # Use utf-8-sig and also strip BOM characters defensively per-line.
     with open(path, "r", encoding="utf-8-sig") as f:
@@ -73,15 +80,18 @@ def load_jsonl(path: str) -> List[Dict]:
                 cleaned = line.lstrip("\ufeff")
                 obj = json.loads(cleaned)
                 if "text" in obj and "intent" in obj and "domain" in obj:
-                    data.append(obj)
-    return data
+                    yield obj
 
-def load_jsonl_optional(paths: List[str]) -> List[Dict]:
-    out: List[Dict] = []
+def load_jsonl(path: str) -> List[Dict]:
+    return list(iter_jsonl(path))
+
+def iter_jsonl_optional(paths: List[str]) -> Iterator[Dict]:
     for p in paths:
         if Path(p).exists():
-            out.extend(load_jsonl(p))
-    return out
+            yield from iter_jsonl(p)
+
+def load_jsonl_optional(paths: List[str]) -> List[Dict]:
+    return list(iter_jsonl_optional(paths))
 
 def pick_domain(record: Dict) -> str:
     domain = str(record.get("domain") or "OTHER")
@@ -91,78 +101,547 @@ def pick_domain(record: Dict) -> str:
 
 def pick_intent(record: Dict) -> str:
     intent = str(record.get("intent") or "UNKNOWN")
+    intent = INTENT_ALIASES.get(intent, intent)
     if intent not in INTENT_MAP:
         return "UNKNOWN"
     return intent
 
-def main():
-    import argparse
-    parser = argparse.ArgumentParser(description="Train baseline IT ticket classifier")
-    parser.add_argument("--data", type=str, default="data/train.jsonl", help="Path to JSONL training data")
-    parser.add_argument("--out-dir", type=str, default="model", help="Output directory for model artifacts")
-    args = parser.parse_args()
+def to_sample(record: Dict):
+    """(clean_text, domain, intent, risk) for a record, or None if it has no text."""
+    text = str(record.get("text") or "").strip()
+    if not text:
+        return None
+    domain = pick_domain(record)
+    intent = pick_intent(record)
 
-    out_dir = Path(args.out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
+    if is_security_issue(text):
+        domain = "SECURITY_INCIDENT"
+        intent = "SECURITY_REPORT"
+        risk = "HIGH"
+    else:
+        risk = str(record.get("risk") or "MEDIUM")
+        if risk not in RISK_MAP:
+            risk = "MEDIUM"
+    return clean_text(text), domain, intent, risk
 
-    print("Loading training data...")
-    generated = str(Path(args.data).parent / "train.generated.jsonl")
-    raw = load_jsonl_optional([args.data, generated])
-    if not raw:
-        print("No valid training samples found.")
-        return
+def in_holdout(record: Dict, fraction: float) -> bool:
+    # Deterministic split on the ticket text, so a record stays on the same
+    # side across retrains and duplicates never straddle the split.
+    if fraction <= 0:
+        return False
+    digest = hashlib.sha1(str(record.get("text") or "").strip().encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32 < fraction
+
+def in_calibration(record: Dict, fraction: float) -> bool:
+    # Same scheme as in_holdout with a different salt, so the two splits are independent.
+    if fraction <= 0:
+        return False
+    text = str(record.get("text") or "").strip()
+    digest = hashlib.sha1(b"calibration\0" + text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32 < fraction
 
-    texts: List[str] = []
-    domains: List[str] = []
-    intents: List[str] = []
-    risks: List[str] = []
+def is_teacher_record(record: Dict) -> bool:
+    # Appended by the service's label log; only --distill trains on these.
+    return "teacher" in record
 
-    for r in raw:
-        text = str(r.get("text") or "").strip()
-        if not text:
+def iter_samples(paths: List[str], holdout: float = 0.0, calibration: float = 0.0) -> Iterator[Tuple[str, str, str, str]]:
+    """Gold samples only; teacher records are read by iter_samples_with_teacher."""
+    for r in iter_jsonl_optional(paths):
+        if is_teacher_record(r) or in_holdout(r, holdout) or in_calibration(r, calibration):
             continue
-        domain = pick_domain(r)
-        intent = pick_intent(r)
+        sample = to_sample(r)
+        if sample is not None:
+            yield sample
 
-        if is_security_issue(text):
-            domain = "SECURITY_INCIDENT"
-            intent = "SECURITY_REPORT"
-            risk = "HIGH"
-        else:
-            risk = str(r.get("risk") or "MEDIUM")
-            if risk not in RISK_MAP:
-                risk = "MEDIUM"
+def teacher_of(record: Dict):
+    """(confidence, heads) of a label-log record, or None for a gold or unreadable one."""
+    teacher = record.get("teacher")
+    if not isinstance(teacher, dict):
+        return None
+    try:
+        confidence = float(teacher.get("confidence"))
+    except (TypeError, ValueError):
+        return None
+    heads = [h for h in teacher.get("heads") or [] if h in HEADS]
+    # Logs written before labels were mapped can hold labels train has no class for
+    # (e.g. a free-form cloud category); those heads are not trained on.
+    _, _, _, heads = teacher_labels(record.get("domain"), record.get("intent"), record.get("risk"), heads)
+    return min(max(confidence, 0.0), 1.0), heads
+
+def iter_samples_with_teacher(paths: List[str], holdout: float = 0.0, calibration: float = 0.0):
+    for r in iter_jsonl_optional(paths):
+        if in_holdout(r, holdout) or in_calibration(r, calibration):
+            continue
+        teacher = None
+        if is_teacher_record(r):
+            teacher = teacher_of(r)
+            if teacher is None or not teacher[1]:
+                continue  # no head it can teach
+            domain, intent, risk, _ = teacher_labels(r.get("domain"), r.get("intent"), r.get("risk"), [])
+            r = dict(r, domain=domain, intent=intent, risk=risk)
+        sample = to_sample(r)
+        if sample is not None:
+            yield sample, teacher
 
-        texts.append(clean_text(text))
-        domains.append(domain)
-        intents.append(intent)
-        risks.append(risk)
+def iter_calibration_samples(paths: List[str], holdout: float, calibration: float) -> Iterator[Tuple[str, str, str, str]]:
+    for r in iter_jsonl_optional(paths):
+        if is_teacher_record(r) or in_holdout(r, holdout) or not in_calibration(r, calibration):
+            continue
+        sample = to_sample(r)
+        if sample is not None:
+            yield sample
 
-    if len(texts) < 5:
-        print("Not enough samples to train. Add more rows to data/train.jsonl")
-        return
+def write_holdout(paths: List[str], fraction: float, out_path: Path) -> int:
+    """Stream the held-out records to out_path (JSONL) for eval_harness.py; returns the count."""
+    count = 0
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for r in iter_jsonl_optional(paths):
+            if not is_teacher_record(r) and in_holdout(r, fraction):
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                count += 1
+    os.replace(tmp, out_path)
+    return count
+
+def iter_batches(
+    paths: List[str], batch_size: int, holdout: float = 0.0, calibration: float = 0.0
+) -> Iterator[List[Tuple[str, str, str, str]]]:
+    batch = []
+    for sample in iter_samples(paths, holdout, calibration):
+        batch.append(sample)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _prune(counts: Counter, doc_freq: Counter, cap: int) -> None:
+    # Keep the vocabulary candidates bounded: drop the rarer half once the cap
+    # is exceeded. Frequent terms (the only ones max_features keeps) survive,
+    # but one evicted and seen again restarts its counts from zero, so its idf
+    # comes out higher than a full-corpus fit would give.
+    keep = {term for term, _ in counts.most_common(cap // 2)}
+    for term in [t for t in counts if t not in keep]:
+        del counts[term]
+        doc_freq.pop(term, None)
+
+def scan_corpus(
+    paths: List[str], analyzer, max_features: int, vocab_cap: int, holdout: float = 0.0, calibration: float = 0.0
+):
+    """Streaming first pass: vocabulary, idf and label counts, as TfidfVectorizer would fit them.
+
+    Exact while the distinct terms stay within vocab_cap; approximate past it (see _prune).
+    """
+    counts: Counter = Counter()
+    doc_freq: Counter = Counter()
+    labels = {"domain": Counter(), "intent": Counter(), "risk": Counter()}
+    n_docs = 0
+    pruned = False
+    for text, domain, intent, risk in iter_samples(paths, holdout, calibration):
+        n_docs += 1
+        terms = analyzer(text)
+        counts.update(terms)
+        doc_freq.update(set(terms))
+        labels["domain"][domain] += 1
+        labels["intent"][intent] += 1
+        labels["risk"][risk] += 1
+        if len(counts) > vocab_cap:
+            _prune(counts, doc_freq, vocab_cap)
+            pruned = True
+    if pruned:
+        print(f"Vocabulary exceeded --vocab-cap {vocab_cap}: term counts and idf are approximate")
+
+    # Same selection and ordering as TfidfVectorizer(max_features=...): the
+    # most frequent terms (ties broken alphabetically), indexed alphabetically.
+    top = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:max_features]
+    terms = sorted(term for term, _ in top)
+    vocabulary = {term: i for i, term in enumerate(terms)}
+    # smooth_idf=True: idf = ln((1 + n) / (1 + df)) + 1
+    idf = np.array([math.log((1 + n_docs) / (1 + doc_freq[t])) + 1.0 for t in terms])
+    return vocabulary, idf, labels, n_docs
+
+def balanced_weights(label_counts: Counter) -> Dict[str, float]:
+    # class_weight="balanced" computed from the full-corpus counts, since
+    # partial_fit only ever sees one batch.
+    total = sum(label_counts.values())
+    return {label: total / (len(label_counts) * n) for label, n in label_counts.items()}
+
+# Every head shares one TF-IDF matrix: (sample column, artifact file, bundle head name).
+HEADS = {
+    "domain": (1, "classifier.pkl", "category"),
+    "intent": (2, "intent_classifier.pkl", "intent"),
+    "risk": (3, "risk_classifier.pkl", "risk"),
+}
+
+def load_previous(out_dir: Path):
+    """Previous vectorizer and head estimators in out_dir, for warm starts."""
+    vectorizer_path = out_dir / "vectorizer.pkl"
+    if not vectorizer_path.exists():
+        return None, {}
+    previous = {}
+    for name, (_, filename, _) in HEADS.items():
+        if (out_dir / filename).exists():
+            previous[name] = joblib.load(out_dir / filename)
+    return joblib.load(vectorizer_path), previous
+
+def warm_start_init(prev_vectorizer, prev_clf, vocabulary: Dict[str, int], classes: List[str]):
+    """Previous (coef, intercept) re-indexed onto a new vocabulary, or None.
+
+    Terms that are new get zero weight; the class set must be unchanged.
+    """
+    if prev_vectorizer is None or prev_clf is None:
+        return None
+    if [str(c) for c in prev_clf.classes_] != list(classes):
+        return None
+    prev_vocab = prev_vectorizer.vocabulary_
+    new_idx, old_idx = [], []
+    for term, j in vocabulary.items():
+        i = prev_vocab.get(term)
+        if i is not None:
+            new_idx.append(j)
+            old_idx.append(i)
+    coef = np.zeros((prev_clf.coef_.shape[0], len(vocabulary)))
+    coef[:, new_idx] = np.asarray(prev_clf.coef_)[:, old_idx]
+    return coef, np.array(prev_clf.intercept_, dtype=np.float64)
 
-    vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
+def balanced_sample_weight(y: List[str], sample_weight) -> np.ndarray:
+    """sample_weight scaled so every class carries the same total weight.
+
+    class_weight="balanced" counts rows, and soft targets give a teacher record
+    one row per class, which would pull the class weights towards uniform; this
+    balances on the summed weights instead (the same result for unit weights).
+    """
+    sample_weight = np.asarray(sample_weight, dtype=np.float64)
+    sums: Counter = Counter()
+    for label, w in zip(y, sample_weight):
+        sums[label] += w
+    per_class = balanced_weights(Counter({label: w for label, w in sums.items() if w > 0}))
+    return sample_weight * np.array([per_class.get(label, 0.0) for label in y])
+
+def _fit_head(X, y: List[str], init, sample_weight=None):
+    class_weight = "balanced"
+    if sample_weight is not None:
+        sample_weight, class_weight = balanced_sample_weight(y, sample_weight), None
+    clf = LogisticRegression(max_iter=1500, class_weight=class_weight, warm_start=init is not None)
+    if init is not None:
+        clf.coef_, clf.intercept_ = init
+    clf.fit(X, y, sample_weight=sample_weight)
+    return clf
+
+def fit_heads(
+    X,
+    targets: Dict[str, List[str]],
+    inits: Dict[str, object],
+    n_jobs: int,
+    rows: Optional[Dict[str, np.ndarray]] = None,
+    weights: Optional[Dict[str, np.ndarray]] = None,
+) -> Dict[str, object]:
+    # One LogisticRegression per head, fit concurrently in worker processes;
+    # joblib memory-maps the shared X instead of copying it per worker.
+    # rows/weights: per-head row selection of X and sample weights (soft targets).
+    rows = rows or {}
+    weights = weights or {}
+    names = list(targets)
+    fitted = Parallel(n_jobs=min(n_jobs, len(names)))(
+        delayed(_fit_head)(X[rows[name]] if name in rows else X, targets[name], inits.get(name), weights.get(name))
+        for name in names
+    )
+    return dict(zip(names, fitted))
+
+def soft_targets(labels: List[str], teachers: list, head: str, teacher_weight: float = 1.0):
+    """(rows, labels, weights) for fitting one head on gold and teacher labels.
+
+    Gold records keep their label with weight 1. A teacher label with confidence c
+    becomes one row per class: c on the teacher's label and 1 - c spread over the
+    other classes, all scaled by teacher_weight. Teacher records that did not
+    label this head are left out of it.
+    """
+    classes = sorted({label for label, t in zip(labels, teachers) if t is None or head in t[1]})
+    rows: List[int] = []
+    out: List[str] = []
+    weights: List[float] = []
+    for i, (label, teacher) in enumerate(zip(labels, teachers)):
+        if teacher is None:
+            rows.append(i)
+            out.append(label)
+            weights.append(1.0)
+            continue
+        confidence, heads = teacher
+        if head not in heads:
+            continue
+        rest = (1.0 - confidence) / (len(classes) - 1) if len(classes) > 1 else 0.0
+        for c in classes:
+            w = confidence if c == label else rest
+            if w > 0:
+                rows.append(i)
+                out.append(c)
+                weights.append(w * teacher_weight)
+    return np.array(rows, dtype=np.int64), out, np.array(weights)
+
+def trainable(label_counts: Counter) -> bool:
+    return len(label_counts) >= 2
+
+def train_in_memory(
+    paths: List[str],
+    n_jobs: int,
+    previous,
+    holdout: float = 0.0,
+    max_features: int = 5000,
+    calibration: float = 0.0,
+    distill: bool = False,
+    teacher_weight: float = 1.0,
+):
+    if distill:
+        pairs = list(iter_samples_with_teacher(paths, holdout, calibration))
+        samples = [p[0] for p in pairs]
+        teachers = [p[1] for p in pairs]
+        print(f"Distilling: {sum(1 for t in teachers if t is not None)} teacher labels, {len(samples)} samples")
+    else:
+        samples = list(iter_samples(paths, holdout, calibration))
+        teachers = []
+    if len(samples) < 5:
+        return None
+
+    texts = [s[0] for s in samples]
+    vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=(1, 2))
     X = vectorizer.fit_transform(texts)
 
-    domain_clf = LogisticRegression(max_iter=1500, class_weight="balanced")
-    domain_clf.fit(X, domains)
+    targets = {}
+    for name, (col, _, _) in HEADS.items():
+        y = [s[col] for s in samples]
+        if trainable(Counter(y)):
+            targets[name] = y
+        else:
+            print(f"Skipping {name} head: only one class in the training data")
+
+    prev_vectorizer, prev_heads = previous
+    inits = {}
+    for name, y in targets.items():
+        init = warm_start_init(prev_vectorizer, prev_heads.get(name), vectorizer.vocabulary_, sorted(set(y)))
+        if init is not None:
+            inits[name] = init
+    if prev_heads:
+        print(f"Warm start: {', '.join(sorted(inits)) or 'none'} (of {', '.join(targets)})")
+
+    rows, weights, fit_targets = {}, {}, dict(targets)
+    if any(t is not None for t in teachers):
+        for name, y in targets.items():
+            rows[name], fit_targets[name], weights[name] = soft_targets(y, teachers, name, teacher_weight)
+    heads = fit_heads(X, fit_targets, inits, n_jobs, rows, weights)
+
+    for name, clf in heads.items():
+        print(f"\n{name.capitalize()} classification report (train-set; add real data for proper eval):")
+        print(classification_report(targets[name], clf.predict(X), zero_division=0))
+    return vectorizer, heads
+
+def train_streaming(
+    paths: List[str],
+    batch_size: int,
+    epochs: int,
+    vocab_cap: int,
+    previous,
+    holdout: float = 0.0,
+    max_features: int = 5000,
+    calibration: float = 0.0,
+):
+    probe = TfidfVectorizer(max_features=max_features, ngram_range=(1, 2))
+    vocabulary, idf, labels, n_docs = scan_corpus(
+        paths, probe.build_analyzer(), max_features, vocab_cap, holdout, calibration
+    )
+    if n_docs < 5 or not vocabulary:
+        return None
+
+    vectorizer = TfidfVectorizer(vocabulary=vocabulary, ngram_range=(1, 2))
+    vectorizer.idf_ = idf
+    print(f"Vocabulary: {len(vocabulary)} terms from {n_docs} samples")
+
+    prev_vectorizer, prev_heads = previous
+    heads = {}
+    for name in HEADS:
+        if not trainable(labels[name]):
+            print(f"Skipping {name} head: only one class in the training data")
+            continue
+        clf = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=0)
+        init = warm_start_init(prev_vectorizer, prev_heads.get(name), vocabulary, sorted(labels[name]))
+        if init is not None:
+            # partial_fit continues from coef_/intercept_ when they are already set.
+            clf.classes_ = np.array(sorted(labels[name]))
+            clf.coef_, clf.intercept_ = init
+            print(f"Warm start: {name}")
+        heads[name] = clf
+    weights = {name: balanced_weights(labels[name]) for name in heads}
+    classes = {name: np.array(sorted(labels[name])) for name in heads}
+
+    def step(name: str, X, batch) -> int:
+        # SGD releases the GIL, so the heads train concurrently on threads.
+        clf = heads[name]
+        y = np.array([b[HEADS[name][0]] for b in batch])
+        correct = int((clf.predict(X) == y).sum()) if hasattr(clf, "coef_") else -1
+        clf.partial_fit(X, y, classes=classes[name], sample_weight=[weights[name][v] for v in y])
+        return correct
+
+    with ThreadPoolExecutor(max_workers=len(heads)) as pool:
+        for epoch in range(epochs):
+            # Progressive validation: each batch is scored before the model learns from it.
+            scored = Counter()
+            correct = Counter()
+            for batch in iter_batches(paths, batch_size, holdout, calibration):
+                X = vectorizer.transform([b[0] for b in batch])
+                for name, c in zip(heads, pool.map(lambda n: step(n, X, batch), list(heads))):
+                    if c >= 0:
+                        correct[name] += c
+                        scored[name] += len(batch)
+            summary = ", ".join(f"{name} {correct[name] / max(1, scored[name]):.3f}" for name in heads)
+            print(f"Epoch {epoch + 1}/{epochs}: progressive accuracy {summary}")
+
+    return vectorizer, heads
 
-    intent_clf = LogisticRegression(max_iter=1500, class_weight="balanced")
-    intent_clf.fit(X, intents)
+MIN_CALIBRATION_SAMPLES = 20
 
-    preds = domain_clf.predict(X)
-    print("\nDomain classification report (train-set; add real data for proper eval):")
-    print(classification_report(domains, preds, zero_division=0))
+def usable_calibration(paths: List[str], holdout: float, calibration: float) -> float:
+    """The calibration fraction to hold out: 0 when the slice is too small to fit a temperature on,
+    so those records are trained on instead of being dropped."""
+    if calibration <= 0:
+        return 0.0
+    samples = iter_calibration_samples(paths, holdout, calibration)
+    available = sum(1 for _ in itertools.islice(samples, MIN_CALIBRATION_SAMPLES))
+    if available < MIN_CALIBRATION_SAMPLES:
+        print(f"Skipping calibration: {available} calibration samples (need {MIN_CALIBRATION_SAMPLES}); training on them")
+        return 0.0
+    return calibration
 
-    intent_preds = intent_clf.predict(X)
-    print("\nIntent classification report (train-set; add real data for proper eval):")
-    print(classification_report(intents, intent_preds, zero_division=0))
+def calibration_error(proba: np.ndarray, y: np.ndarray, bins: int = 10) -> float:
+    """Expected calibration error of the top-class confidence."""
+    conf = proba.max(axis=1)
+    correct = proba.argmax(axis=1) == y
+    which = np.minimum((conf * bins).astype(int), bins - 1)
+    total = 0.0
+    for b in range(bins):
+        in_bin = which == b
+        if in_bin.any():
+            total += in_bin.sum() * abs(conf[in_bin].mean() - correct[in_bin].mean())
+    return float(total / len(y))
+
+def calibrate_heads(
+    paths: List[str], vectorizer, heads: Dict[str, object], holdout: float, calibration: float, limit: int = 50000
+) -> Dict[str, float]:
+    """Temperature per bundle head, fit on the calibration split through the serving code path."""
+    samples = list(itertools.islice(iter_calibration_samples(paths, holdout, calibration), limit))
+    if len(samples) < MIN_CALIBRATION_SAMPLES:
+        print(f"Skipping calibration: {len(samples)} calibration samples (need {MIN_CALIBRATION_SAMPLES})")
+        return {}
+    model = NativeTextModel.from_sklearn(vectorizer, {HEADS[name][2]: clf for name, clf in heads.items()})
+    X = model.transform([s[0] for s in samples])
+
+    temperatures = {}
+    for name in heads:
+        col, _, head = HEADS[name]
+        index = {c: i for i, c in enumerate(model.heads[head].classes)}
+        rows = np.array([i for i, s in enumerate(samples) if s[col] in index], dtype=np.int64)
+        if len(rows) < MIN_CALIBRATION_SAMPLES:
+            continue
+        y = np.array([index[samples[i][col]] for i in rows])
+        kind = model.heads[head].proba
+        scores = model.decision_function(head, X)[rows]
+        t = fit_temperature(kind, scores, y)
+        before = calibration_error(proba_from_scores(kind, scores), y)
+        after = calibration_error(proba_from_scores(kind, scores / t), y)
+        print(f"Calibrated {name} head on {len(rows)} samples: temperature {t:.3f}, ECE {before:.3f} -> {after:.3f}")
+        temperatures[head] = t
+    return temperatures
+
+def dump_atomic(obj, path: Path) -> None:
+    # The service hot-reloads artifacts from this directory; never expose a half-written file.
+    tmp = path.with_name(path.name + ".tmp")
+    joblib.dump(obj, tmp)
+    os.replace(tmp, path)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Train baseline IT ticket classifier")
+    parser.add_argument("--data", type=str, default="data/train.jsonl", help="Path to JSONL training data")
+    parser.add_argument("--out-dir", type=str, default="model", help="Output directory for model artifacts")
+    parser.add_argument("--jobs", type=int, default=0, help="Processes for fitting heads (0 = one per head)")
+    parser.add_argument(
+        "--warm-start", action="store_true", help="Start from the coefficients already in --out-dir"
+    )
+    parser.add_argument(
+        "--holdout", type=float, default=0.0, help="Fraction held out of training and written to <out-dir>/holdout.jsonl"
+    )
+    parser.add_argument(
+        "--calibration",
+        type=float,
+        default=0.0,
+        help="Fraction kept out of training to fit per-head temperatures, e.g. 0.1 (0 = uncalibrated)",
+    )
+    parser.add_argument(
+        "--distill", action="store_true", help="Fit teacher-labelled records (label log) as soft targets"
+    )
+    parser.add_argument(
+        "--teacher-weight", type=float, default=1.0, help="Weight of a teacher record relative to a gold one (--distill)"
+    )
+    parser.add_argument("--streaming", action="store_true", help="Out-of-core training with mini-batch partial_fit")
+    parser.add_argument("--batch-size", type=int, default=2048, help="Samples per mini-batch (--streaming)")
+    parser.add_argument("--epochs", type=int, default=5, help="Passes over the data (--streaming)")
+    parser.add_argument(
+        "--vocab-cap", type=int, default=500000, help="Max vocabulary candidates held while scanning (--streaming); past it, idf is approximate"
+    )
+    args = parser.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    generated = str(Path(args.data).parent / "train.generated.jsonl")
+    paths = [args.data, generated]
+    previous = load_previous(out_dir) if args.warm_start else (None, {})
+    holdout = min(max(args.holdout, 0.0), 0.5)
+    if holdout > 0:
+        held = write_holdout(paths, holdout, out_dir / "holdout.jsonl")
+        print(f"Held out {held} records for evaluation: {out_dir / 'holdout.jsonl'}")
+    calibration = usable_calibration(paths, holdout, min(max(args.calibration, 0.0), 0.5))
+
+    if args.streaming and args.distill:
+        print("--distill needs the in-memory trainer; drop --streaming")
+        return
+    if args.streaming:
+        print("Streaming training data...")
+        trained = train_streaming(
+            paths,
+            max(1, args.batch_size),
+            max(1, args.epochs),
+            max(10000, args.vocab_cap),
+            previous,
+            holdout,
+            calibration=calibration,
+        )
+    else:
+        print("Loading training data...")
+        trained = train_in_memory(
+            paths,
+            args.jobs if args.jobs > 0 else len(HEADS),
+            previous,
+            holdout,
+            calibration=calibration,
+            distill=args.distill,
+            teacher_weight=max(0.0, args.teacher_weight),
+        )
+    if trained is None:
+        print("Not enough samples to train. Add more rows to data/train.jsonl")
+        return
+    vectorizer, heads = trained
+    temperatures = calibrate_heads(paths, vectorizer, heads, holdout, calibration) if calibration > 0 else {}
 
-    joblib.dump(domain_clf, out_dir / "classifier.pkl")
-    joblib.dump(intent_clf, out_dir / "intent_classifier.pkl")
-    joblib.dump(vectorizer, out_dir / "vectorizer.pkl")
-    print(f"Model artifacts saved to {out_dir}")
+    for name, clf in heads.items():
+        dump_atomic(clf, out_dir / HEADS[name][1])
+    for name in HEADS:
+        stale = out_dir / HEADS[name][1]
+        if name not in heads and stale.exists():
+            stale.unlink()
+    dump_atomic(vectorizer, out_dir / "vectorizer.pkl")
+    bundle_version = export_bundle(
+        out_dir / "bundle", vectorizer, {HEADS[name][2]: clf for name, clf in heads.items()}, temperatures
+    )
+    print(f"Model artifacts saved to {out_dir} (native bundle {bundle_version})")
 
 if __name__ == "__main__":
     main()
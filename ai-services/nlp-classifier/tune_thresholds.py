@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Escalation threshold sweep for the classifier service.
+
+Replays a labeled JSONL corpus (ideally model/holdout.jsonl) through the
+in-process fast path and the local zero-shot tier (when AI_LOCAL_HF_ENABLED
+is set), then simulates _escalate for every pair of thresholds on a grid:
+
+  - local tier runs when the (calibrated) base confidence is below
+    AI_LOCAL_HF_TRIGGER_THRESHOLD, and replaces the answer when its own score
+    reaches AI_LOCAL_HF_MIN_SCORE;
+  - cloud tier runs when the confidence after that is below
+    AI_CLOUD_CONFIDENCE_THRESHOLD; it is modelled as answering correctly with
+    --cloud-accuracy after --cloud-latency-ms.
+
+For each pair it reports category accuracy, the local/cloud escalation rates
+and the mean and p95 added latency. The chosen pair is the cheapest one whose
+accuracy is within --tolerance of the best pair (or reaches --min-accuracy).
+--write stores it where the service picks it up (AI_THRESHOLDS_PATH,
+model/thresholds.json by default); explicit AI_* threshold variables still win.
+
+    python tune_thresholds.py --data model/holdout.jsonl --write model/thresholds.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from eval_harness import load_corpus, percentile
+
+
+def tier_outcomes(app_module, rows: List[dict]) -> dict:
+    """Per-ticket answers and latencies of each tier, as arrays."""
+    texts = [r["text"] for r in rows]
+    gold = np.array([r["category"] for r in rows])
+
+    started = time.perf_counter()
+    preds = app_module._predict_many(texts)
+    base_seconds = (time.perf_counter() - started) / len(texts)
+
+    local_ok = np.zeros(len(rows), dtype=bool)
+    local_correct = np.zeros(len(rows), dtype=bool)
+    local_conf = np.zeros(len(rows))
+    local_seconds = np.zeros(len(rows))
+    if app_module.hf_batcher is not None:
+        for i, text in enumerate(texts):
+            started = time.perf_counter()
+            res = app_module._local_hf_enrich(text)
+            local_seconds[i] = time.perf_counter() - started
+            if isinstance(res, dict) and float(res.get("confidence", 0.0)) >= app_module.LOCAL_HF_MIN_SCORE:
+                local_ok[i] = True
+                local_conf[i] = float(res["confidence"])
+                local_correct[i] = res.get("category") == gold[i]
+
+    return {
+        "base_conf": np.array([p.confidence for p in preds]),
+        "base_correct": np.array([p.category for p in preds]) == gold,
+        "base_seconds": base_seconds,
+        "security": np.array([app_module.is_security_text(t) for t in texts]),
+        "has_local": app_module.hf_batcher is not None,
+        "local_ok": local_ok,
+        "local_correct": local_correct,
+        "local_conf": local_conf,
+        "local_seconds": local_seconds,
+    }
+
+
+def simulate(
+    out: dict,
+    local_threshold: float,
+    cloud_threshold: Optional[float],
+    cloud_accuracy: float,
+    cloud_seconds: float,
+) -> dict:
+    eligible = ~out["security"]
+    run_local = eligible & (out["base_conf"] < local_threshold) if out["has_local"] else np.zeros_like(eligible)
+    replaced = run_local & out["local_ok"]
+    conf = np.where(replaced, out["local_conf"], out["base_conf"])
+    correct = np.where(replaced, out["local_correct"], out["base_correct"]).astype(float)
+    latency = out["base_seconds"] + np.where(run_local, out["local_seconds"], 0.0)
+
+    if cloud_threshold is not None:
+        run_cloud = eligible & (conf < cloud_threshold)
+        correct = np.where(run_cloud, cloud_accuracy, correct)
+        latency = latency + np.where(run_cloud, cloud_seconds, 0.0)
+    else:
+        run_cloud = np.zeros_like(eligible)
+
+    latency_ms = (latency * 1000.0).tolist()
+    return {
+        "local_hf_trigger_threshold": round(local_threshold, 4) if out["has_local"] else None,
+        "cloud_confidence_threshold": round(cloud_threshold, 4) if cloud_threshold is not None else None,
+        "category_accuracy": round(float(correct.mean()), 4),
+        "local_rate": round(float(run_local.mean()), 4),
+        "cloud_rate": round(float(run_cloud.mean()), 4),
+        "mean_latency_ms": round(float(np.mean(latency_ms)), 2),
+        "p95_latency_ms": round(percentile(latency_ms, 0.95), 2),
+    }
+
+
+def pareto_frontier(results: List[dict]) -> List[dict]:
+    # Points no other point beats on both accuracy and mean latency.
+    frontier: List[dict] = []
+    best = -1.0
+    for r in sorted(results, key=lambda r: (r["mean_latency_ms"], -r["category_accuracy"])):
+        if r["category_accuracy"] > best:
+            frontier.append(r)
+            best = r["category_accuracy"]
+    return frontier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep escalation thresholds on a labeled set")
+    default_data = "model/holdout.jsonl" if Path("model/holdout.jsonl").exists() else "data/train.jsonl"
+    parser.add_argument("--data", type=str, default=default_data, help="Labeled JSONL corpus to replay")
+    parser.add_argument("--limit", type=int, default=0, help="Max records to use (0 = all)")
+    parser.add_argument("--step", type=float, default=0.05, help="Grid step for both thresholds")
+    parser.add_argument("--cloud-latency-ms", type=float, default=1500.0, help="Modelled latency of the cloud tier")
+    parser.add_argument("--cloud-accuracy", type=float, default=1.0, help="Modelled accuracy of the cloud tier")
+    parser.add_argument("--no-cloud", action="store_true", help="Sweep without a cloud tier")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Accuracy given up for lower latency")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Pick the cheapest pair reaching this")
+    parser.add_argument("--out", type=str, default="", help="Write the full JSON report here")
+    parser.add_argument("--write", type=str, default="", help="Write the chosen thresholds here (e.g. model/thresholds.json)")
+    args = parser.parse_args()
+
+    # The sweep must see the raw model answers, not cached or hot-swapped ones.
+    os.environ["AI_CACHE_ENABLED"] = "0"
+    os.environ["AI_MODEL_WATCH_INTERVAL_SECONDS"] = "0"
+    import app as app_module
+
+    rows = load_corpus(args.data, args.limit)
+    if not rows:
+        print(f"No records in {args.data}", file=sys.stderr)
+        sys.exit(1)
+    if app_module.model_registry.current() is None:
+        print("No model loaded; thresholds only apply to the TF-IDF tier", file=sys.stderr)
+        sys.exit(1)
+
+    outcomes = tier_outcomes(app_module, rows)
+    grid = [round(x, 4) for x in np.arange(0.0, 1.0 + 1e-9, max(0.01, args.step))]
+    local_grid = grid if outcomes["has_local"] else [0.0]
+    cloud_grid: List[Optional[float]] = [None] if args.no_cloud else list(grid)
+    cloud_seconds = max(0.0, args.cloud_latency_ms) / 1000.0
+    results = [
+        simulate(outcomes, lt, ct, args.cloud_accuracy, cloud_seconds) for lt in local_grid for ct in cloud_grid
+    ]
+
+    best = max(r["category_accuracy"] for r in results)
+    target = args.min_accuracy if args.min_accuracy is not None else best - args.tolerance
+    candidates = [r for r in results if r["category_accuracy"] >= target] or [
+        max(results, key=lambda r: r["category_accuracy"])
+    ]
+    chosen = min(candidates, key=lambda r: (r["mean_latency_ms"], r["cloud_rate"], -r["category_accuracy"]))
+    current = simulate(
+        outcomes,
+        app_module.LOCAL_HF_TRIGGER_THRESHOLD,
+        None if args.no_cloud else app_module.CLOUD_CONFIDENCE_THRESHOLD,
+        args.cloud_accuracy,
+        cloud_seconds,
+    )
+
+    report = {
+        "data": args.data,
+        "records": len(rows),
+        "model_version": app_module.model_registry.version,
+        "calibrated": any(
+            h.temperature != 1.0 for h in app_module.model_registry.current().model.heads.values()
+        ),
+        "local_tier": outcomes["has_local"],
+        "cloud_model": None if args.no_cloud else {
+            "latency_ms": args.cloud_latency_ms, "accuracy": args.cloud_accuracy
+        },
+        "current": current,
+        "chosen": chosen,
+        "frontier": pareto_frontier(results),
+    }
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        Path(args.out).write_text(out + "\n", encoding="utf-8")
+    if args.write:
+        thresholds = {
+            "model_version": report["model_version"],
+            "data": args.data,
+            "category_accuracy": chosen["category_accuracy"],
+            "local_rate": chosen["local_rate"],
+            "cloud_rate": chosen["cloud_rate"],
+        }
+        if chosen["local_hf_trigger_threshold"] is not None:
+            thresholds["local_hf_trigger_threshold"] = chosen["local_hf_trigger_threshold"]
+        if chosen["cloud_confidence_threshold"] is not None:
+            thresholds["cloud_confidence_threshold"] = chosen["cloud_confidence_threshold"]
+        tmp = Path(args.write + ".tmp")
+        tmp.write_text(json.dumps(thresholds, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, args.write)
+        print(f"Wrote thresholds to {args.write}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
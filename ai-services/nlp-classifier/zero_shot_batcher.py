@@ -0,0 +1,218 @@
+"""
+Micro-batching scheduler for the local zero-shot (NLI) classifier.
+
+Concurrent requests are queued and grouped into batches (up to max_batch_size
+texts, waiting at most max_wait_ms for the batch to fill). Each batch runs one
+forward pass covering every (text, label) pair for all label sets, so category
+and intent labels share a single call into the model.
+
+The hypotheses of the label sets are tokenized once and cached; each premise
+is tokenized once per batch and paired with every cached hypothesis, instead
+of re-tokenizing the (premise, hypothesis) pair for each label.
+"""
+
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_HYPOTHESIS_TEMPLATE = "This example is {}."
+
+
+class ZeroShotBatcher:
+    def __init__(
+        self,
+        pipe,
+        label_sets: Dict[str, List[str]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        workers: int = 1,
+        hypothesis_template: str = DEFAULT_HYPOTHESIS_TEMPLATE,
+    ):
+        self.pipe = pipe
+        self.label_sets = {name: list(labels) for name, labels in label_sets.items()}
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.hypothesis_template = hypothesis_template
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._stopped = threading.Event()
+
+        # Flattened (label_set, label) pairs, scored together for every text.
+        self._pairs: List[Tuple[str, str]] = [
+            (name, label) for name, labels in self.label_sets.items() for label in labels
+        ]
+        self._hypotheses = [hypothesis_template.format(label) for _, label in self._pairs]
+        self._hypothesis_ids: Optional[List[List[int]]] = None
+        self._entailment_id = self._find_entailment_id()
+
+        # Threads start on first use so a batcher created before a fork (pre-fork
+        # serving) runs in the worker that uses it.
+        self.workers = max(1, workers)
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._started_pid: Optional[int] = None
+
+    def _find_entailment_id(self) -> Optional[int]:
+        model = getattr(self.pipe, "model", None)
+        config = getattr(model, "config", None)
+        label2id = getattr(config, "label2id", None) or {}
+        for label, idx in label2id.items():
+            if str(label).lower().startswith("entail"):
+                return int(idx)
+        return None
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._start_lock:
+            if self._started_pid == pid:
+                return
+            self._queue = queue.Queue()
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"zero-shot-batcher-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+            self._started_pid = pid
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the future resolves to {label_set: {"labels": [...], "scores": [...]}}."""
+        fut: Future = Future()
+        if self._stopped.is_set():
+            fut.set_exception(RuntimeError("zero-shot batcher is stopped"))
+            return fut
+        self._ensure_started()
+        self._queue.put((text, fut))
+        return fut
+
+    def stop(self) -> None:
+        self._stopped.set()
+        for _ in self._threads:
+            self._queue.put(("", Future()))
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if self._stopped.is_set():
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(RuntimeError("zero-shot batcher is stopped"))
+                break
+            live = [(text, fut) for text, fut in batch if fut.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                results = self._classify([text for text, _ in live])
+            except Exception as e:
+                for _, fut in live:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(live, results):
+                fut.set_result(res)
+
+    def classify_batch(self, texts: List[str]) -> List[Dict[str, dict]]:
+        """Score texts synchronously on the calling thread, max_batch_size per forward pass.
+
+        Same results as submit(), without the queue; for offline use such as
+        the export parity check.
+        """
+        out: List[Dict[str, dict]] = []
+        for start in range(0, len(texts), self.max_batch_size):
+            out.extend(self._classify(texts[start:start + self.max_batch_size]))
+        return out
+
+    def _classify(self, texts: List[str]) -> List[Dict[str, dict]]:
+        if self._entailment_id is None or not hasattr(self.pipe, "tokenizer"):
+            return self._classify_with_pipeline(texts)
+        return self._classify_with_model(texts)
+
+    def _encode_pairs(self, texts: List[str]) -> Dict[str, "torch.Tensor"]:
+        import torch
+
+        tok = self.pipe.tokenizer
+        if self._hypothesis_ids is None:
+            self._hypothesis_ids = [tok.encode(h, add_special_tokens=False) for h in self._hypotheses]
+        hypothesis_ids = self._hypothesis_ids
+        # Same result as truncation="only_first": each pair cuts the premise to fit its hypothesis.
+        budget = min(int(getattr(tok, "model_max_length", 512) or 512), 512) - tok.num_special_tokens_to_add(pair=True)
+        longest = max(1, budget - min(len(h) for h in hypothesis_ids))
+        with_types = "token_type_ids" in getattr(tok, "model_input_names", ())
+
+        rows: List[List[int]] = []
+        types: List[List[int]] = []
+        for text in texts:
+            premise = tok.encode(text, add_special_tokens=False, truncation=True, max_length=longest)
+            for hyp in hypothesis_ids:
+                cut = premise[:max(1, budget - len(hyp))]
+                rows.append(tok.build_inputs_with_special_tokens(cut, hyp))
+                if with_types:
+                    types.append(tok.create_token_type_ids_from_sequences(cut, hyp))
+
+        width = max(len(r) for r in rows)
+        pad_id = tok.pad_token_id if tok.pad_token_id is not None else 0
+        left = getattr(tok, "padding_side", "right") == "left"
+        input_ids = torch.full((len(rows), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+        token_type_ids = torch.zeros((len(rows), width), dtype=torch.long) if with_types else None
+        for i, row in enumerate(rows):
+            span = slice(width - len(row), width) if left else slice(0, len(row))
+            input_ids[i, span] = torch.tensor(row, dtype=torch.long)
+            attention_mask[i, span] = 1
+            if token_type_ids is not None:
+                token_type_ids[i, span] = torch.tensor(types[i], dtype=torch.long)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            inputs["token_type_ids"] = token_type_ids
+        return inputs
+
+    def _classify_with_model(self, texts: List[str]) -> List[Dict[str, dict]]:
+        import torch
+
+        inputs = {k: v.to(self.pipe.model.device) for k, v in self._encode_pairs(texts).items()}
+        with torch.no_grad():
+            logits = self.pipe.model(**inputs).logits
+        entail = logits[:, self._entailment_id].reshape(len(texts), len(self._pairs)).tolist()
+        return [self._scores_from_logits(row) for row in entail]
+
+    def _scores_from_logits(self, row: List[float]) -> Dict[str, dict]:
+        # Same as the pipeline with multi_label=False: softmax of the entailment
+        # logits across the candidate labels of each label set.
+        out: Dict[str, dict] = {}
+        offset = 0
+        for name, labels in self.label_sets.items():
+            chunk = row[offset:offset + len(labels)]
+            offset += len(labels)
+            top = max(chunk)
+            exps = [math.exp(v - top) for v in chunk]
+            total = sum(exps)
+            ranked = sorted(zip(labels, (e / total for e in exps)), key=lambda p: p[1], reverse=True)
+            out[name] = {"labels": [l for l, _ in ranked], "scores": [s for _, s in ranked]}
+        return out
+
+    def _classify_with_pipeline(self, texts: List[str]) -> List[Dict[str, dict]]:
+        # Models without an entailment label: fall back to one batched pipeline call per label set.
+        per_set: Dict[str, list] = {}
+        for name, labels in self.label_sets.items():
+            res = self.pipe(texts, candidate_labels=labels, multi_label=False, hypothesis_template=self.hypothesis_template)
+            per_set[name] = res if isinstance(res, list) else [res]
+        return [
+            {name: {"labels": per_set[name][i]["labels"], "scores": per_set[name][i]["scores"]} for name in per_set}
+            for i in range(len(texts))
+        ]
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Offline int8 export of the local zero-shot (NLI) model.
+
+The fp32 model named by --model (AI_LOCAL_HF_MODEL) is dynamically quantized
+with torch: every nn.Linear gets int8 weights and runs int8 matmuls on CPU,
+while embeddings and layer norms stay fp32. The export directory holds:
+
+    config.json, tokenizer files   as saved by transformers
+    quantized_model.pt             the quantized state_dict
+    quantization.json              source model, settings and the parity report
+
+Set AI_LOCAL_HF_QUANTIZED_DIR to that directory and the service loads it with
+load_quantized_pipeline() instead of the fp32 model. Before anything is
+written, the exported model is loaded back through that same function and
+compared with the fp32 model on --parity-data: top-label agreement per label
+set and the largest score difference. Below --min-agreement the export fails.
+
+    python zero_shot_export.py --model typeform/distilbert-base-uncased-mnli --out-dir model/zero_shot_int8
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+WEIGHTS_NAME = "quantized_model.pt"
+MANIFEST_NAME = "quantization.json"
+
+
+def quantize(model):
+    import torch
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def save_quantized(pipe, quantized, out_dir: Path, manifest: dict) -> None:
+    import torch
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pipe.model.config.save_pretrained(out_dir)
+    pipe.tokenizer.save_pretrained(out_dir)
+    torch.save(quantized.state_dict(), out_dir / WEIGHTS_NAME)
+    (out_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+
+def load_quantized_pipeline(path: str):
+    """zero-shot-classification pipeline over an exported int8 model; no fp32 weights are read."""
+    import torch
+    from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+    root = Path(path)
+    manifest = json.loads((root / MANIFEST_NAME).read_text(encoding="utf-8"))
+    if manifest.get("dtype") != "qint8":
+        raise ValueError(f"Unsupported quantization {manifest.get('dtype')!r} in {path}")
+    # Same module structure as at export time, so the packed int8 weights load in place.
+    model = quantize(AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(root)))
+    model.load_state_dict(torch.load(root / WEIGHTS_NAME, map_location="cpu", weights_only=True))
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(root)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer, framework="pt", device=-1)
+
+
+def parity_report(reference, candidate, label_sets: Dict[str, List[str]], texts: List[str], batch_size: int) -> dict:
+    from zero_shot_batcher import ZeroShotBatcher
+
+    def run(pipe) -> tuple:
+        batcher = ZeroShotBatcher(pipe, label_sets, max_batch_size=batch_size)
+        started = time.perf_counter()
+        out = batcher.classify_batch(texts)
+        return out, (time.perf_counter() - started) * 1000.0 / max(1, len(texts))
+
+    ref, ref_ms = run(reference)
+    got, got_ms = run(candidate)
+    report: dict = {"texts": len(texts), "fp32_ms_per_text": round(ref_ms, 2), "int8_ms_per_text": round(got_ms, 2)}
+    for name in label_sets:
+        agree = sum(1 for r, g in zip(ref, got) if r[name]["labels"][0] == g[name]["labels"][0])
+        max_diff = 0.0
+        for r, g in zip(ref, got):
+            scores = dict(zip(g[name]["labels"], g[name]["scores"]))
+            max_diff = max(max_diff, max(abs(s - scores[l]) for l, s in zip(r[name]["labels"], r[name]["scores"])))
+        report[name] = {"top1_agreement": round(agree / max(1, len(texts)), 4), "max_score_diff": round(max_diff, 4)}
+    return report
+
+
+def dir_size_mb(path: Path) -> float:
+    return round(sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) / (1024.0 * 1024.0), 1)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export an int8 dynamically quantized zero-shot model")
+    parser.add_argument("--model", type=str, default=os.getenv("AI_LOCAL_HF_MODEL", "typeform/distilbert-base-uncased-mnli"))
+    parser.add_argument("--out-dir", type=str, default="model/zero_shot_int8")
+    parser.add_argument("--parity-data", type=str, default="data/train.jsonl", help="JSONL texts for the parity check")
+    parser.add_argument("--parity-limit", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Top-1 agreement required per label set")
+    args = parser.parse_args()
+
+    import torch
+    from transformers import pipeline
+
+    from eval_harness import load_texts
+    from taxonomy import ZERO_SHOT_LABEL_SETS
+
+    # Label sets as served, so parity is measured on the real hypotheses.
+    label_sets = ZERO_SHOT_LABEL_SETS
+    reference = pipeline("zero-shot-classification", model=args.model, device=-1)
+    reference.model.eval()
+    quantized = quantize(reference.model)
+
+    out_dir = Path(args.out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    manifest = {
+        "source_model": args.model,
+        "dtype": "qint8",
+        "modules": ["Linear"],
+        "torch": torch.__version__,
+    }
+    save_quantized(reference, quantized, tmp_dir, manifest)
+
+    texts = load_texts(args.parity_data, args.parity_limit)
+    parity = parity_report(reference, load_quantized_pipeline(str(tmp_dir)), label_sets, texts, max(1, args.batch_size))
+    manifest["parity"] = parity
+    (tmp_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    print(json.dumps(parity, indent=2))
+
+    failed = [n for n in label_sets if parity[n]["top1_agreement"] < args.min_agreement]
+    if failed and texts:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        print(f"Parity check failed for {', '.join(failed)} (min agreement {args.min_agreement})", file=sys.stderr)
+        sys.exit(1)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    print(f"Quantized model saved to {out_dir} ({dir_size_mb(out_dir)} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -376,8 +376,10 @@ export const createTicket = async (args: {
 
         const res = await fetch(enrichUrl, {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ text }),
+          // Leave headroom under the 2s abort so the classifier returns its best partial result.
+          headers: { "Content-Type": "application/json", "X-Deadline-Ms": "1800" },
+          // ticket_id indexes this ticket for duplicate detection; similar_k returns recent look-alikes.
+          body: JSON.stringify({ text, ticket_id: ticket.id, similar_k: 5 }),
           signal: controller.signal,
         }).finally(() => clearTimeout(timeout));
 
@@ -414,6 +416,7 @@ export const createTicket = async (args: {
             approval_title: typeof data?.approval_title === "string" ? data.approval_title : undefined,
             approval_body: typeof data?.approval_body === "string" ? data.approval_body : undefined,
             model_confidence: confidence,
+            similar_tickets: Array.isArray(data?.similar) ? data.similar : undefined,
           };
 
           const updatedRes = await pool.query<TicketRow>(